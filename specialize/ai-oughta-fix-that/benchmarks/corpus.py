@@ -0,0 +1,233 @@
+"""
+Benchmark Corpus Module
+Generates a reproducible synthetic corpus of files for scanner benchmarks
+"""
+
+import hashlib
+import json
+import os
+import random
+import struct
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = 'corpus.json'
+WRITE_BLOCK_SIZE = 4 * 1024 * 1024
+
+# File counts and size ranges (bytes) per category and profile
+PROFILES: Dict[str, Dict[str, Dict[str, Any]]] = {
+    'quick': {
+        'pe': {'count': 50, 'min_size': 16 * 1024, 'max_size': 1024 * 1024},
+        'entropy': {'count': 20, 'min_size': 64 * 1024, 'max_size': 2 * 1024 * 1024},
+        'text': {'count': 100, 'min_size': 1024, 'max_size': 64 * 1024},
+        'tiny': {'count': 2000, 'min_size': 0, 'max_size': 512},
+        'large': {'count': 0, 'min_size': 0, 'max_size': 0},
+    },
+    'full': {
+        'pe': {'count': 500, 'min_size': 16 * 1024, 'max_size': 8 * 1024 * 1024},
+        'entropy': {'count': 200, 'min_size': 64 * 1024, 'max_size': 16 * 1024 * 1024},
+        'text': {'count': 2000, 'min_size': 1024, 'max_size': 256 * 1024},
+        'tiny': {'count': 50000, 'min_size': 0, 'max_size': 512},
+        'large': {'count': 2, 'min_size': 2 * 1024 ** 3, 'max_size': 3 * 1024 ** 3},
+    },
+}
+
+SUSPICIOUS_STRINGS = [
+    'cmd.exe', 'powershell.exe', 'wscript.exe', 'kernel32.dll', 'ntdll.dll',
+    'HKEY_CURRENT_USER\\Software\\Microsoft\\Windows\\CurrentVersion\\Run',
+    'password', 'bitcoin', 'wallet', '.onion', 'encrypt', 'payment'
+]
+SUSPICIOUS_APIS = [
+    'VirtualAllocEx', 'WriteProcessMemory', 'CreateRemoteThread', 'OpenProcess',
+    'IsDebuggerPresent', 'URLDownloadToFile', 'GetAsyncKeyState', 'WinExec'
+]
+WORDS = ('the scanner reads every file once and reports a verdict for each path in '
+         'the tree while the benchmark measures throughput latency and memory').split()
+
+
+def _pe_bytes(rng: random.Random, size: int) -> bytes:
+    """Build a PE-like image: DOS header, NT headers, section table and section data"""
+    section_count = rng.randint(2, 8)
+    header = bytearray(0x400)
+    header[0:2] = b'MZ'
+    struct.pack_into('<I', header, 0x3C, 0x80)  # e_lfanew
+    header[0x80:0x84] = b'PE\0\0'
+    struct.pack_into('<HHIIIHH', header, 0x84, 0x8664, section_count, rng.getrandbits(32),
+                     0, 0, 0xF0, 0x22)
+    table = 0x84 + 20 + 0xF0
+    for index in range(section_count):
+        name = rng.choice([b'.text', b'.data', b'.rdata', b'.rsrc', b'.reloc', b'UPX0'])
+        struct.pack_into('<8sIIII', header, table + index * 40, name, 0x1000,
+                         0x1000 * (index + 1), 0x200, 0x400 + 0x200 * index)
+
+    body = bytearray(np.random.default_rng(rng.getrandbits(32)).integers(
+        0, 64, max(size - len(header), 0), dtype=np.uint8
+    ).tobytes())
+    for name in rng.sample(SUSPICIOUS_APIS, rng.randint(0, len(SUSPICIOUS_APIS))) + ['kernel32.dll']:
+        encoded = name.encode('ascii') + b'\0'
+        if len(body) > len(encoded):
+            position = rng.randrange(len(body) - len(encoded))
+            body[position:position + len(encoded)] = encoded
+    return bytes(header + body)[:size] if size >= len(header) else bytes(header[:size])
+
+
+def _entropy_bytes(rng: random.Random, size: int) -> bytes:
+    """Uniformly random bytes, like packed or encrypted content"""
+    return np.random.default_rng(rng.getrandbits(32)).integers(0, 256, size, dtype=np.uint8).tobytes()
+
+
+def _text_bytes(rng: random.Random, size: int) -> bytes:
+    """Prose with suspicious strings sprinkled in"""
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(SUSPICIOUS_STRINGS) if rng.random() < 0.01 else rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words).encode('utf-8')[:size]
+
+
+def _tiny_bytes(rng: random.Random, size: int) -> bytes:
+    return bytes(rng.getrandbits(8) for _ in range(size))
+
+
+GENERATORS = {
+    'pe': _pe_bytes,
+    'entropy': _entropy_bytes,
+    'text': _text_bytes,
+    'tiny': _tiny_bytes,
+}
+
+
+def _write_large_file(path: Path, rng: random.Random, size: int) -> None:
+    """Write a multi-gigabyte file by repeating one random block with a varying prefix"""
+    block = bytearray(_entropy_bytes(rng, WRITE_BLOCK_SIZE))
+    written = 0
+    with open(path, 'wb') as f:
+        while written < size:
+            # Vary each block so the file does not hash like a repeated pattern
+            block[:8] = written.to_bytes(8, 'little')
+            f.write(block[:min(WRITE_BLOCK_SIZE, size - written)])
+            written += WRITE_BLOCK_SIZE
+
+
+def generate_corpus(root: Path, profile: str = 'quick', seed: int = 0) -> Dict[str, Any]:
+    """Generate (or reuse) a corpus and return its manifest
+
+    An existing corpus is reused when its manifest was generated from the
+    same profile and seed, so repeated runs measure identical inputs.
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown corpus profile: {profile}")
+    root = Path(root)
+    manifest_path = root / MANIFEST_NAME
+    if manifest_path.exists():
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+        if manifest.get('profile') == profile and manifest.get('seed') == seed:
+            logger.info(f"Reusing corpus at {root}")
+            return manifest
+
+    rng = random.Random(seed)
+    categories: Dict[str, Dict[str, Any]] = {}
+    samples: List[str] = []
+    for category, spec in PROFILES[profile].items():
+        directory = root / category
+        directory.mkdir(parents=True, exist_ok=True)
+        total = 0
+        for index in range(spec['count']):
+            size = rng.randint(spec['min_size'], spec['max_size'])
+            path = directory / f"{category}_{index:06d}.bin"
+            if category == 'large':
+                _write_large_file(path, rng, size)
+            else:
+                data = GENERATORS[category](rng, size)
+                path.write_bytes(data)
+                # A few files per category double as known-bad samples
+                if index < 5 and data:
+                    samples.append(hashlib.sha256(data).hexdigest())
+            total += size
+        categories[category] = {'files': spec['count'], 'bytes': total}
+        logger.info(f"Generated {spec['count']} {category} files ({total} bytes)")
+
+    manifest = {
+        'profile': profile,
+        'seed': seed,
+        'categories': categories,
+        'files': sum(c['files'] for c in categories.values()),
+        'bytes': sum(c['bytes'] for c in categories.values()),
+        'sample_sha256': samples
+    }
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def iter_corpus_files(root: Path) -> List[Tuple[str, int]]:
+    """List (path, size) of every corpus file in a stable order"""
+    files = []
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if name != MANIFEST_NAME:
+                path = os.path.join(directory, name)
+                files.append((path, os.path.getsize(path)))
+    return sorted(files)
+
+
+def write_signature_set(path: Path, count: int, sample_sha256: List[str], seed: int = 0) -> None:
+    """Write a JSON signature set of the given size
+
+    Besides random hash signatures it matches the corpus samples by hash and
+    PE-like files by a byte pattern, so the benchmark exercises hits as well
+    as misses.
+    """
+    rng = random.Random(seed)
+    signatures = {}
+    for index, digest in enumerate(sample_sha256[:count]):
+        signatures[f"Bench.Sample.{index}"] = {
+            'name': f"Bench.Sample.{index}", 'type': 'hash', 'pattern': digest,
+            'threat_level': 'high', 'description': 'Known corpus sample'
+        }
+    if count:
+        pattern = 'Bench.Pattern.UPX'
+        signatures[pattern] = {
+            'name': pattern, 'type': 'byte_pattern', 'pattern': b'UPX0\0\0\0\0'.hex(),
+            'threat_level': 'medium', 'description': 'Packed section name'
+        }
+    for index in range(len(signatures), count):
+        name = f"Bench.Random.{index}"
+        signatures[name] = {
+            'name': name, 'type': 'hash', 'pattern': '%064x' % rng.getrandbits(256),
+            'threat_level': 'low', 'description': ''
+        }
+    with open(path, 'w') as f:
+        json.dump(signatures, f)
+
+
+def write_pattern_signature_set(path: Path, count: int, seed: int = 0) -> None:
+    """Write a JSON signature set of random byte patterns
+
+    Measures pattern matching at scale; as in write_signature_set, PE-like
+    files are matched by their packed section name.
+    """
+    rng = random.Random(seed)
+    pattern = 'Bench.Pattern.UPX'
+    signatures = {
+        pattern: {
+            'name': pattern, 'type': 'byte_pattern', 'pattern': b'UPX0\0\0\0\0'.hex(),
+            'threat_level': 'medium', 'description': 'Packed section name'
+        }
+    }
+    for index in range(1, count):
+        name = f"Bench.RandomPattern.{index}"
+        signatures[name] = {
+            'name': name, 'type': 'byte_pattern', 'pattern': rng.randbytes(rng.randint(8, 16)).hex(),
+            'threat_level': 'low', 'description': ''
+        }
+    with open(path, 'w') as f:
+        json.dump(signatures, f)
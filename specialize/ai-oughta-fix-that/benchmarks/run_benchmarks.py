@@ -0,0 +1,263 @@
+"""
+Scanner Benchmark Runner
+Measures SignatureScanner and HeuristicScanner throughput over a synthetic corpus
+
+Usage:
+    python benchmarks/run_benchmarks.py run --corpus /tmp/scan-corpus --output results.json
+    python benchmarks/run_benchmarks.py compare baseline.json results.json
+"""
+
+import argparse
+import json
+import multiprocessing
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import logging
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCHMARK_DIR.parent / 'src' / 'scanner'))
+
+from corpus import (  # noqa: E402
+    PROFILES, generate_corpus, iter_corpus_files, write_pattern_signature_set, write_signature_set
+)
+
+logger = logging.getLogger(__name__)
+
+SCANNERS = ('signature', 'pattern', 'heuristic')  # 'pattern' runs only byte pattern signatures
+DEFAULT_SIGNATURE_COUNTS = (0, 1000, 100000)
+RESULT_FORMAT_VERSION = 1
+# Metrics where a larger value is better; the rest are better when smaller
+HIGHER_IS_BETTER = ('files_per_second', 'mb_per_second')
+
+
+def _peak_rss_bytes() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes elsewhere
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _percentile(sorted_values: List[float], percentile: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(percentile / 100 * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def _create_scanner(scanner_type: str, signature_path: Optional[str], signature_count: int):
+    if scanner_type in ('signature', 'pattern'):
+        from signature_scanner import SignatureScanner
+        return SignatureScanner({'signature_db_path': signature_path} if signature_path else {})
+
+    from heuristic_scanner import HeuristicScanner
+    scanner = HeuristicScanner()
+    scanner.initialize()
+    # Heuristics have no signature database; scale the suspicious string set instead
+    scanner.add_suspicious_strings(f"bench-marker-{index:08d}" for index in range(signature_count))
+    return scanner
+
+
+def run_case(scanner_type: str, signature_count: int, signature_path: Optional[str],
+             corpus_root: str) -> Dict[str, Any]:
+    """Run one benchmark case; called in a fresh process so peak RSS is its own"""
+    logging.disable(logging.WARNING)
+    files = iter_corpus_files(Path(corpus_root))
+
+    started = time.perf_counter()
+    scanner = _create_scanner(scanner_type, signature_path, signature_count)
+    if not scanner.is_initialized:
+        scanner.initialize()
+    setup_seconds = time.perf_counter() - started
+
+    latencies = []
+    detections = 0
+    failures = 0
+    total_bytes = 0
+    started = time.perf_counter()
+    for path, size in files:
+        file_started = time.perf_counter()
+        try:
+            if scanner.scan_file(Path(path)).threat_detected:
+                detections += 1
+        except Exception:
+            failures += 1
+        latencies.append(time.perf_counter() - file_started)
+        total_bytes += size
+    elapsed = time.perf_counter() - started
+    scanner.cleanup()
+
+    latencies.sort()
+    return {
+        'scanner': scanner_type,
+        'signature_count': signature_count,
+        'files': len(files),
+        'bytes': total_bytes,
+        'detections': detections,
+        'failures': failures,
+        'setup_seconds': setup_seconds,
+        'elapsed_seconds': elapsed,
+        'files_per_second': len(files) / elapsed if elapsed else 0.0,
+        'mb_per_second': total_bytes / (1024 * 1024) / elapsed if elapsed else 0.0,
+        'latency_p50_ms': _percentile(latencies, 50) * 1000,
+        'latency_p99_ms': _percentile(latencies, 99) * 1000,
+        'latency_max_ms': (latencies[-1] if latencies else 0.0) * 1000,
+        'peak_rss_bytes': _peak_rss_bytes()
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BENCHMARK_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _prepare_signature_set(work_dir: Path, scanner_type: str, count: int, sample_sha256: List[str],
+                           signature_format: str, seed: int) -> Optional[str]:
+    """Write the signature set for a case, converted to the binary format if requested"""
+    if not count:
+        return None
+    stem = f"signatures_{count}" if scanner_type == 'signature' else f"patterns_{count}"
+    json_path = work_dir / f"{stem}.json"
+    if not json_path.exists():
+        if scanner_type == 'signature':
+            write_signature_set(json_path, count, sample_sha256, seed)
+        else:
+            write_pattern_signature_set(json_path, count, seed)
+    if signature_format == 'json':
+        return str(json_path)
+
+    db_path = work_dir / f"{stem}.db"
+    if not db_path.exists():
+        from signature_scanner import SignatureScanner
+        converter = SignatureScanner({'signature_db_path': str(json_path)})
+        converter.initialize()
+        converter.export_signature_db(db_path)
+        converter.cleanup()
+    return str(db_path)
+
+
+def run_benchmarks(args: argparse.Namespace) -> Dict[str, Any]:
+    """Generate the corpus and signature sets, then run every case in its own process"""
+    corpus_root = Path(args.corpus)
+    manifest = generate_corpus(corpus_root, args.profile, args.seed)
+    work_dir = corpus_root.parent / f"{corpus_root.name}-signatures"
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    results = []
+    context = multiprocessing.get_context('spawn')
+    for scanner_type in args.scanners:
+        for count in args.signature_counts:
+            signature_path = None
+            if scanner_type != 'heuristic':
+                signature_path = _prepare_signature_set(work_dir, scanner_type, count,
+                                                        manifest['sample_sha256'],
+                                                        args.signature_format, args.seed)
+            for repeat in range(args.repeat):
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    result = executor.submit(run_case, scanner_type, count, signature_path,
+                                             str(corpus_root)).result()
+                result['repeat'] = repeat
+                results.append(result)
+                print(f"{scanner_type:>10} sigs={count:<8} {result['files_per_second']:10.1f} files/s "
+                      f"{result['mb_per_second']:8.1f} MB/s p50={result['latency_p50_ms']:.3f}ms "
+                      f"p99={result['latency_p99_ms']:.3f}ms rss={(result['peak_rss_bytes'] or 0) >> 20}MiB")
+
+    return {
+        'format_version': RESULT_FORMAT_VERSION,
+        'metadata': {
+            'commit': _git_commit(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': multiprocessing.cpu_count(),
+            'signature_format': args.signature_format,
+            'corpus': manifest
+        },
+        'results': results
+    }
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any],
+                    tolerance: float) -> List[str]:
+    """Compare two result files case by case and describe regressions beyond the tolerance"""
+    def best_by_case(data: Dict[str, Any]) -> Dict[tuple, Dict[str, Any]]:
+        # With repeats, keep the fastest run of each case
+        cases: Dict[tuple, Dict[str, Any]] = {}
+        for result in data['results']:
+            key = (result['scanner'], result['signature_count'])
+            if key not in cases or result['elapsed_seconds'] < cases[key]['elapsed_seconds']:
+                cases[key] = result
+        return cases
+
+    baseline_cases = best_by_case(baseline)
+    regressions = []
+    for key, result in sorted(best_by_case(current).items()):
+        previous = baseline_cases.get(key)
+        if previous is None:
+            continue
+        for metric in HIGHER_IS_BETTER + ('latency_p50_ms', 'latency_p99_ms', 'peak_rss_bytes'):
+            old, new = previous.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            print(f"{key[0]:>10} sigs={key[1]:<8} {metric:<18} {old:14.3f} -> {new:14.3f} ({change:+.1%})")
+            if worse > tolerance:
+                regressions.append(f"{key[0]} sigs={key[1]} {metric} regressed by {worse:.1%}")
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[2])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='Run the benchmark suite')
+    run.add_argument('--corpus', required=True, help='Directory for the generated corpus')
+    run.add_argument('--profile', choices=sorted(PROFILES), default='quick',
+                     help="Corpus size; 'full' includes multi-GB files")
+    run.add_argument('--seed', type=int, default=0)
+    run.add_argument('--scanners', nargs='+', choices=SCANNERS, default=list(SCANNERS))
+    run.add_argument('--signature-counts', nargs='+', type=int, default=list(DEFAULT_SIGNATURE_COUNTS))
+    run.add_argument('--signature-format', choices=('json', 'db'), default='db')
+    run.add_argument('--repeat', type=int, default=1)
+    run.add_argument('--output', help='Write results as JSON to this file')
+
+    compare = commands.add_parser('compare', help='Compare two result files')
+    compare.add_argument('baseline')
+    compare.add_argument('current')
+    compare.add_argument('--tolerance', type=float, default=0.1,
+                         help='Relative change tolerated before a metric counts as a regression')
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    if args.command == 'compare':
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        with open(args.current, 'r') as f:
+            current = json.load(f)
+        regressions = compare_results(baseline, current, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        return 1 if regressions else 0
+
+    report = run_benchmarks(args)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Wrote benchmark results to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""
+Async Scanner Module
+Asyncio facade that runs blocking scanner work off the event loop
+"""
+
+import asyncio
+import os
+import sys
+from concurrent.futures import BrokenExecutor, Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Set
+import logging
+
+# Scanner modules import each other by bare name
+SCANNER_DIR = Path(__file__).resolve().parent.parent / 'scanner'
+if str(SCANNER_DIR) not in sys.path:
+    sys.path.insert(0, str(SCANNER_DIR))
+
+from base_scanner import BaseScanner, BaseScannerError, ScanResult  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONCURRENCY = 64  # Scans in flight at once, including queued ones
+DEFAULT_IO_THREADS = 8
+
+# Scanner instance owned by an async scan worker process
+_worker_scanner: Optional[BaseScanner] = None
+
+
+class AsyncScannerError(BaseScannerError):
+    """Exception specific to asynchronous scanning"""
+    pass
+
+
+class AsyncScanner:
+    """Scans files from an asyncio event loop without blocking it
+
+    Reading and analyzing a file is CPU-bound, so scans run on a pool of
+    worker processes, each holding its own copy of the scanner; the file is
+    read in the worker so its bytes never cross a process boundary. Blocking
+    filesystem work that stays in this process (stat calls, verdict cache
+    lookups and stores, directory listing) runs on a small thread pool. A
+    semaphore limits how many scans are in flight at once.
+
+    With scan_workers set to 0, scans run on the thread pool instead.
+    """
+
+    def __init__(self, scanner: BaseScanner, config: Optional[Dict[str, Any]] = None):
+        self.scanner = scanner
+        self.config = config or {}
+        self.max_concurrency = self.config.get('async_max_concurrency', DEFAULT_MAX_CONCURRENCY)
+        workers = self.config.get('scan_workers')
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.io_threads = self.config.get('async_io_threads', DEFAULT_IO_THREADS)
+        self._io_executor: Optional[ThreadPoolExecutor] = None
+        self._scan_executor: Optional[Executor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._start_lock: Optional[asyncio.Lock] = None
+        self._in_flight = 0
+        self._statistics = {'scanned': 0, 'cached': 0, 'failed': 0}
+
+    async def __aenter__(self) -> 'AsyncScanner':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    @property
+    def is_running(self) -> bool:
+        return self._scan_executor is not None
+
+    async def start(self) -> None:
+        """Initialize the scanner and create the worker pools; scans call this on demand"""
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self.is_running:
+                return
+            self._io_executor = ThreadPoolExecutor(max_workers=self.io_threads,
+                                                   thread_name_prefix='async-scan-io')
+            if not self.scanner.is_initialized:
+                await self._run_io(self.scanner.initialize)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            if self.workers:
+                self._scan_executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                          initializer=_initialize_worker,
+                                                          initargs=(self.scanner,))
+            else:
+                self._scan_executor = self._io_executor
+            logger.info(f"Started async scanning with {self.workers} workers, "
+                        f"at most {self.max_concurrency} scans in flight")
+
+    async def close(self) -> None:
+        """Shut the worker pools down, waiting for running scans to finish"""
+        if not self.is_running:
+            return
+        scan_executor, io_executor = self._scan_executor, self._io_executor
+        self._scan_executor = self._io_executor = None
+        loop = asyncio.get_running_loop()
+        if scan_executor is not io_executor:
+            await loop.run_in_executor(None, scan_executor.shutdown)
+        await loop.run_in_executor(None, io_executor.shutdown)
+        await loop.run_in_executor(None, self.scanner._flush_cached_verdicts)
+
+    async def _run_io(self, function: Callable, *args) -> Any:
+        """Run blocking filesystem work on the I/O thread pool"""
+        return await asyncio.get_running_loop().run_in_executor(self._io_executor, function, *args)
+
+    async def scan_file(self, file_path: Path) -> ScanResult:
+        """Scan a single file for threats"""
+        if not self.is_running:
+            await self.start()
+        async with self._semaphore:
+            self._in_flight += 1
+            try:
+                return await self._scan_file(Path(file_path))
+            except Exception:
+                self._statistics['failed'] += 1
+                raise
+            finally:
+                self._in_flight -= 1
+
+    async def _scan_file(self, file_path: Path) -> ScanResult:
+        if self._scan_executor is self._io_executor:
+            # In-process scans consult the verdict cache themselves
+            result = await self._run_io(self.scanner.scan_file, file_path)
+            self._statistics['scanned'] += 1
+            return result
+
+        try:
+            cached, identity = await self._run_io(self.scanner._lookup_cached_verdict, file_path)
+        except FileNotFoundError:
+            raise self.scanner.error_class(f"File not found: {file_path}")
+        if cached is not None:
+            self._statistics['cached'] += 1
+            return cached
+
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self._scan_executor, _scan_path, str(file_path)
+            )
+        except BrokenExecutor as e:
+            raise AsyncScannerError(f"Scan worker pool failed while scanning {file_path}: {str(e)}")
+        if identity is not None:
+            await self._run_io(self.scanner._store_cached_verdict, identity, result)
+        self._statistics['scanned'] += 1
+        return result
+
+    async def iter_scan_directory(self, directory_path: Path,
+                                  recursive: bool = True) -> AsyncIterator[ScanResult]:
+        """Scan a directory for threats, yielding results in completion order
+
+        Files are discovered lazily on the I/O threads and only as many scans
+        as the concurrency limit allows are outstanding, so memory stays
+        bounded regardless of how many files the tree holds. Files that fail
+        to scan are logged and skipped.
+        """
+        if not self.is_running:
+            await self.start()
+        directory_path = Path(directory_path)
+        await self._run_io(self.scanner._validate_directory_scan, directory_path)
+
+        entries = self.scanner._walk_directory(directory_path, recursive)
+        pending: Set[asyncio.Future] = set()
+        exhausted = False
+        try:
+            while True:
+                room = self.max_concurrency - len(pending)
+                if not exhausted and room > 0:
+                    paths = await self._run_io(_next_paths, entries, room)
+                    exhausted = len(paths) < room
+                    pending.update(asyncio.ensure_future(self._scan_entry(path)) for path in paths)
+                if not pending:
+                    break
+
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    result = task.result()
+                    if result is not None:
+                        yield result
+        finally:
+            # The consumer may stop early; don't leave scans running behind it
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _scan_entry(self, path: str) -> Optional[ScanResult]:
+        try:
+            return await self.scan_file(Path(path))
+        except Exception as e:
+            logger.error(f"Failed to scan {path}: {str(e)}")
+            return None
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get counts of scanned, cached and failed files and the current load"""
+        return dict(self._statistics, in_flight=self._in_flight,
+                    max_concurrency=self.max_concurrency, workers=self.workers)
+
+
+def _next_paths(entries: Iterator[os.DirEntry], count: int) -> List[str]:
+    """Advance a directory walk by up to count files"""
+    paths = []
+    for entry in entries:
+        paths.append(entry.path)
+        if len(paths) >= count:
+            break
+    return paths
+
+
+def _initialize_worker(scanner: BaseScanner) -> None:
+    """Install the scanner copy used by this worker process"""
+    global _worker_scanner
+    # The verdict cache is consulted and updated by the parent process
+    scanner._verdict_cache = None
+    if not scanner.is_initialized:
+        scanner.initialize()
+    _worker_scanner = scanner
+
+
+def _scan_path(path: str) -> ScanResult:
+    """Scan one file with this worker's scanner"""
+    return _worker_scanner.scan_file(Path(path))
+
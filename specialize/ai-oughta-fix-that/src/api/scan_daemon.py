@@ -0,0 +1,543 @@
+"""
+Scan Daemon Module
+Long-running scan service that keeps scanners warm and takes jobs over a Unix domain socket
+"""
+
+import getpass
+import heapq
+import itertools
+import json
+import os
+import queue
+import socket
+import socketserver
+import stat
+import sys
+import tempfile
+import threading
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+import logging
+
+# Scanner modules import each other by bare name
+SCANNER_DIR = Path(__file__).resolve().parent.parent / 'scanner'
+if str(SCANNER_DIR) not in sys.path:
+    sys.path.insert(0, str(SCANNER_DIR))
+
+from base_scanner import BaseScanner, BaseScannerError, ScanResult  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_PENDING = 256  # Files one request may have queued at once
+DEFAULT_PRIORITY = 0  # Higher priorities are scanned first
+SOCKET_NAME = 'scand.sock'
+
+# Outcome of one file: (path, result, error); exactly one of result and error is set
+ScanOutcome = Tuple[str, Optional[ScanResult], Optional[str]]
+
+# Scanner instance owned by a scan daemon worker process
+_worker_scanner: Optional[BaseScanner] = None
+
+
+class ScanDaemonError(BaseScannerError):
+    """Exception specific to the scan daemon and its clients"""
+    pass
+
+
+def default_socket_path(config: Optional[Dict[str, Any]] = None) -> Path:
+    """Get the daemon socket path: daemon_socket_path, or a per-user path in the temp directory"""
+    config = config or {}
+    if config.get('daemon_socket_path'):
+        return Path(config['daemon_socket_path'])
+    return Path(tempfile.gettempdir()) / f"ai-oughta-fix-that-{getpass.getuser()}" / SOCKET_NAME
+
+
+def create_scanner(config: Optional[Dict[str, Any]] = None) -> BaseScanner:
+    """Build the standard engine stack: signatures first, then heuristics"""
+    # Imported here so clients never pay for loading the engines
+    from heuristic_scanner import HeuristicScanner
+    from scan_orchestrator import ScanOrchestrator
+    from signature_scanner import SignatureScanner
+
+    config = config or {}
+    return ScanOrchestrator(config, engines=[SignatureScanner(config), HeuristicScanner(config)])
+
+
+class ScanJob:
+    """One queued file and the requests waiting for its result"""
+
+    __slots__ = ('path', 'priority', 'subscribers', 'running')
+
+    def __init__(self, path: str, priority: int):
+        self.path = path
+        self.priority = priority
+        self.subscribers: List[queue.Queue] = []
+        self.running = False
+
+
+class ScanDaemon:
+    """Serves scan requests from a warm scanner over a Unix domain socket
+
+    The scanner is initialized once, so a request only pays for the files it
+    scans. Files from every connection go into one priority queue drained by
+    worker threads, highest priority first and in arrival order within a
+    priority. Each thread hands its file to a pool of worker processes, each
+    holding its own copy of the scanner, so scans run in parallel; verdict
+    cache lookups and stores stay in the daemon. With daemon_processes set to
+    False, the threads scan in the daemon process instead. A file that is already queued or being scanned is not queued
+    again: the new request subscribes to the pending job and receives the same
+    result, and a higher priority moves the job forward.
+
+    Requests and responses are newline-delimited JSON; see ScanClient. Paths
+    must be absolute, since the daemon's working directory is not the client's.
+    """
+
+    def __init__(self, scanner: BaseScanner, config: Optional[Dict[str, Any]] = None):
+        self.scanner = scanner
+        self.config = config or {}
+        self.socket_path = default_socket_path(self.config)
+        workers = self.config.get('daemon_workers')
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.max_pending = self.config.get('daemon_max_pending', DEFAULT_MAX_PENDING)
+        self.use_processes = self.config.get('daemon_processes', True)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._worker_duplicates: Dict[int, Dict[str, Any]] = {}  # Duplicate table statistics by worker pid
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._queue: List[Tuple[int, int, ScanJob]] = []  # Heap of (-priority, sequence, job)
+        self._sequence = itertools.count()
+        self._jobs: Dict[str, ScanJob] = {}  # Queued or running jobs by path
+        self._threads: List[threading.Thread] = []
+        self._server: Optional[socketserver.ThreadingUnixStreamServer] = None
+        self._stopping = False
+        self._unflushed = False  # Verdicts may be buffered in the scanner's verdict cache
+        self._statistics = {'requests': 0, 'submitted': 0, 'deduplicated': 0,
+                            'scanned': 0, 'failed': 0, 'cancelled': 0}
+
+    @property
+    def is_running(self) -> bool:
+        return self._server is not None
+
+    def start(self) -> None:
+        """Initialize the scanner, start the workers and listen on the socket"""
+        if self.is_running:
+            return
+        if not self.scanner.is_initialized:
+            self.scanner.initialize()
+
+        self.socket_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        self._check_socket_directory()
+        self._remove_stale_socket()
+        server = _ScanServer(str(self.socket_path), _ScanRequestHandler)
+        server.scan_daemon = self
+        # Anyone who can connect can have files read with the daemon's privileges
+        os.chmod(self.socket_path, 0o600)
+
+        self._stopping = False
+        if self.use_processes:
+            self._executor = self._create_executor()
+        self._threads = [threading.Thread(target=self._work, name=f'scan-daemon-{i}', daemon=True)
+                         for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+        self._server = server
+        logger.info(f"Scan daemon listening on {self.socket_path} with {self.workers} workers")
+
+    def serve_forever(self) -> None:
+        """Start the daemon and handle requests until shutdown is requested"""
+        self.start()
+        try:
+            self._server.serve_forever()
+        finally:
+            self.close()
+
+    def shutdown(self) -> None:
+        """Ask serve_forever to return; must not be called from the thread running it"""
+        if self._server is not None:
+            self._server.shutdown()
+
+    def close(self) -> None:
+        """Stop listening, finish the running scans and drop the queued ones"""
+        server, self._server = self._server, None
+        if server is None:
+            return
+        server.server_close()
+        try:
+            self.socket_path.unlink()
+        except FileNotFoundError:
+            pass
+
+        with self._lock:
+            self._stopping = True
+            dropped = [job for job in self._jobs.values() if not job.running]
+            self._queue.clear()
+            self._ready.notify_all()
+        for job in dropped:
+            self._finish(job, None, "Scan daemon is shutting down")
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self.scanner._flush_cached_verdicts()
+        logger.info("Scan daemon stopped")
+
+    def _check_socket_directory(self) -> None:
+        """Refuse a socket directory that someone else could swap the socket out of"""
+        directory = self.socket_path.parent
+        info = os.lstat(directory)
+        if not stat.S_ISDIR(info.st_mode):
+            raise ScanDaemonError(f"Socket directory is not a directory: {directory}")
+        if info.st_uid != os.getuid():
+            raise ScanDaemonError(f"Socket directory is owned by another user: {directory}")
+        if info.st_mode & 0o077:
+            raise ScanDaemonError(f"Socket directory is accessible to other users: {directory}")
+
+    def _create_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=_initialize_worker,
+                                   initargs=(self.scanner,))
+
+    def _remove_stale_socket(self) -> None:
+        if not self.socket_path.exists():
+            return
+        if is_daemon_running(self.socket_path):
+            raise ScanDaemonError(f"A scan daemon is already listening on {self.socket_path}")
+        logger.debug(f"Removing stale socket {self.socket_path}")
+        self.socket_path.unlink()
+
+    def submit(self, path: str, priority: int, outcomes: queue.Queue) -> None:
+        """Queue a file, or subscribe to its pending job; its outcome is put on outcomes"""
+        with self._lock:
+            if self._stopping:
+                raise ScanDaemonError("Scan daemon is shutting down")
+            self._statistics['submitted'] += 1
+            job = self._jobs.get(path)
+            if job is not None:
+                self._statistics['deduplicated'] += 1
+                job.subscribers.append(outcomes)
+                if not job.running and priority > job.priority:
+                    # The old heap entry is skipped when it surfaces
+                    job.priority = priority
+                    heapq.heappush(self._queue, (-priority, next(self._sequence), job))
+                return
+            job = self._jobs[path] = ScanJob(path, priority)
+            job.subscribers.append(outcomes)
+            heapq.heappush(self._queue, (-priority, next(self._sequence), job))
+            self._ready.notify()
+
+    def unsubscribe(self, outcomes: queue.Queue) -> None:
+        """Stop delivering to a request that went away; jobs nobody waits for are dropped"""
+        with self._lock:
+            for path, job in list(self._jobs.items()):
+                if outcomes in job.subscribers:
+                    job.subscribers.remove(outcomes)
+                    if not job.subscribers and not job.running:
+                        del self._jobs[path]
+                        self._statistics['cancelled'] += 1
+
+    def _next_job(self) -> Optional[ScanJob]:
+        """Block until a job is queued and claim it; None once the daemon stops"""
+        flush = False
+        with self._lock:
+            while True:
+                while self._queue:
+                    priority, _, job = heapq.heappop(self._queue)
+                    if job.running or self._jobs.get(job.path) is not job or -priority != job.priority:
+                        continue  # Superseded by a reprioritized entry, or cancelled
+                    job.running = True
+                    return job
+                if self._stopping:
+                    return None
+                if self._unflushed:
+                    # Idle: persist buffered verdicts before waiting
+                    self._unflushed = False
+                    flush = True
+                    break
+                self._ready.wait()
+        if flush:
+            self.scanner._flush_cached_verdicts()
+        return self._next_job()
+
+    def _work(self) -> None:
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                result = self._scan(job.path)
+            except Exception as e:
+                logger.error(f"Failed to scan {job.path}: {str(e)}")
+                self._finish(job, None, str(e))
+            else:
+                self._finish(job, result, None)
+
+    def _scan(self, path: str) -> ScanResult:
+        executor = self._executor
+        if executor is None:
+            # In-process scans consult the verdict cache themselves
+            return self.scanner.scan_file(Path(path))
+
+        try:
+            cached, identity = self.scanner._lookup_cached_verdict(Path(path))
+        except FileNotFoundError:
+            raise ScanDaemonError(f"File not found: {path}")
+        if cached is not None:
+            return cached
+        try:
+            result, pid, duplicates = executor.submit(_scan_path, path).result()
+        except BrokenExecutor as e:
+            raise ScanDaemonError(f"Scan worker pool failed while scanning {path}: {str(e)}")
+        with self._lock:
+            self._worker_duplicates[pid] = duplicates
+        self.scanner._store_cached_verdict(identity, result)
+        return result
+
+    def update_definitions(self) -> bool:
+        """Reload the definitions; running scans finish on the old ones"""
+        updated = self.scanner.update_definitions()
+        if updated and self._executor is not None:
+            # Worker processes hold copies of the scanner, so replace them with fresh ones
+            with self._lock:
+                executor, self._executor = self._executor, self._create_executor()
+                self._worker_duplicates.clear()
+            executor.shutdown(wait=False)
+        return updated
+
+    def _finish(self, job: ScanJob, result: Optional[ScanResult], error: Optional[str]) -> None:
+        with self._lock:
+            if self._jobs.get(job.path) is job:
+                del self._jobs[job.path]
+            subscribers, job.subscribers = job.subscribers, []
+            self._statistics['failed' if error is not None else 'scanned'] += 1
+            self._unflushed = True
+        for outcomes in subscribers:
+            outcomes.put((job.path, result, error))
+
+    def handle_scan(self, paths: Iterable[str], priority: int, recursive: bool) -> Iterator[ScanOutcome]:
+        """Scan files and directory trees, yielding each outcome as it completes
+
+        Directories are walked lazily and at most max_pending files are queued
+        for the request at a time, so one large tree neither floods the queue
+        nor holds every path in memory.
+        """
+        with self._lock:
+            self._statistics['requests'] += 1
+        outcomes: queue.Queue = queue.Queue()
+        pending = 0
+        try:
+            for path in paths:
+                if not os.path.isabs(path):
+                    yield path, None, "Path must be absolute"
+                    continue
+                if os.path.isdir(path):
+                    files = (entry.path for entry in self.scanner._walk_directory(Path(path), recursive))
+                elif os.path.exists(path):
+                    files = iter((path,))
+                else:
+                    yield path, None, f"File not found: {path}"
+                    continue
+                for file_path in files:
+                    while pending >= self.max_pending:
+                        yield outcomes.get()
+                        pending -= 1
+                    self.submit(file_path, priority, outcomes)
+                    pending += 1
+            while pending:
+                yield outcomes.get()
+                pending -= 1
+        finally:
+            if pending:
+                self.unsubscribe(outcomes)
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get request and job counts, the queue depth, the definitions in use and duplicate file reuse"""
+        with self._lock:
+            statistics = dict(self._statistics)
+            statistics['queued'] = sum(1 for job in self._jobs.values() if not job.running)
+            statistics['running'] = len(self._jobs) - statistics['queued']
+            worker_duplicates = list(self._worker_duplicates.values())
+        statistics['workers'] = self.workers
+        statistics['definitions_version'] = self.scanner.get_definitions_version()
+        duplicates = self.scanner._duplicate_verdicts
+        if duplicates is None:
+            statistics['duplicate_verdicts'] = None
+        elif self._executor is None:
+            statistics['duplicate_verdicts'] = duplicates.get_statistics()
+        else:
+            statistics['duplicate_verdicts'] = _sum_duplicate_statistics(worker_duplicates)
+        return statistics
+
+
+class _ScanServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True  # Connections never hold up shutdown
+    scan_daemon: ScanDaemon
+
+
+class _ScanRequestHandler(socketserver.StreamRequestHandler):
+    """Answers the requests sent over one connection, one JSON line each"""
+
+    def handle(self) -> None:
+        daemon = self.server.scan_daemon
+        for line in self.rfile:
+            try:
+                request = json.loads(line)
+                operation = request['op']
+            except (ValueError, KeyError, TypeError):
+                self._send({'type': 'error', 'error': 'Malformed request'})
+                continue
+            try:
+                if operation == 'scan':
+                    self._scan(daemon, request)
+                elif operation == 'stats':
+                    self._send({'type': 'stats', 'statistics': daemon.get_statistics()})
+                elif operation == 'update':
+                    self._send({'type': 'ok', 'updated': daemon.update_definitions(),
+                                'definitions_version': daemon.scanner.get_definitions_version()})
+                elif operation == 'shutdown':
+                    self._send({'type': 'ok'})
+                    # shutdown() waits for serve_forever, which must keep running meanwhile
+                    threading.Thread(target=daemon.shutdown, daemon=True).start()
+                    return
+                else:
+                    self._send({'type': 'error', 'error': f"Unknown operation: {operation}"})
+            except (BrokenPipeError, ConnectionResetError):
+                return  # The client went away
+            except Exception as e:
+                logger.error(f"Failed to handle {operation} request: {str(e)}")
+                self._send({'type': 'error', 'error': str(e)})
+
+    def _scan(self, daemon: ScanDaemon, request: Dict[str, Any]) -> None:
+        paths = request.get('paths')
+        if not isinstance(paths, list) or not all(isinstance(path, str) for path in paths):
+            raise ScanDaemonError("Scan request needs a list of paths")
+        files = threats = errors = 0
+        for path, result, error in daemon.handle_scan(paths, int(request.get('priority', DEFAULT_PRIORITY)),
+                                                      bool(request.get('recursive', True))):
+            if error is not None:
+                errors += 1
+                self._send({'type': 'error', 'path': path, 'error': error})
+                continue
+            files += 1
+            threats += result.threat_detected
+            self._send({'type': 'result', 'result': result.to_dict()})
+        self._send({'type': 'done', 'files': files, 'threats': threats, 'errors': errors})
+
+    def _send(self, message: Dict[str, Any]) -> None:
+        self.wfile.write(json.dumps(message, default=str).encode('utf-8') + b'\n')
+
+
+class ScanClient:
+    """Talks to a running scan daemon
+
+    Each request is one JSON line: {"op": "scan", "paths": [...], "priority":
+    0, "recursive": true}, or {"op": "stats"}, {"op": "update"} or {"op":
+    "shutdown"}. A scan is answered with one "result" or "error" line per
+    file, as each finishes, then a "done" line with the totals.
+    """
+
+    def __init__(self, socket_path: Optional[Path] = None, timeout: Optional[float] = None):
+        self.socket_path = Path(socket_path) if socket_path is not None else default_socket_path()
+        self.timeout = timeout
+
+    def _connect(self) -> socket.socket:
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(self.timeout)
+        try:
+            connection.connect(str(self.socket_path))
+        except OSError as e:
+            connection.close()
+            raise ScanDaemonError(f"Scan daemon is not reachable at {self.socket_path}: {str(e)}")
+        return connection
+
+    def _request(self, request: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        with self._connect() as connection:
+            connection.sendall(json.dumps(request).encode('utf-8') + b'\n')
+            with connection.makefile('rb') as responses:
+                for line in responses:
+                    yield json.loads(line)
+
+    def _call(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        for response in self._request(request):
+            if response['type'] == 'error':
+                raise ScanDaemonError(response['error'])
+            return response
+        raise ScanDaemonError("Scan daemon closed the connection without answering")
+
+    def iter_scan(self, paths: Iterable[Path], priority: int = DEFAULT_PRIORITY,
+                  recursive: bool = True) -> Iterator[ScanOutcome]:
+        """Scan files and directories, yielding each file's outcome in completion order"""
+        request = {'op': 'scan', 'paths': [os.path.abspath(path) for path in paths],
+                   'priority': priority, 'recursive': recursive}
+        for response in self._request(request):
+            if response['type'] == 'done':
+                return
+            if response['type'] == 'result':
+                result = ScanResult.from_dict(response['result'])
+                yield result.file_path, result, None
+            elif 'path' in response:
+                yield response['path'], None, response['error']
+            else:
+                raise ScanDaemonError(response['error'])
+        raise ScanDaemonError("Scan daemon closed the connection before the scan finished")
+
+    def scan_file(self, file_path: Path, priority: int = DEFAULT_PRIORITY) -> ScanResult:
+        """Scan a single file for threats"""
+        for path, result, error in self.iter_scan([file_path], priority):
+            if error is not None:
+                raise ScanDaemonError(error)
+            return result
+        raise ScanDaemonError(f"Scan daemon returned no result for {file_path}")
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get the daemon's request and job counts"""
+        return self._call({'op': 'stats'})['statistics']
+
+    def update_definitions(self) -> bool:
+        """Have the daemon reload its definitions; running scans finish on the old ones"""
+        return self._call({'op': 'update'})['updated']
+
+    def shutdown(self) -> None:
+        """Stop the daemon once its running scans finish"""
+        self._call({'op': 'shutdown'})
+
+
+def is_daemon_running(socket_path: Optional[Path] = None) -> bool:
+    """Check whether a daemon accepts connections on a socket"""
+    try:
+        ScanClient(socket_path, timeout=1.0)._connect().close()
+    except ScanDaemonError:
+        return False
+    return True
+
+
+def _sum_duplicate_statistics(statistics: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Add up the duplicate tables of the worker processes; each only sees its own scans"""
+    total = {'lookups': 0, 'hits': 0, 'oversized': 0, 'verdicts': 0, 'verdict_bytes': 0}
+    for worker in statistics:
+        for key in total:
+            total[key] += worker[key]
+    total['duplicate_hit_rate'] = total['hits'] / total['lookups'] if total['lookups'] else 0.0
+    return total
+
+
+def _initialize_worker(scanner: BaseScanner) -> None:
+    """Install the scanner copy used by this worker process"""
+    global _worker_scanner
+    # The verdict cache is consulted and updated by the daemon process
+    scanner._verdict_cache = None
+    if not scanner.is_initialized:
+        scanner.initialize()
+    _worker_scanner = scanner
+
+
+def _scan_path(path: str) -> Tuple[ScanResult, int, Optional[Dict[str, Any]]]:
+    """Scan one file with this worker's scanner
+
+    Also returns this worker's pid and duplicate table statistics, for the
+    daemon to report.
+    """
+    result = _worker_scanner.scan_file(Path(path))
+    duplicates = _worker_scanner._duplicate_verdicts
+    return result, os.getpid(), duplicates.get_statistics() if duplicates is not None else None
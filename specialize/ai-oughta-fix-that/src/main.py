@@ -2,9 +2,17 @@
 Main entry point for the application.
 """
 
+import argparse
+import json
 import sys
 import logging
-from typing import Optional
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from api.scan_daemon import (
+    DEFAULT_PRIORITY, ScanClient, ScanDaemon, ScanDaemonError, ScanOutcome, create_scanner,
+    default_socket_path
+)
 
 # Configure logging
 logging.basicConfig(
@@ -14,26 +22,125 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+EXIT_THREATS = 3  # Scan completed and found at least one threat
+
+
+def _parse_args(args: List[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Scan files for threats")
+    parser.add_argument('--config', type=Path, help="JSON file of scanner settings")
+    parser.add_argument('--socket', type=Path, help="Scan daemon socket path")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    scan = commands.add_parser('scan', help="Scan files and directories")
+    scan.add_argument('paths', nargs='+', type=Path)
+    scan.add_argument('--priority', type=int, default=DEFAULT_PRIORITY,
+                      help="Scan ahead of queued jobs with lower priorities")
+    scan.add_argument('--no-recursive', dest='recursive', action='store_false')
+    scan.add_argument('--json', action='store_true', help="Print every result as a JSON line")
+    scan.add_argument('--no-daemon', action='store_true',
+                      help="Scan in this process instead of through the daemon")
+
+    commands.add_parser('daemon', help="Run the scan daemon in the foreground")
+    commands.add_parser('stats', help="Print the daemon's statistics")
+    commands.add_parser('update', help="Have the daemon reload its definitions")
+    commands.add_parser('stop', help="Stop the daemon")
+    return parser.parse_args(args)
+
+
+def _load_config(options: argparse.Namespace) -> Dict[str, Any]:
+    config = {}
+    if options.config is not None:
+        with open(options.config, 'r') as f:
+            config = json.load(f)
+    if options.socket is not None:
+        config['daemon_socket_path'] = str(options.socket)
+    return config
+
+
+def _scan_in_process(config: Dict[str, Any], paths: List[Path], recursive: bool) -> Iterator[ScanOutcome]:
+    """Scan without a daemon, paying scanner initialization up front"""
+    scanner = create_scanner(config)
+    scanner.initialize()
+    try:
+        for path in paths:
+            try:
+                if path.is_dir():
+                    for result in scanner.iter_scan_directory(path, recursive):
+                        yield result.file_path, result, None
+                else:
+                    yield str(path), scanner.scan_file(path), None
+            except Exception as e:
+                yield str(path), None, str(e)
+    finally:
+        scanner.cleanup()
+
+
+def _scan(config: Dict[str, Any], options: argparse.Namespace) -> int:
+    client = ScanClient(default_socket_path(config))
+    if options.no_daemon:
+        outcomes = _scan_in_process(config, options.paths, options.recursive)
+    else:
+        outcomes = client.iter_scan(options.paths, options.priority, options.recursive)
+
+    threats = errors = 0
+    try:
+        for path, result, error in outcomes:
+            if error is not None:
+                errors += 1
+                logger.error(f"Failed to scan {path}: {error}")
+                continue
+            threats += result.threat_detected
+            if options.json:
+                print(json.dumps(result.to_dict(), default=str))
+            elif result.threat_detected:
+                print(f"{path}: {result.threat_type} (confidence {result.confidence:.2f})")
+    except ScanDaemonError as e:
+        logger.error(f"{str(e)}; start it with the 'daemon' command or scan with --no-daemon")
+        return 1
+
+    logger.info(f"Scan finished: {threats} threats, {errors} errors")
+    if errors:
+        return 1
+    return EXIT_THREATS if threats else 0
+
 
 def main(args: Optional[list] = None) -> int:
     """
     Main function for the application.
-    
+
     Args:
         args: Command line arguments (if None, uses sys.argv)
-    
+
     Returns:
-        Exit code (0 for success, non-zero for error)
+        Exit code (0 for success, EXIT_THREATS if a scan found threats,
+        other non-zero values for errors)
     """
     if args is None:
         args = sys.argv[1:]
-    
-    logger.info("Starting application...")
-    
+
+    options = _parse_args(args)
+
     try:
-        # Your main application logic here
-        logger.info("Application completed successfully")
+        config = _load_config(options)
+        if options.command == 'scan':
+            return _scan(config, options)
+        if options.command == 'daemon':
+            ScanDaemon(create_scanner(config), config).serve_forever()
+            return 0
+
+        client = ScanClient(default_socket_path(config))
+        if options.command == 'stats':
+            print(json.dumps(client.get_statistics(), indent=2))
+        elif options.command == 'update':
+            logger.info(f"Definitions {'updated' if client.update_definitions() else 'unchanged'}")
+        elif options.command == 'stop':
+            client.shutdown()
         return 0
+    except KeyboardInterrupt:
+        return 130
+    except ScanDaemonError as e:
+        logger.error(str(e))
+        return 1
     except Exception as e:
         logger.error(f"Application error: {e}", exc_info=True)
         return 1
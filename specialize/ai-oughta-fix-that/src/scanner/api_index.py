@@ -0,0 +1,102 @@
+"""
+API Index Module
+Bitmask index of suspicious imported APIs and the combinations behavioral rules look for
+"""
+
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# (rule ID, indicator, APIs that must all be imported)
+ApiCombination = Tuple[str, str, Tuple[str, ...]]
+
+DEFAULT_API_COMBINATIONS: Tuple[ApiCombination, ...] = (
+    ('HR001', 'Keystroke capture', ('SetWindowsHookEx',)),
+    ('HR001', 'Keystroke polling', ('GetAsyncKeyState', 'GetForegroundWindow')),
+    ('HR001', 'Process enumeration', ('CreateToolhelp32Snapshot', 'Process32First', 'Process32Next')),
+    ('HR001', 'Download and execute', ('URLDownloadToFile', 'ShellExecute')),
+    ('HR001', 'Download and execute', ('URLDownloadToFile', 'WinExec')),
+    ('HR001', 'Registry run key persistence', ('RegCreateKeyEx', 'RegSetValueEx')),
+    ('HR002', 'Remote thread injection', ('VirtualAllocEx', 'WriteProcessMemory', 'CreateRemoteThread')),
+    ('HR002', 'Remote thread injection', ('OpenProcess', 'WriteProcessMemory', 'CreateRemoteThread')),
+    ('HR002', 'Process hollowing', ('NtUnmapViewOfSection', 'WriteProcessMemory')),
+    ('HR002', 'Process memory tampering', ('OpenProcess', 'ReadProcessMemory', 'WriteProcessMemory')),
+    # IsDebuggerPresent alone is imported by the standard C runtime's startup code
+    ('HR003', 'Debugger detection', ('CheckRemoteDebuggerPresent',)),
+    ('HR003', 'Debugger detection', ('IsDebuggerPresent', 'FindWindow')),
+    ('HR003', 'Analysis tool window detection', ('FindWindow', 'GetWindowText')),
+)
+
+
+def normalize_api_name(name: str) -> str:
+    """Reduce an imported function name to its lowercase base name, without the A/W suffix"""
+    if len(name) > 2 and name[-1] in 'AW' and name[-2].islower():
+        name = name[:-1]
+    return name.lower()
+
+
+class ImportProfile:
+    """What a PE image imports, reduced to the forms heuristics match against"""
+
+    __slots__ = ('functions', 'imphash', 'api_mask')
+
+    def __init__(self, functions: FrozenSet[str], imphash: Optional[str], api_mask: int):
+        self.functions = functions  # Normalized names of every imported function
+        self.imphash = imphash  # Import hash, for clustering samples built from the same code
+        self.api_mask = api_mask  # Bits of the suspicious APIs imported
+
+
+class ApiIndex:
+    """Assigns every suspicious API a bit so rules are matched with integer ANDs
+
+    A file's imports are reduced to one integer mask when it is parsed; each
+    combination is then a precomputed mask, matched when all of its bits are
+    set in the file's mask.
+    """
+
+    def __init__(self, apis: Iterable[str], combinations: Sequence[ApiCombination] = DEFAULT_API_COMBINATIONS):
+        apis = set(apis)
+        self.bits: Dict[str, int] = {}
+        self.names: Dict[int, str] = {}  # Bit -> API name as spelled in the definitions
+        for api in sorted(apis | {api for _, _, combination in combinations for api in combination}):
+            key = normalize_api_name(api)
+            if key not in self.bits:
+                self.bits[key] = 1 << len(self.bits)
+                self.names[self.bits[key]] = api
+        self.suspicious_mask = 0
+        for api in apis:
+            self.suspicious_mask |= self.bits[normalize_api_name(api)]
+        self.combinations: List[Tuple[str, str, int]] = [
+            (rule_id, indicator, self.mask_for(combination)) for rule_id, indicator, combination in combinations
+        ]
+
+    def mask_for(self, functions: Iterable[str]) -> int:
+        """Get the mask of the indexed APIs among some function names"""
+        bits = self.bits
+        mask = 0
+        for function in functions:
+            mask |= bits.get(normalize_api_name(function), 0)
+        return mask
+
+    def profile(self, imports: Dict[str, List[str]], imphash: Optional[str] = None) -> ImportProfile:
+        """Build the import profile of a parsed import table"""
+        functions = frozenset(normalize_api_name(f) for names in imports.values() for f in names)
+        bits = self.bits
+        mask = 0
+        for function in functions:
+            mask |= bits.get(function, 0)
+        return ImportProfile(functions, imphash, mask)
+
+    def match(self, mask: int) -> List[Tuple[str, str, int]]:
+        """Get every (rule ID, indicator, mask) combination fully present in a mask"""
+        return [combination for combination in self.combinations if mask & combination[2] == combination[2]]
+
+    def api_names(self, mask: int) -> List[str]:
+        """Get the names of the APIs whose bits are set in a mask"""
+        names = []
+        while mask:
+            bit = mask & -mask
+            names.append(self.names[bit])
+            mask ^= bit
+        return sorted(names)
@@ -0,0 +1,271 @@
+"""
+Archive Reader Module
+Streams the members of zip, tar and compressed files without extracting them to disk
+"""
+
+import bz2
+import gzip
+import io
+import lzma
+import tarfile
+import zipfile
+from pathlib import PurePath
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, Optional
+import logging
+
+from base_scanner import BaseScannerError
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_ZIP = 'zip'  # Also JAR, APK and OOXML documents
+ARCHIVE_TAR = 'tar'
+ARCHIVE_GZIP = 'gzip'
+ARCHIVE_BZIP2 = 'bzip2'
+ARCHIVE_XZ = 'xz'
+# Single compressed streams, which may in turn hold a tar archive
+COMPRESSED_STREAMS: Dict[str, Callable[[BinaryIO], BinaryIO]] = {
+    ARCHIVE_GZIP: lambda stream: gzip.GzipFile(fileobj=stream, mode='rb'),
+    ARCHIVE_BZIP2: bz2.BZ2File,
+    ARCHIVE_XZ: lzma.LZMAFile,
+}
+COMPRESSED_SUFFIXES = {'.gz': '', '.tgz': '.tar', '.bz2': '', '.tbz2': '.tar', '.xz': '', '.txz': '.tar'}
+
+DEFAULT_MAX_DEPTH = 3  # Levels of nested archives opened
+DEFAULT_MAX_RATIO = 100  # Decompressed bytes allowed per compressed byte
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024  # Decompressed bytes per top-level archive
+DEFAULT_MAX_MEMBERS = 10000
+DEFAULT_MAX_BUFFERED_SIZE = 64 * 1024 * 1024  # Largest member held in memory, e.g. a nested zip
+RATIO_GRACE_BYTES = 1024 * 1024  # Output below this never trips the ratio limit
+MEMBER_BUFFER_SIZE = 64 * 1024
+PEEK_SIZE = 512  # Enough to recognize a tar header
+
+
+class ArchiveLimitError(BaseScannerError):
+    """Raised when an archive exceeds a depth, ratio, size or member limit"""
+    pass
+
+
+def detect_archive_format(header: bytes) -> Optional[str]:
+    """Identify an archive format this module can open from a file's first bytes"""
+    if header.startswith((b'PK\x03\x04', b'PK\x05\x06')):
+        return ARCHIVE_ZIP
+    if header.startswith(b'\x1f\x8b'):
+        return ARCHIVE_GZIP
+    if header.startswith(b'BZh'):
+        return ARCHIVE_BZIP2
+    if header.startswith(b'\xfd7zXZ\x00'):
+        return ARCHIVE_XZ
+    if header[257:262] == b'ustar':
+        return ARCHIVE_TAR
+    return None
+
+
+class ArchiveLimits:
+    """Bounds on the work and memory one top-level archive may cause"""
+
+    def __init__(self, max_depth: int = DEFAULT_MAX_DEPTH, max_ratio: float = DEFAULT_MAX_RATIO,
+                 max_bytes: int = DEFAULT_MAX_BYTES, max_members: int = DEFAULT_MAX_MEMBERS,
+                 max_buffered_size: int = DEFAULT_MAX_BUFFERED_SIZE):
+        self.max_depth = max_depth
+        self.max_ratio = max_ratio
+        self.max_bytes = max_bytes
+        self.max_members = max_members
+        self.max_buffered_size = max_buffered_size
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> 'ArchiveLimits':
+        """Read the archive_* settings of a scanner config"""
+        max_buffered_size = config.get('archive_max_buffered_size', DEFAULT_MAX_BUFFERED_SIZE)
+        if config.get('max_scan_memory'):
+            max_buffered_size = min(max_buffered_size, config['max_scan_memory'] // 4)
+        return cls(
+            max_depth=config.get('archive_max_depth', DEFAULT_MAX_DEPTH),
+            max_ratio=config.get('archive_max_ratio', DEFAULT_MAX_RATIO),
+            max_bytes=config.get('archive_max_bytes', DEFAULT_MAX_BYTES),
+            max_members=config.get('archive_max_members', DEFAULT_MAX_MEMBERS),
+            max_buffered_size=max_buffered_size
+        )
+
+
+class ArchiveMember:
+    """A member being streamed out of an archive"""
+
+    __slots__ = ('path', 'stream', 'content')
+
+    def __init__(self, path: str, stream: BinaryIO, content: Optional[bytes] = None):
+        self.path = path  # 'container!member', with one '!' per level of nesting
+        self.stream = stream
+        self.content = content  # The whole member, when it was small enough to buffer
+
+
+class _CountingStream(io.RawIOBase):
+    """Counts the compressed bytes a decompressor has consumed"""
+
+    def __init__(self, stream: BinaryIO):
+        self._stream = stream
+        self.count = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        self.count += len(data)
+        return len(data)
+
+
+class _GuardedStream(io.RawIOBase):
+    """Enforces the byte budget and compression ratio limit on decompressed data"""
+
+    def __init__(self, stream: BinaryIO, reader: 'ArchiveReader',
+                 compressed_size: Optional[Callable[[], int]] = None, budgeted: bool = True):
+        self._stream = stream
+        self._reader = reader
+        self._compressed_size = compressed_size
+        self._budgeted = budgeted
+        self.count = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        self.count += len(data)
+
+        limits = self._reader.limits
+        if self._budgeted:
+            self._reader.bytes_read += len(data)
+            if self._reader.bytes_read > limits.max_bytes:
+                raise ArchiveLimitError(f"Archive expands beyond {limits.max_bytes} bytes")
+        if self._compressed_size is not None and self.count > RATIO_GRACE_BYTES and \
+                self.count > limits.max_ratio * max(self._compressed_size(), 1):
+            raise ArchiveLimitError(f"Compression ratio exceeds {limits.max_ratio}")
+        return len(data)
+
+
+class ArchiveReader:
+    """Walks the members of an archive, and of archives nested in it, as streams
+
+    Members are decompressed while they are read, so nothing is written to
+    disk and memory holds at most one buffered member. Tar archives are read
+    strictly sequentially, so each member must be consumed before the next one
+    is requested. Nested zip archives need random access and are only opened
+    when they fit in max_buffered_size.
+    """
+
+    def __init__(self, limits: Optional[ArchiveLimits] = None):
+        self.limits = limits or ArchiveLimits()
+        self.bytes_read = 0  # Decompressed member bytes handed out so far
+        self.member_count = 0
+        self.errors: List[str] = []  # Members or nested archives skipped, and why
+
+    def iter_members(self, stream: BinaryIO, path: str,
+                     archive_format: Optional[str] = None) -> Iterator[ArchiveMember]:
+        """Yield every file inside an archive opened as a binary stream"""
+        if archive_format is None:
+            buffered = io.BufferedReader(stream, MEMBER_BUFFER_SIZE) if not hasattr(stream, 'peek') else stream
+            archive_format = detect_archive_format(buffered.peek(PEEK_SIZE)[:PEEK_SIZE])
+            stream = buffered
+            if archive_format is None:
+                raise ArchiveLimitError(f"Not a supported archive: {path}")
+        yield from self._iter_archive(stream, path, archive_format, 1)
+
+    def _iter_archive(self, stream: BinaryIO, path: str, archive_format: str,
+                      depth: int) -> Iterator[ArchiveMember]:
+        if archive_format == ARCHIVE_ZIP:
+            yield from self._iter_zip(stream, path, depth)
+        elif archive_format == ARCHIVE_TAR:
+            yield from self._iter_tar(stream, path, depth)
+        else:
+            yield from self._iter_compressed(stream, path, archive_format, depth)
+
+    def _iter_zip(self, stream: BinaryIO, path: str, depth: int) -> Iterator[ArchiveMember]:
+        with zipfile.ZipFile(stream) as archive:
+            for info in archive.infolist():
+                if info.is_dir():
+                    continue
+                member_path = f"{path}!{info.filename}"
+                try:
+                    member_stream = archive.open(info)
+                except (RuntimeError, NotImplementedError, zipfile.BadZipFile) as e:
+                    # Encrypted members or unsupported compression methods
+                    self._skip(member_path, str(e))
+                    continue
+                with member_stream:
+                    guarded = _GuardedStream(member_stream, self, lambda size=info.compress_size: size)
+                    yield from self._member(guarded, member_path, depth, info.file_size)
+
+    def _iter_tar(self, stream: BinaryIO, path: str, depth: int) -> Iterator[ArchiveMember]:
+        # Stream mode never seeks, so tar archives inside compressed streams work too
+        with tarfile.open(fileobj=stream, mode='r|') as archive:
+            for info in archive:
+                if not info.isfile():
+                    continue
+                member_stream = archive.extractfile(info)
+                if member_stream is None:
+                    continue
+                guarded = _GuardedStream(member_stream, self)
+                yield from self._member(guarded, f"{path}!{info.name}", depth, info.size)
+
+    def _iter_compressed(self, stream: BinaryIO, path: str, archive_format: str,
+                         depth: int) -> Iterator[ArchiveMember]:
+        counter = _CountingStream(stream)
+        decompressed = COMPRESSED_STREAMS[archive_format](io.BufferedReader(counter, MEMBER_BUFFER_SIZE))
+        guarded = io.BufferedReader(
+            _GuardedStream(decompressed, self, lambda: counter.count, budgeted=False), MEMBER_BUFFER_SIZE
+        )
+        with decompressed:
+            if guarded.peek(PEEK_SIZE)[257:262] == b'ustar':
+                yield from self._iter_tar(guarded, path, depth)
+                return
+            name = PurePath(path.rsplit('!', 1)[-1]).name
+            suffix = PurePath(name).suffix.lower()
+            if suffix in COMPRESSED_SUFFIXES:
+                name = name[:-len(suffix)] + COMPRESSED_SUFFIXES[suffix]
+            yield from self._member(_GuardedStream(guarded, self), f"{path}!{name}", depth, None)
+
+    def _member(self, stream: io.RawIOBase, path: str, depth: int,
+                size: Optional[int]) -> Iterator[ArchiveMember]:
+        """Yield one member, or the members of a nested archive"""
+        self.member_count += 1
+        if self.member_count > self.limits.max_members:
+            raise ArchiveLimitError(f"Archive holds more than {self.limits.max_members} members")
+
+        buffered = io.BufferedReader(stream, MEMBER_BUFFER_SIZE)
+        header = buffered.peek(PEEK_SIZE)[:PEEK_SIZE]
+        nested_format = detect_archive_format(header)
+        if nested_format is not None and depth < self.limits.max_depth:
+            if nested_format != ARCHIVE_ZIP:
+                yield from self._iter_archive(buffered, path, nested_format, depth + 1)
+                return
+            # Zip archives are read from their central directory at the end, so buffer them
+            content = self._read_content(buffered, path, size)
+            if content is not None:
+                yield from self._iter_zip(io.BytesIO(content), path, depth + 1)
+            return
+        if nested_format is not None:
+            self._skip(path, f"nested deeper than {self.limits.max_depth} archives; scanned as a file")
+
+        content = None
+        if header.startswith(b'MZ') and size is not None and size <= self.limits.max_buffered_size:
+            # Executables are also parsed structurally, which needs the whole image
+            content = buffered.read()
+            buffered = io.BytesIO(content)
+        yield ArchiveMember(path, buffered, content)
+
+    def _read_content(self, stream: BinaryIO, path: str, size: Optional[int]) -> Optional[bytes]:
+        limit = self.limits.max_buffered_size
+        if size is not None and size > limit:
+            self._skip(path, f"nested archive larger than {limit} bytes")
+            return None
+        content = stream.read(limit + 1)
+        if len(content) > limit:
+            self._skip(path, f"nested archive larger than {limit} bytes")
+            return None
+        return content
+
+    def _skip(self, path: str, reason: str) -> None:
+        logger.debug(f"Skipping {path}: {reason}")
+        self.errors.append(f"{path}: {reason}")
@@ -4,12 +4,32 @@ Provides abstract base class for all scanner implementations
 """
 
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Optional
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List, Dict, Any, BinaryIO, ContextManager, Optional, Iterator, Tuple, TYPE_CHECKING
 from pathlib import Path
 import logging
+import os
+
+from verdict_cache import VerdictCache, FileIdentity, file_identity, DEFAULT_MAX_ENTRIES
+from duplicate_verdicts import (
+    DuplicateVerdictTable, DEFAULT_MAX_ENTRIES as DEFAULT_DUPLICATE_ENTRIES,
+    DEFAULT_MAX_BYTES as DEFAULT_DUPLICATE_BYTES
+)
+
+if TYPE_CHECKING:
+    from archive_reader import ArchiveReader
+    from file_features import FileFeatures
+    from result_store import ResultStore
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_BATCH_BYTES = 64 * 1024 * 1024  # Target bytes of file data per parallel batch
+DEFAULT_BATCH_FILES = 256  # Upper bound on files per parallel batch
+
+# Scanner instance owned by a parallel scan worker process
+_worker_scanner: Optional['BaseScanner'] = None
+
 
 class BaseScannerError(Exception):
     """Base exception for scanner errors"""
@@ -19,6 +39,10 @@ class BaseScannerError(Exception):
 class ScanResult:
     """Represents the result of a scan operation"""
     
+    # No per-instance __dict__; sweeps over millions of files keep every result
+    __slots__ = ('file_path', 'threat_detected', 'threat_type', 'confidence', 'details', 'timestamp',
+                 'generation')
+    
     def __init__(self, file_path: str, threat_detected: bool = False, 
                  threat_type: Optional[str] = None, confidence: float = 0.0,
                  details: Optional[Dict[str, Any]] = None):
@@ -28,6 +52,7 @@ class ScanResult:
         self.confidence = confidence
         self.details = details or {}
         self.timestamp = None  # Will be set by scanner
+        self.generation: Optional[str] = None  # ID of the definitions generation that produced it
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert scan result to dictionary format"""
@@ -37,17 +62,54 @@ class ScanResult:
             'threat_type': self.threat_type,
             'confidence': self.confidence,
             'details': self.details,
-            'timestamp': self.timestamp
+            'timestamp': self.timestamp,
+            'generation': self.generation
         }
+        
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ScanResult':
+        """Create a scan result from its dictionary format"""
+        result = cls(
+            file_path=data['file_path'],
+            threat_detected=data.get('threat_detected', False),
+            threat_type=data.get('threat_type'),
+            confidence=data.get('confidence', 0.0),
+            details=data.get('details')
+        )
+        result.timestamp = data.get('timestamp')
+        result.generation = data.get('generation')
+        return result
 
 
 class BaseScanner(ABC):
     """Abstract base class for all scanner implementations"""
     
+    error_class = BaseScannerError
+    
     def __init__(self, name: str, config: Optional[Dict[str, Any]] = None):
         self.name = name
         self.config = config or {}
         self.is_initialized = False
+        self._verdict_cache: Optional[VerdictCache] = None
+        # (directory, name prefix) of the cache database and its -wal and -shm files
+        self._verdict_cache_files: Optional[Tuple[str, str]] = None
+        if self.config.get('verdict_cache_path'):
+            self._verdict_cache = VerdictCache(
+                Path(self.config['verdict_cache_path']),
+                max_entries=self.config.get('verdict_cache_max_entries', DEFAULT_MAX_ENTRIES)
+            )
+            cache_path = Path(self.config['verdict_cache_path']).resolve()
+            self._verdict_cache_files = (str(cache_path.parent), cache_path.name)
+        # Verdicts of files already scanned, reused for later copies of the same contents.
+        # Files are matched by the sha256 of the scan's own read, so the table
+        # costs nothing extra where an engine hashes files anyway; scanners
+        # that do not can leave it off by default
+        self._duplicate_verdicts: Optional[DuplicateVerdictTable] = None
+        if self.config.get('duplicate_verdicts', True):
+            self._duplicate_verdicts = DuplicateVerdictTable(
+                max_entries=self.config.get('duplicate_verdicts_max_entries', DEFAULT_DUPLICATE_ENTRIES),
+                max_bytes=self.config.get('duplicate_verdicts_max_bytes', DEFAULT_DUPLICATE_BYTES)
+            )
         
     def initialize(self) -> None:
         """Initialize the scanner with necessary resources"""
@@ -65,20 +127,331 @@ class BaseScanner(ABC):
         """Scan a single file for threats"""
         pass
         
-    @abstractmethod
     def scan_directory(self, directory_path: Path, recursive: bool = True) -> List[ScanResult]:
         """Scan a directory for threats"""
-        pass
+        return list(self.iter_scan_directory(directory_path, recursive))
+        
+    def scan_directory_compact(self, directory_path: Path, recursive: bool = True,
+                               keep_details: str = 'threats') -> 'ResultStore':
+        """Scan a directory into a columnar result store instead of a list of objects
+        
+        Memory per file stays a few dozen bytes; by default result details are
+        only kept for detections.
+        """
+        from result_store import ResultStore  # Imported here; result_store builds on ScanResult
+        
+        store = ResultStore(keep_details)
+        store.extend(self.iter_scan_directory(directory_path, recursive))
+        return store
+        
+    def iter_scan_directory(self, directory_path: Path, recursive: bool = True) -> Iterator[ScanResult]:
+        """Scan a directory for threats, yielding each result as soon as it is produced
+        
+        Files are discovered lazily while scanning, so memory stays bounded
+        regardless of how many files the directory tree holds.
+        """
+        self._validate_directory_scan(directory_path)
+        return self._iter_directory_results(directory_path, recursive)
+        
+    def _iter_directory_results(self, directory_path: Path, recursive: bool) -> Iterator[ScanResult]:
+        for entry in self._walk_directory(directory_path, recursive):
+            try:
+                yield self.scan_file(Path(entry.path))
+            except Exception as e:
+                logger.error(f"Failed to scan {entry.path}: {str(e)}")
+                
+    def _validate_directory_scan(self, directory_path: Path) -> None:
+        """Check that the scanner is ready and the directory can be scanned"""
+        if not self.is_initialized:
+            raise self.error_class("Scanner not initialized")
+            
+        if not directory_path.exists() or not directory_path.is_dir():
+            raise self.error_class(f"Invalid directory: {directory_path}")
+            
+    def _walk_directory(self, directory_path: Path, recursive: bool) -> Iterator[os.DirEntry]:
+        """Lazily yield the entry of every file in a directory tree
+        
+        The verdict cache's own files are skipped: they change with every
+        stored verdict, so scanning them never hits the cache.
+        """
+        pending = [str(directory_path)]
+        while pending:
+            directory = pending.pop()
+            ignored = None
+            if self._verdict_cache_files is not None and \
+                    os.path.realpath(directory) == self._verdict_cache_files[0]:
+                ignored = self._verdict_cache_files[1]
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if ignored is not None and entry.name.startswith(ignored):
+                            continue
+                        try:
+                            if entry.is_file():
+                                yield entry
+                            elif recursive and entry.is_dir(follow_symlinks=False):
+                                pending.append(entry.path)
+                        except OSError as e:
+                            logger.error(f"Failed to stat {entry.path}: {str(e)}")
+            except OSError as e:
+                logger.error(f"Failed to list directory: {str(e)}")
+                
+    def iter_scan_archive(self, file_path: Path) -> Iterator[ScanResult]:
+        """Scan every member of an archive without extracting it, one result per member
+        
+        Members are decompressed while they are scanned and nested archives are
+        opened up to archive_max_depth levels deep; each result's path names
+        the member as 'container!member'. Members that fail or break a limit
+        are logged and skipped. Only scanners that expose a feature_extractor
+        and _scan_features can scan archives.
+        """
+        if not self.is_initialized:
+            raise self.error_class("Scanner not initialized")
+        return self._iter_archive_file(file_path, self._create_archive_reader())
+        
+    def _iter_archive_file(self, file_path: Path, reader: 'ArchiveReader') -> Iterator[ScanResult]:
+        with open(file_path, 'rb') as f:
+            yield from self._iter_archive_results(f, file_path, reader)
+            
+    def _create_archive_reader(self) -> 'ArchiveReader':
+        from archive_reader import ArchiveReader, ArchiveLimits  # Imported here; archive_reader builds on BaseScannerError
+        
+        return ArchiveReader(ArchiveLimits.from_config(self.config))
+        
+    def _is_scannable_archive(self, header: bytes) -> bool:
+        """Whether scan_file should also scan the members of a file with this header"""
+        from archive_reader import detect_archive_format
+        
+        return self.config.get('scan_archives', True) and detect_archive_format(header) is not None
+        
+    def _extract_features(self, file_path: Path) -> Tuple['FileFeatures', Optional[Dict[str, Any]]]:
+        """Read a file once for its features and, when it is an archive, its members' results
+        
+        The members of an archive are scanned from the same read that feeds
+        the archive's own feature extraction.
+        """
+        from archive_reader import PEEK_SIZE
+        from file_features import FeedingStream
+        
+        with open(file_path, 'rb') as f:
+            header = f.read(PEEK_SIZE)
+            f.seek(0)
+            if not self._is_scannable_archive(header):
+                return self.feature_extractor.extract_stream(f, str(file_path)), None
+            stream = FeedingStream(f, self.feature_extractor.start_extraction(str(file_path)),
+                                   self.feature_extractor.chunk_size)
+            archive = self._scan_archive_members(stream, file_path)
+            return stream.finish(), archive
+            
+    def _iter_archive_results(self, stream: BinaryIO, file_path: Path,
+                              reader: 'ArchiveReader') -> Iterator[ScanResult]:
+        members = reader.iter_members(stream, str(file_path))
+        while True:
+            try:
+                member = next(members)
+            except StopIteration:
+                return
+            except Exception as e:
+                # The walk cannot resume past a corrupt header or a broken limit
+                logger.error(f"Stopped reading archive {file_path}: {str(e)}")
+                reader.errors.append(f"{file_path}: {str(e)}")
+                return
+                
+            try:
+                with self._pin_definitions():
+                    features = self.feature_extractor.extract_stream(member.stream, member.path)
+                    features.container = str(file_path)
+                    features.content = member.content
+                    result = self._stamp_generation(self._scan_features(Path(member.path), features))
+                yield result
+            except Exception as e:
+                logger.error(f"Failed to scan {member.path}: {str(e)}")
+                reader.errors.append(f"{member.path}: {str(e)}")
+                
+    def _scan_archive_members(self, stream: BinaryIO, file_path: Path) -> Dict[str, Any]:
+        """Scan the members of an archive opened as a stream, keeping only detected members' results"""
+        reader = self._create_archive_reader()
+        detections = []
+        scanned = 0
+        for member_result in self._iter_archive_results(stream, file_path, reader):
+            scanned += 1
+            if member_result.threat_detected:
+                detections.append(member_result.to_dict())
+                
+        return {
+            'members_scanned': scanned,
+            'bytes_scanned': reader.bytes_read,
+            'detections': detections,
+            'errors': reader.errors
+        }
+        
+    def _fold_archive_members(self, result: ScanResult, archive: Dict[str, Any]) -> ScanResult:
+        """Fold the results of an archive's members into the result for the archive itself
+        
+        The archive is reported as a threat when any member is.
+        """
+        result.details['archive'] = archive
+        detections = archive['detections']
+        if detections and not result.threat_detected:
+            verdict = max(detections, key=lambda r: r['confidence'])
+            result.threat_detected = True
+            result.threat_type = verdict['threat_type']
+            result.confidence = verdict['confidence']
+            result.details['archive_member'] = verdict['file_path']
+        return result
         
     @abstractmethod
     def update_definitions(self) -> bool:
         """Update scanner definitions/rules"""
         pass
         
+    def get_definitions_version(self) -> str:
+        """Get a version string identifying the currently loaded definitions
+        
+        Cached verdicts are only reused while this value is unchanged. During
+        a scan this is the version of the generation the scan pinned.
+        """
+        return ''
+        
+    def _pin_definitions(self) -> ContextManager:
+        """Keep the current definitions generation in use for the duration of a scan"""
+        return nullcontext()
+        
+    def _stamp_generation(self, result: ScanResult) -> ScanResult:
+        """Record which definitions produced a fresh result"""
+        result.generation = self.get_definitions_version() or None
+        return result
+        
+    def _lookup_cached_verdict(self, file_path: Path) -> Tuple[Optional[ScanResult], Optional[FileIdentity]]:
+        """Look up a still-valid cached verdict for a file
+        
+        Returns the cached result, if any, and the file identity to store a
+        fresh verdict under (None when caching is disabled).
+        """
+        if self._verdict_cache is None:
+            return None, None
+            
+        identity = file_identity(os.stat(file_path))
+        cached = self._verdict_cache.get(self.name, identity, self.get_definitions_version())
+        if cached is not None:
+            logger.debug(f"Using cached verdict for {file_path}")
+            result = ScanResult.from_dict(cached)
+            # Renames and hard links keep the identity, so the stored path may be another name
+            result.file_path = str(file_path)
+            return result, identity
+        return None, identity
+        
+    def _store_cached_verdict(self, identity: Optional[FileIdentity], result: ScanResult) -> None:
+        """Persist a verdict produced from a file with the given identity"""
+        if self._verdict_cache is not None and identity is not None:
+            self._verdict_cache.put(self.name, identity, self.get_definitions_version(),
+                                    result.to_dict())
+            
+    def _lookup_duplicate_verdict(self, file_path: Path, features: 'FileFeatures') -> Optional[ScanResult]:
+        """Get the verdict of an earlier file with the same contents, by the digest of this file's read"""
+        sha256 = features.digests.get('sha256')
+        if self._duplicate_verdicts is None or sha256 is None:
+            return None
+        duplicate = self._duplicate_verdicts.lookup(sha256, self.get_definitions_version())
+        if duplicate is None:
+            return None
+        result = ScanResult.from_dict(duplicate)
+        result.file_path = str(file_path)
+        result.details['duplicate_of'] = duplicate['file_path']
+        return result
+        
+    def _store_duplicate_verdict(self, features: 'FileFeatures', result: ScanResult) -> None:
+        """Record a fresh verdict for later files with the same contents"""
+        sha256 = features.digests.get('sha256')
+        if self._duplicate_verdicts is not None and sha256 is not None:
+            self._duplicate_verdicts.store(sha256, self.get_definitions_version(), result.to_dict())
+            
+    def _invalidate_cached_verdicts(self) -> None:
+        """Drop cached verdicts produced by any other definitions version"""
+        if self._verdict_cache is not None:
+            self._verdict_cache.invalidate(self.name, keep_version=self.get_definitions_version())
+            
+    def _flush_cached_verdicts(self) -> None:
+        """Write any buffered verdicts to the persistent cache"""
+        if self._verdict_cache is not None:
+            self._verdict_cache.flush()
+            
+    def scan_directory_parallel(self, directory_path: Path, recursive: bool = True,
+                                workers: Optional[int] = None) -> Iterator[ScanResult]:
+        """Scan a directory across a pool of worker processes
+        
+        Each worker receives a copy of this scanner once, at start-up. Files are
+        handed out in size-balanced batches, largest first, and results are
+        yielded in completion order.
+        """
+        self._validate_directory_scan(directory_path)
+        workers = workers or self.config.get('scan_workers') or os.cpu_count() or 1
+        batches = self._build_scan_batches(self._list_directory_files(directory_path, recursive))
+        logger.info(f"Scanning {directory_path} with {workers} workers in {len(batches)} batches")
+        self._flush_cached_verdicts()
+        return self._iter_parallel_results(batches, workers)
+        
+    def _iter_parallel_results(self, batches: List[List[str]], workers: int) -> Iterator[ScanResult]:
+        """Run batches on a process pool and yield results as batches complete"""
+        with ProcessPoolExecutor(max_workers=workers, initializer=_initialize_worker,
+                                 initargs=(self,)) as executor:
+            futures = [executor.submit(_scan_batch, batch) for batch in batches]
+            for future in as_completed(futures):
+                results, statistics = future.result()
+                if statistics is not None:
+                    self._merge_worker_statistics(statistics)
+                yield from results
+                
+    def _take_worker_statistics(self) -> Any:
+        """Get and reset the measurements a scan worker's copy has recorded, if any"""
+        return None
+        
+    def _merge_worker_statistics(self, statistics: Any) -> None:
+        """Add measurements taken from a scan worker's copy of this scanner"""
+        pass
+                
+    def _list_directory_files(self, directory_path: Path, recursive: bool) -> List[Tuple[str, int]]:
+        """List (path, size) of every file in a directory"""
+        files = []
+        for entry in self._walk_directory(directory_path, recursive):
+            try:
+                files.append((entry.path, entry.stat().st_size))
+            except OSError as e:
+                logger.error(f"Failed to stat {entry.path}: {str(e)}")
+        return files
+        
+    def _build_scan_batches(self, files: List[Tuple[str, int]]) -> List[List[str]]:
+        """Group files into batches of roughly equal total size
+        
+        Largest files come first so they start early, and any file at or above
+        the batch size gets a batch of its own rather than stalling small files.
+        """
+        batch_bytes = self.config.get('scan_batch_bytes', DEFAULT_BATCH_BYTES)
+        batch_files = self.config.get('scan_batch_files', DEFAULT_BATCH_FILES)
+        batches = []
+        current: List[str] = []
+        current_bytes = 0
+        
+        for path, size in sorted(files, key=lambda item: item[1], reverse=True):
+            if size >= batch_bytes:
+                batches.append([path])
+                continue
+            if current and (current_bytes + size > batch_bytes or len(current) >= batch_files):
+                batches.append(current)
+                current, current_bytes = [], 0
+            current.append(path)
+            current_bytes += size
+            
+        if current:
+            batches.append(current)
+        return batches
+        
     def cleanup(self) -> None:
         """Cleanup scanner resources"""
         logger.info(f"Cleaning up {self.name} scanner")
         self._cleanup()
+        if self._verdict_cache is not None:
+            self._verdict_cache.close()
         self.is_initialized = False
         
     def _cleanup(self) -> None:
@@ -91,5 +464,34 @@ class BaseScanner(ABC):
             'name': self.name,
             'type': self.__class__.__name__,
             'is_initialized': self.is_initialized,
-            'config': self.config
+            'config': self.config,
+            'definitions_version': self.get_definitions_version(),
+            'verdict_cache': self._verdict_cache.get_statistics() if self._verdict_cache else None,
+            'duplicate_verdicts': self._duplicate_verdicts.get_statistics() if self._duplicate_verdicts else None
         }
+
+
+def _initialize_worker(scanner: BaseScanner) -> None:
+    """Install the scanner copy used by this worker process"""
+    global _worker_scanner
+    _worker_scanner = scanner
+    # The copy carries the measurements the parent already has
+    scanner._take_worker_statistics()
+    if not scanner.is_initialized:
+        scanner.initialize()
+
+
+def _scan_batch(paths: List[str]) -> Tuple[List[ScanResult], Any]:
+    """Scan a batch of files with this worker's scanner
+    
+    Returns the results and the measurements recorded meanwhile, for the
+    parent to merge.
+    """
+    results = []
+    for path in paths:
+        try:
+            results.append(_worker_scanner.scan_file(Path(path)))
+        except Exception as e:
+            logger.error(f"Failed to scan {path}: {str(e)}")
+    _worker_scanner._flush_cached_verdicts()
+    return results, _worker_scanner._take_worker_statistics()
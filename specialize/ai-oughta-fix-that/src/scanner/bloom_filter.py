@@ -0,0 +1,84 @@
+"""
+Bloom Filter Module
+Compact probabilistic prefilter for hash signature lookups
+"""
+
+import math
+from typing import Any, Dict, Optional, Union
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FALSE_POSITIVE_RATE = 0.01
+
+Buffer = Union[bytearray, memoryview]
+
+
+class BloomFilter:
+    """Bloom filter keyed by cryptographic digests
+
+    Digests are already uniformly distributed, so the bit positions are
+    derived from the digest bytes themselves by double hashing instead of
+    hashing the key again.
+    """
+
+    def __init__(self, bit_count: int, hash_count: int, bits: Optional[Buffer] = None,
+                 false_positive_rate: Optional[float] = None):
+        if bit_count <= 0 or hash_count <= 0:
+            raise ValueError("Bloom filter needs a positive bit and hash count")
+        self.bit_count = bit_count
+        self.hash_count = hash_count
+        self.false_positive_rate = false_positive_rate
+        self.bits = bits if bits is not None else bytearray((bit_count + 7) // 8)
+        self.rejected = 0
+        self.passed = 0
+        self.false_positives = 0  # Passed the filter but missing from the full index
+
+    @classmethod
+    def for_capacity(cls, capacity: int,
+                     false_positive_rate: float = DEFAULT_FALSE_POSITIVE_RATE) -> 'BloomFilter':
+        """Size a filter for the expected number of entries and false positive rate"""
+        if not 0 < false_positive_rate < 1:
+            raise ValueError("False positive rate must be between 0 and 1")
+        capacity = max(capacity, 1)
+        bit_count = max(int(math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)), 8)
+        hash_count = max(int(round(bit_count / capacity * math.log(2))), 1)
+        return cls(bit_count, hash_count, false_positive_rate=false_positive_rate)
+
+    def _positions(self, digest: bytes):
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:16], 'little') | 1
+        bit_count = self.bit_count
+        for index in range(self.hash_count):
+            yield (first + index * second) % bit_count
+
+    def add(self, digest: bytes) -> None:
+        """Add a digest of at least 16 bytes"""
+        bits = self.bits
+        for position in self._positions(digest):
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, digest: bytes) -> bool:
+        bits = self.bits
+        bit_count = self.bit_count
+        first = int.from_bytes(digest[:8], 'little')
+        second = int.from_bytes(digest[8:16], 'little') | 1
+        for index in range(self.hash_count):
+            position = (first + index * second) % bit_count
+            if not bits[position >> 3] & (1 << (position & 7)):
+                self.rejected += 1
+                return False
+        self.passed += 1
+        return True
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get the filter configuration and how many lookups it rejected"""
+        return {
+            'false_positive_rate': self.false_positive_rate,
+            'bit_count': self.bit_count,
+            'hash_count': self.hash_count,
+            'size_bytes': len(self.bits),
+            'rejected': self.rejected,
+            'passed': self.passed,
+            'false_positives': self.false_positives
+        }
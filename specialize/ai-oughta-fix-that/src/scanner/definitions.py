@@ -0,0 +1,185 @@
+"""
+Definitions Module
+Immutable generations of scanner definitions, swapped atomically while scans run
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Set
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class DefinitionsGeneration:
+    """An immutable snapshot of a scanner's compiled definitions
+
+    Scans pin the generation that is current when they start and use it
+    throughout, so a reload never changes definitions under a running scan.
+    Generations built from identical definitions share a generation ID, so
+    IDs stay comparable across processes and restarts.
+    """
+
+    def __init__(self, version: str):
+        self.version = version
+        self.sequence = 0  # Assigned when published; counts reloads within this process
+        self._pins = 0
+        self._retired = False
+
+    @property
+    def generation_id(self) -> str:
+        return self.version
+
+    def release(self, live: List['DefinitionsGeneration']) -> None:
+        """Free resources once no scan uses this generation any more
+
+        Resources shared with a live generation, which may still be in use,
+        must be kept.
+        """
+        pass
+
+
+class DefinitionsManager:
+    """Publishes definition generations and pins them for the scans that use them
+
+    Publishing swaps the current generation in one assignment. The previous
+    generation is retired and released as soon as the last scan pinning it
+    finishes; scans starting after the swap pin the new one. Pins are per
+    thread and nest, so a scan that calls back into its scanner keeps the
+    generation it started with.
+    """
+
+    def __init__(self, generation: DefinitionsGeneration):
+        self._lock = threading.Lock()
+        # Held while definitions are edited and published, so no half-applied edit is published
+        self.edit_lock = threading.RLock()
+        self._local = threading.local()
+        self._build_lock = threading.Lock()  # One rebuild compiles at a time
+        self._draining: Set[DefinitionsGeneration] = set()  # Retired but still pinned
+        self._sequence = 0
+        self.edits = 0  # Edits made so far
+        self._published_edits = 0  # Edits included in the current generation
+        self.current = generation
+        self._publish(generation)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Pins belong to this process's threads; other processes start unpinned
+        return {'current': self.current, '_sequence': self._sequence,
+                'edits': self.edits, '_published_edits': self._published_edits}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self.edit_lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._local = threading.local()
+        self._draining = set()
+
+    @property
+    def is_stale(self) -> bool:
+        """Whether definitions were edited since the current generation was built"""
+        return self.edits != self._published_edits
+
+    def mark_edited(self) -> None:
+        """Record an edit; the next rebuild publishes it"""
+        with self.edit_lock:
+            self.edits += 1
+
+    def rebuild(self, snapshot: Callable[[], Callable[[DefinitionsGeneration], DefinitionsGeneration]],
+                wait: bool = True) -> bool:
+        """Build a generation from the edited definitions and publish it
+
+        snapshot runs under edit_lock and must copy the edited definitions; the
+        builder it returns compiles them outside the lock, given the current
+        generation to reuse compiled parts from. Without wait, returns False
+        at once when another rebuild is running.
+        """
+        if not self._build_lock.acquire(blocking=wait):
+            return False
+        try:
+            with self.edit_lock:
+                edits = self.edits
+                build = snapshot()
+            generation = build(self.current)
+            # Edits made during the build stay pending for the next rebuild
+            self._published_edits = edits
+            self.publish(generation)
+            return True
+        finally:
+            self._build_lock.release()
+
+    def _pinned_stack(self) -> List[DefinitionsGeneration]:
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @property
+    def is_pinned(self) -> bool:
+        """Whether this thread is inside a scan that pinned a generation"""
+        return bool(self._pinned_stack())
+
+    @property
+    def pinned(self) -> DefinitionsGeneration:
+        """The generation pinned by this thread's scan, or the current one outside scans"""
+        stack = self._pinned_stack()
+        return stack[-1] if stack else self.current
+
+    @contextmanager
+    def pin(self) -> Iterator[DefinitionsGeneration]:
+        """Keep one generation in use for the duration of a scan"""
+        stack = self._pinned_stack()
+        if stack:
+            yield stack[-1]
+            return
+
+        with self._lock:
+            generation = self.current
+            generation._pins += 1
+        stack.append(generation)
+        try:
+            yield generation
+        finally:
+            stack.pop()
+            with self._lock:
+                generation._pins -= 1
+                drained = generation._retired and not generation._pins
+                if drained:
+                    self._draining.discard(generation)
+            if drained:
+                self._release(generation)
+
+    def publish(self, generation: DefinitionsGeneration) -> DefinitionsGeneration:
+        """Make a generation current, retiring the previous one; returns the previous one"""
+        with self._lock:
+            previous = self.current
+            self._publish(generation)
+            self.current = generation
+            previous._retired = True
+            drained = not previous._pins
+            if not drained:
+                self._draining.add(previous)
+        logger.info(f"Published definitions generation {generation.sequence} ({generation.generation_id})")
+        if drained:
+            self._release(previous)
+        return previous
+
+    def _publish(self, generation: DefinitionsGeneration) -> None:
+        self._sequence += 1
+        generation.sequence = self._sequence
+
+    def _release(self, generation: DefinitionsGeneration) -> None:
+        with self._lock:
+            live = [self.current, *self._draining]
+        logger.debug(f"Releasing definitions generation {generation.sequence}")
+        generation.release(live)
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get the current generation and how many retired ones scans still hold"""
+        with self._lock:
+            draining = len(self._draining)
+        return {
+            'generation': self.current.sequence,
+            'generation_id': self.current.generation_id,
+            'draining_generations': draining
+        }
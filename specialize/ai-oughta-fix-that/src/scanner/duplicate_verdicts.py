@@ -0,0 +1,123 @@
+"""
+Duplicate Verdicts Module
+In-memory table reusing verdicts across files with identical contents
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 100_000
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024  # Approximate memory for recorded verdicts
+MAX_DETAILS_SIZE = 64 * 1024  # Verdicts with larger serialized details are not recorded
+VERDICT_OVERHEAD = 300  # Approximate size of a recorded verdict besides its path and details
+
+
+class _RecordedVerdict:
+    """What is kept of a scanned file's result: the verdict and its serialized details"""
+
+    __slots__ = ('definitions_version', 'file_path', 'threat_detected', 'threat_type', 'confidence',
+                 'generation', 'details', 'size')
+
+    def __init__(self, definitions_version: str, result: Dict[str, Any], details: str):
+        self.definitions_version = definitions_version
+        self.file_path = result['file_path']
+        self.threat_detected = result['threat_detected']
+        self.threat_type = result['threat_type']
+        self.confidence = result['confidence']
+        self.generation = result['generation']
+        self.details = details
+        self.size = VERDICT_OVERHEAD + len(self.file_path) + len(details)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'file_path': self.file_path,
+            'threat_detected': self.threat_detected,
+            'threat_type': self.threat_type,
+            'confidence': self.confidence,
+            'details': json.loads(self.details),
+            'generation': self.generation
+        }
+
+
+class DuplicateVerdictTable:
+    """Content-addressed verdicts of the files scanned so far
+
+    Files are looked up by the sha256 digest their scan's single read
+    computes, so a duplicate still costs one read and the feature extraction;
+    what it saves is rule evaluation and archive expansion. Scanners whose
+    extractor would not otherwise compute sha256 pay for hashing every file.
+
+    Verdicts are kept as their fields and JSON details, as in the verdict
+    cache; those with details over MAX_DETAILS_SIZE are not recorded. Least
+    recently used verdicts are evicted beyond max_entries or max_bytes. The
+    table may be shared between threads.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._verdicts: 'OrderedDict[bytes, _RecordedVerdict]' = OrderedDict()  # By sha256 digest
+        self._verdict_bytes = 0
+        self._lock = threading.Lock()
+        self._statistics = {'lookups': 0, 'hits': 0, 'oversized': 0}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def lookup(self, sha256: bytes, definitions_version: str) -> Optional[Dict[str, Any]]:
+        """Get the result dictionary of an earlier file with this digest and definitions, if any"""
+        with self._lock:
+            self._statistics['lookups'] += 1
+            verdict = self._verdicts.get(sha256)
+            if verdict is None or verdict.definitions_version != definitions_version:
+                return None
+            self._verdicts.move_to_end(sha256)
+            self._statistics['hits'] += 1
+        logger.debug(f"Reusing the verdict of {verdict.file_path} for a duplicate")
+        return verdict.to_dict()
+
+    def store(self, sha256: bytes, definitions_version: str, result: Dict[str, Any]) -> None:
+        """Record a scanned file's verdict under its sha256 digest"""
+        details = json.dumps(result['details'], default=str)
+        if len(details) > MAX_DETAILS_SIZE:
+            with self._lock:
+                self._statistics['oversized'] += 1
+            return
+        verdict = _RecordedVerdict(definitions_version, result, details)
+
+        with self._lock:
+            replaced = self._verdicts.pop(sha256, None)
+            if replaced is not None:
+                self._verdict_bytes -= replaced.size
+            self._verdicts[sha256] = verdict
+            self._verdict_bytes += verdict.size
+            while len(self._verdicts) > self.max_entries or self._verdict_bytes > self.max_bytes:
+                _, evicted = self._verdicts.popitem(last=False)
+                self._verdict_bytes -= evicted.size
+
+    def clear(self) -> None:
+        """Forget every file seen so far"""
+        with self._lock:
+            self._verdicts.clear()
+            self._verdict_bytes = 0
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get lookup and hit counts, the table size and the share of files that were duplicates"""
+        with self._lock:
+            statistics = dict(self._statistics)
+            statistics['verdicts'] = len(self._verdicts)
+            statistics['verdict_bytes'] = self._verdict_bytes
+        lookups = statistics['lookups']
+        statistics['duplicate_hit_rate'] = statistics['hits'] / lookups if lookups else 0.0
+        return statistics
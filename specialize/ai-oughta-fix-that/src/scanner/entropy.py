@@ -0,0 +1,138 @@
+"""
+Entropy Module
+Vectorized Shannon entropy over whole files and sliding windows
+"""
+
+from typing import List, Optional, Tuple
+import logging
+
+import numpy as np
+
+from file_features import ChunkConsumer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW_SIZE = 32 * 1024
+DEFAULT_WINDOW_STRIDE = 8 * 1024
+
+
+def byte_histogram(data: bytes) -> np.ndarray:
+    """Count occurrences of every byte value"""
+    return np.bincount(np.frombuffer(data, dtype=np.uint8), minlength=256)
+
+
+def shannon_entropy(histogram: np.ndarray) -> float:
+    """Calculate Shannon entropy in bits per byte from a byte histogram"""
+    total = histogram.sum()
+    if not total:
+        return 0.0
+    probabilities = histogram[histogram > 0] / total
+    return float(-(probabilities * np.log2(probabilities)).sum())
+
+
+def _entropy_rows(histograms: np.ndarray, total: int) -> np.ndarray:
+    """Calculate the entropy of every row of a (windows x 256) histogram matrix"""
+    probabilities = histograms / total
+    logs = np.log2(probabilities, out=np.zeros_like(probabilities), where=probabilities > 0)
+    return -(probabilities * logs).sum(axis=1)
+
+
+def windowed_entropy(data: bytes, window_size: int = DEFAULT_WINDOW_SIZE,
+                     stride: int = DEFAULT_WINDOW_STRIDE) -> np.ndarray:
+    """Calculate the entropy of every full window of data, one window per stride"""
+    accumulator = EntropyAccumulator(window_size, stride, keep_window_entropies=True)
+    accumulator.update(data, 0)
+    return np.asarray(accumulator.finish().window_entropies)
+
+
+class EntropyProfile:
+    """Summary of the sliding-window entropy of a file"""
+
+    def __init__(self, window_size: int, stride: int):
+        self.window_size = window_size
+        self.stride = stride
+        self.window_count = 0
+        self.max_window_entropy = 0.0
+        self.high_entropy_regions: List[Tuple[int, int]] = []  # Merged (start, end) offsets
+        self.window_entropies: Optional[List[float]] = None
+
+
+class EntropyAccumulator(ChunkConsumer):
+    """Streams a file through vectorized sliding-window entropy
+
+    Each chunk is split into stride-sized blocks whose histograms are computed
+    with a single bincount; window histograms are differences of running sums
+    over those blocks, so every window costs O(256) regardless of its size.
+    """
+
+    def __init__(self, window_size: int = DEFAULT_WINDOW_SIZE,
+                 stride: int = DEFAULT_WINDOW_STRIDE,
+                 threshold: Optional[float] = None,
+                 max_regions: int = 64,
+                 keep_window_entropies: bool = False):
+        if stride <= 0 or window_size < stride or window_size % stride:
+            raise ValueError("Window size must be a positive multiple of the stride")
+        self.threshold = threshold
+        self.max_regions = max_regions
+        self.profile = EntropyProfile(window_size, stride)
+        if keep_window_entropies:
+            self.profile.window_entropies = []
+        self._blocks_per_window = window_size // stride
+        self._partial = np.empty(0, dtype=np.uint8)  # Bytes of an unfinished block
+        self._previous_blocks = np.zeros((0, 256), dtype=np.int64)  # Tail of the last chunk
+        self._next_window_offset = 0
+
+    def update(self, chunk: bytes, offset: int) -> None:
+        """Consume the next chunk of the file"""
+        stride = self.profile.stride
+        data = np.frombuffer(chunk, dtype=np.uint8)
+        if len(self._partial):
+            data = np.concatenate((self._partial, data))
+
+        block_count = len(data) // stride
+        self._partial = data[block_count * stride:].copy()
+        if not block_count:
+            return
+
+        # One bincount for all blocks: offset each block's bytes into its own 256 bins
+        blocks = data[:block_count * stride].reshape(block_count, stride).astype(np.intp)
+        blocks += (np.arange(block_count, dtype=np.intp) * 256)[:, None]
+        block_histograms = np.bincount(blocks.ravel(), minlength=block_count * 256)
+        block_histograms = block_histograms.reshape(block_count, 256)
+        block_histograms = np.concatenate((self._previous_blocks, block_histograms))
+
+        window_blocks = self._blocks_per_window
+        self._previous_blocks = block_histograms[-(window_blocks - 1):] if window_blocks > 1 \
+            else block_histograms[:0]
+        if len(block_histograms) < window_blocks:
+            return
+
+        running = np.zeros((len(block_histograms) + 1, 256), dtype=np.int64)
+        np.cumsum(block_histograms, axis=0, out=running[1:])
+        window_histograms = running[window_blocks:] - running[:-window_blocks]
+        entropies = _entropy_rows(window_histograms, self.profile.window_size)
+        self._record_windows(entropies)
+
+    def _record_windows(self, entropies: np.ndarray) -> None:
+        profile = self.profile
+        first_offset = self._next_window_offset
+        profile.window_count += len(entropies)
+        profile.max_window_entropy = max(profile.max_window_entropy, float(entropies.max()))
+        if profile.window_entropies is not None:
+            profile.window_entropies.extend(entropies.tolist())
+        self._next_window_offset += len(entropies) * profile.stride
+
+        if self.threshold is None:
+            return
+        regions = profile.high_entropy_regions
+        for index in np.flatnonzero(entropies >= self.threshold).tolist():
+            start = first_offset + index * profile.stride
+            end = start + profile.window_size
+            if regions and start <= regions[-1][1]:
+                regions[-1] = (regions[-1][0], end)
+            elif len(regions) < self.max_regions:
+                regions.append((start, end))
+
+    def finish(self) -> EntropyProfile:
+        """Return the entropy profile; a trailing partial window is not scored"""
+        return self.profile
@@ -0,0 +1,384 @@
+"""
+File Features Module
+Single-pass feature extraction shared by all scanner implementations
+"""
+
+import hashlib
+import io
+import re
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import List, Dict, Any, Callable, Collection, Optional, Sequence, Tuple, BinaryIO
+import logging
+
+import numpy as np
+
+from instrumentation import ScanInstrumentation, MEASURE_FIRST_ARGUMENT, MEASURE_RESULT
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024  # 1 MiB reads keep syscall overhead low
+DEFAULT_HEADER_SIZE = 4096  # Enough for DOS/NT headers and magic-byte checks
+DEFAULT_HASH_ALGORITHMS = ('md5', 'sha1', 'sha256')
+
+PRINTABLE_BYTES = bytes(range(0x20, 0x7F))
+
+# Bounds on what a file can make the extractor hold, whatever its size
+DEFAULT_MAX_STRING_LENGTH = 4096  # Longer printable runs are truncated
+DEFAULT_MAX_STRING_MEMORY = 32 * 1024 * 1024  # Approximate memory for extracted strings
+STRING_OVERHEAD = 120  # Approximate size of an (offset, str) tuple besides the characters
+# Peak working memory per chunk byte while the stages run: the chunk, its
+# lowercased copy and the intp arrays bincount works on
+CHUNK_MEMORY_FACTOR = 12
+MIN_CHUNK_SIZE = 64 * 1024
+DEFAULT_MAX_FEED_GAP = 64 * 1024  # Skipped bytes a FeedingStream reads at once rather than at the end
+
+
+class FileFeatures:
+    """Features derived from a single chunked read of a file"""
+
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.size = 0
+        self.hashes: Dict[str, str] = {}  # Hex digests, keyed by algorithm
+        self.digests: Dict[str, bytes] = {}  # Raw digests, keyed by algorithm
+        self.histogram: Optional[np.ndarray] = None  # Byte value -> count
+        self.strings: Optional[List[Tuple[int, str]]] = None  # (offset, string)
+        self.header = b''
+        self.file_type: Optional[str] = None  # Set when the extractor triages files
+        self.extras: Dict[str, Any] = {}  # Results of registered chunk consumers
+        self.container: Optional[str] = None  # Archive the file was streamed out of, if any
+        self.content: Optional[bytes] = None  # Whole file, when it only exists in memory
+
+    @property
+    def is_pe(self) -> bool:
+        """Whether the file starts with a DOS header magic number"""
+        return self.header[:2] == b'MZ'
+
+
+class ChunkConsumer(ABC):
+    """Per-file state fed every chunk of the single read, e.g. a pattern matcher"""
+
+    @abstractmethod
+    def update(self, chunk: bytes, offset: int) -> None:
+        """Consume the next chunk of the file"""
+        pass
+
+    def finish(self) -> Any:
+        """Return the consumer's result once the whole file has been read"""
+        return None
+
+
+class _StringCollector(ChunkConsumer):
+    """Extracts printable ASCII strings, including strings split across chunks
+
+    Strings are truncated to max_length and collection stops once the strings
+    kept would exceed max_memory, so memory use does not grow with the file.
+    """
+
+    def __init__(self, min_length: int, max_length: int = DEFAULT_MAX_STRING_LENGTH,
+                 max_memory: int = DEFAULT_MAX_STRING_MEMORY):
+        self.min_length = min_length
+        self.max_length = max(max_length, min_length)
+        self.max_memory = max_memory
+        self.strings: List[Tuple[int, str]] = []
+        self.truncated = False  # Whether strings were dropped for exceeding max_memory
+        self._memory = 0
+        self._string_pattern = re.compile(rb'[\x20-\x7E]{%d,}' % min_length)
+        self._head_pattern = re.compile(rb'[\x20-\x7E]*')
+        self._pending = b''  # Start of the run at the end of the last chunk, at most max_length
+        self._pending_offset = 0
+
+    def update(self, chunk: bytes, offset: int) -> None:
+        """Consume the next chunk of the file"""
+        if self.truncated:
+            return
+        start = 0
+        if self._pending:
+            # Continue the string that ran up to the end of the previous chunk
+            start = self._head_pattern.match(chunk).end()
+            self._pending += chunk[:min(start, self.max_length - len(self._pending))]
+            if start == len(chunk):
+                return
+            self._flush()
+
+        # A printable run touching the chunk end may continue in the next chunk
+        end = len(chunk.rstrip(PRINTABLE_BYTES))
+        for match in self._string_pattern.finditer(chunk, start, end):
+            match_start = match.start()
+            self._add(offset + match_start, chunk[match_start:min(match.end(), match_start + self.max_length)])
+
+        if end < len(chunk):
+            self._pending = chunk[end:end + self.max_length]
+            self._pending_offset = offset + end
+
+    def finish(self) -> List[Tuple[int, str]]:
+        """Flush any trailing string and return all extracted strings"""
+        self._flush()
+        return self.strings
+
+    def _add(self, offset: int, string: bytes) -> None:
+        if self.truncated:
+            return
+        self._memory += len(string) + STRING_OVERHEAD
+        if self._memory > self.max_memory:
+            self.truncated = True
+            return
+        self.strings.append((offset, string.decode('ascii')))
+
+    def _flush(self) -> None:
+        if len(self._pending) >= self.min_length:
+            self._add(self._pending_offset, self._pending)
+        self._pending = b''
+
+
+def chunk_size_for_memory_limit(chunk_size: int, memory_limit: Optional[int]) -> int:
+    """Largest chunk size, up to chunk_size, whose per-chunk working memory fits in memory_limit"""
+    if memory_limit is None:
+        return chunk_size
+    return max(min(chunk_size, memory_limit // CHUNK_MEMORY_FACTOR), MIN_CHUNK_SIZE)
+
+
+class FileFeatureExtractor:
+    """Reads a file once, in chunks, and derives every requested feature in that pass"""
+
+    def __init__(self, hash_algorithms: Sequence[str] = DEFAULT_HASH_ALGORITHMS,
+                 collect_histogram: bool = True, collect_strings: bool = True,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 header_size: int = DEFAULT_HEADER_SIZE,
+                 min_string_length: int = 4,
+                 max_string_length: int = DEFAULT_MAX_STRING_LENGTH,
+                 memory_limit: Optional[int] = None):
+        self.hash_algorithms = tuple(hash_algorithms)
+        self.collect_histogram = collect_histogram
+        self.collect_strings = collect_strings
+        self.header_size = header_size
+        self.min_string_length = min_string_length
+        self.max_string_length = max_string_length
+        # Approximate ceiling on the memory used per file, regardless of its size:
+        # half goes to processing chunks, a quarter to extracted strings
+        self.memory_limit = memory_limit
+        self.chunk_size = chunk_size_for_memory_limit(
+            chunk_size, memory_limit // 2 if memory_limit is not None else None
+        )
+        self.max_string_memory = DEFAULT_MAX_STRING_MEMORY if memory_limit is None \
+            else min(DEFAULT_MAX_STRING_MEMORY, memory_limit // 4)
+        self._consumer_factories: Dict[str, Callable[[], Optional[ChunkConsumer]]] = {}
+        self.instrumentation: Optional[ScanInstrumentation] = None  # Times each stage when set
+        # Maps the first chunk of a file to its type and the names of the stages
+        # ('hashes', 'histogram', 'strings' or a consumer) to run; None runs all
+        self.triage: Optional[Callable[[bytes], Tuple[str, Optional[Collection[str]]]]] = None
+
+    @classmethod
+    def combine(cls, extractors: Sequence['FileFeatureExtractor'],
+                chunk_size: int = DEFAULT_CHUNK_SIZE,
+                memory_limit: Optional[int] = None) -> 'FileFeatureExtractor':
+        """Create an extractor producing, in one pass, everything the given extractors produce"""
+        hash_algorithms: List[str] = []
+        for extractor in extractors:
+            hash_algorithms.extend(a for a in extractor.hash_algorithms if a not in hash_algorithms)
+        combined = cls(
+            hash_algorithms=hash_algorithms,
+            collect_histogram=any(e.collect_histogram for e in extractors),
+            collect_strings=any(e.collect_strings for e in extractors),
+            chunk_size=chunk_size,
+            header_size=max((e.header_size for e in extractors), default=DEFAULT_HEADER_SIZE),
+            min_string_length=min((e.min_string_length for e in extractors), default=4),
+            max_string_length=max((e.max_string_length for e in extractors), default=DEFAULT_MAX_STRING_LENGTH),
+            memory_limit=memory_limit
+        )
+        for extractor in extractors:
+            for name, factory in extractor._consumer_factories.items():
+                if name in combined._consumer_factories:
+                    raise ValueError(f"Feature consumer registered twice: {name}")
+                combined.register_consumer(name, factory)
+        return combined
+
+    def register_consumer(self, name: str,
+                          factory: Callable[[], Optional[ChunkConsumer]]) -> None:
+        """Register a factory creating a per-file consumer whose result lands in extras[name]
+
+        The factory may return None to skip a file, e.g. when it has nothing to match.
+        """
+        self._consumer_factories[name] = factory
+
+    def extract(self, file_path: Path) -> FileFeatures:
+        """Extract features from a file on disk"""
+        with open(file_path, 'rb') as f:
+            return self.extract_stream(f, str(file_path))
+
+    def extract_stream(self, stream: BinaryIO, file_path: str) -> FileFeatures:
+        """Extract features from an open binary stream"""
+        extraction = self.start_extraction(file_path)
+        read = stream.read
+        if self.instrumentation is not None:
+            read = self.instrumentation.wrap('extract.read', read, MEASURE_RESULT)
+        chunk = read(self.chunk_size)
+        while chunk:
+            extraction.update(chunk)
+            chunk = read(self.chunk_size)
+        return extraction.finish()
+
+    def start_extraction(self, file_path: str) -> 'FeatureExtraction':
+        """Start extracting features from chunks that the caller reads itself"""
+        return FeatureExtraction(self, file_path)
+
+
+class FeatureExtraction:
+    """Features of one file, derived from its chunks as they are read"""
+
+    def __init__(self, extractor: FileFeatureExtractor, file_path: str):
+        self.features = FileFeatures(file_path)
+        self._extractor = extractor
+        self._stages: Optional[List[Tuple[str, Callable[[bytes, int], None]]]] = None
+        self._hashers: List[Tuple[str, Any]] = []
+        self._histogram: Optional[np.ndarray] = None
+        self._strings: Optional[_StringCollector] = None
+        self._consumers: List[Tuple[str, ChunkConsumer]] = []
+        self._header = bytearray()
+        self._offset = 0
+
+    def _start(self, chunk: bytes) -> None:
+        extractor = self._extractor
+
+        # Triage the first chunk to decide which stages are worth running at all
+        enabled: Optional[Collection[str]] = None
+        if extractor.triage is not None:
+            self.features.file_type, enabled = extractor.triage(chunk)
+
+        def wanted(name: str) -> bool:
+            return enabled is None or name in enabled
+
+        hashers = [(algo, hashlib.new(algo)) for algo in extractor.hash_algorithms] if wanted('hashes') else []
+        histogram = np.zeros(256, dtype=np.int64) \
+            if extractor.collect_histogram and wanted('histogram') else None
+        strings = _StringCollector(extractor.min_string_length, extractor.max_string_length,
+                                   extractor.max_string_memory) \
+            if extractor.collect_strings and wanted('strings') else None
+        for name, factory in extractor._consumer_factories.items():
+            consumer = factory() if wanted(name) else None
+            if consumer is not None:
+                self._consumers.append((name, consumer))
+
+        # Every per-chunk operation, named so that instrumentation can time each one
+        def update_hashes(chunk: bytes, chunk_offset: int) -> None:
+            for _, hasher in hashers:
+                hasher.update(chunk)
+
+        def update_histogram(chunk: bytes, chunk_offset: int) -> None:
+            histogram[:] += np.bincount(np.frombuffer(chunk, dtype=np.uint8), minlength=256)
+
+        stages: List[Tuple[str, Callable[[bytes, int], None]]] = []
+        if hashers:
+            stages.append(('hashes', update_hashes))
+        if histogram is not None:
+            stages.append(('histogram', update_histogram))
+        if strings is not None:
+            stages.append(('strings', strings.update))
+        stages.extend((name, consumer.update) for name, consumer in self._consumers)
+
+        if extractor.instrumentation is not None:
+            stages = [(name, extractor.instrumentation.wrap(f"extract.{name}", update, MEASURE_FIRST_ARGUMENT))
+                      for name, update in stages]
+        self._stages = stages
+        self._hashers = hashers
+        self._histogram = histogram
+        self._strings = strings
+
+    def update(self, chunk: bytes) -> None:
+        """Feed the next chunk of the file"""
+        if self._stages is None:
+            self._start(chunk)
+        header_size = self._extractor.header_size
+        if len(self._header) < header_size:
+            self._header += chunk[:header_size - len(self._header)]
+        for _, update in self._stages:
+            update(chunk, self._offset)
+        self._offset += len(chunk)
+
+    def finish(self) -> FileFeatures:
+        """Return the features once the whole file has been fed"""
+        if self._stages is None:
+            self._start(b'')
+        features = self.features
+        features.size = self._offset
+        features.header = bytes(self._header)
+        for algo, hasher in self._hashers:
+            features.digests[algo] = hasher.digest()
+            features.hashes[algo] = hasher.hexdigest()
+        if self._histogram is not None:
+            features.histogram = self._histogram
+        if self._strings is not None:
+            features.strings = self._strings.finish()
+            if self._strings.truncated:
+                logger.debug(f"String extraction from {features.file_path} stopped at {len(features.strings)} strings")
+        for name, consumer in self._consumers:
+            features.extras[name] = consumer.finish()
+
+        logger.debug(f"Extracted features from {features.file_path} ({self._offset} bytes)")
+        return features
+
+
+class FeedingStream(io.RawIOBase):
+    """A seekable file that feeds its bytes, in order, to an extraction as another reader reads it
+
+    Lets an archive reader and the feature extraction share one read of a
+    file. Bytes reach the extraction only when the reader reads past the
+    last byte fed; small gaps the reader seeks over are read at once, and
+    whatever it never reaches is read by finish().
+    """
+
+    def __init__(self, stream: BinaryIO, extraction: FeatureExtraction, chunk_size: int,
+                 max_gap: int = DEFAULT_MAX_FEED_GAP):
+        self._stream = stream
+        self._extraction = extraction
+        self._chunk_size = chunk_size
+        self._max_gap = max_gap
+        self._pending = bytearray()
+        self._position = stream.tell()
+        self._fed = self._position
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self._position = self._stream.seek(offset, whence)
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        if self._fed < self._position <= self._fed + self._max_gap:
+            self._stream.seek(self._fed)
+            self._feed(self._stream.read(self._position - self._fed))
+            self._stream.seek(self._position)
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        if self._position <= self._fed < self._position + len(data):
+            self._feed(data[self._fed - self._position:])
+        self._position += len(data)
+        return len(data)
+
+    def finish(self) -> FileFeatures:
+        """Feed the bytes the reader skipped or left unread, and return the file's features"""
+        self._stream.seek(self._fed)
+        chunk = self._stream.read(self._chunk_size)
+        while chunk:
+            self._feed(chunk)
+            chunk = self._stream.read(self._chunk_size)
+        if self._pending:
+            self._extraction.update(bytes(self._pending))
+            self._pending = bytearray()
+        return self._extraction.finish()
+
+    def _feed(self, data: bytes) -> None:
+        # The reader's small reads are batched so that every stage still sees whole chunks
+        self._fed += len(data)
+        self._pending += data
+        if len(self._pending) >= self._chunk_size:
+            self._extraction.update(bytes(self._pending))
+            self._pending = bytearray()
@@ -0,0 +1,136 @@
+"""
+File Triage Module
+Magic-byte classification of files from their first bytes
+"""
+
+from typing import Dict, FrozenSet, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+FILE_TYPE_EXECUTABLE = 'executable'
+FILE_TYPE_SCRIPT = 'script'
+FILE_TYPE_TEXT = 'text'
+FILE_TYPE_DOCUMENT = 'document'
+FILE_TYPE_ARCHIVE = 'archive'
+FILE_TYPE_IMAGE = 'image'
+FILE_TYPE_AUDIO = 'audio'
+FILE_TYPE_VIDEO = 'video'
+FILE_TYPE_EMPTY = 'empty'
+FILE_TYPE_UNKNOWN = 'unknown'
+
+TRIAGE_HEADER_SIZE = 512  # Bytes of the file classification looks at
+
+# (offset, magic, file type), checked in order
+MAGIC_SIGNATURES: Tuple[Tuple[int, bytes, str], ...] = (
+    (0, b'MZ', FILE_TYPE_EXECUTABLE),
+    (0, b'\x7fELF', FILE_TYPE_EXECUTABLE),
+    (0, b'\xfe\xed\xfa\xce', FILE_TYPE_EXECUTABLE),  # Mach-O
+    (0, b'\xfe\xed\xfa\xcf', FILE_TYPE_EXECUTABLE),
+    (0, b'\xce\xfa\xed\xfe', FILE_TYPE_EXECUTABLE),
+    (0, b'\xcf\xfa\xed\xfe', FILE_TYPE_EXECUTABLE),
+    (0, b'\xca\xfe\xba\xbe', FILE_TYPE_EXECUTABLE),  # Mach-O universal or Java class
+    (0, b'%PDF-', FILE_TYPE_DOCUMENT),
+    (0, b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', FILE_TYPE_DOCUMENT),  # OLE2: legacy Office, MSI
+    (0, b'{\\rtf', FILE_TYPE_DOCUMENT),
+    (0, b'PK\x03\x04', FILE_TYPE_ARCHIVE),  # Also OOXML, JAR and APK
+    (0, b'PK\x05\x06', FILE_TYPE_ARCHIVE),
+    (0, b'\x1f\x8b', FILE_TYPE_ARCHIVE),
+    (0, b'BZh', FILE_TYPE_ARCHIVE),
+    (0, b'\xfd7zXZ\x00', FILE_TYPE_ARCHIVE),
+    (0, b"7z\xbc\xaf'\x1c", FILE_TYPE_ARCHIVE),
+    (0, b'Rar!\x1a\x07', FILE_TYPE_ARCHIVE),
+    (0, b'\x28\xb5\x2f\xfd', FILE_TYPE_ARCHIVE),  # Zstandard
+    (0, b'MSCF', FILE_TYPE_ARCHIVE),  # Cabinet
+    (257, b'ustar', FILE_TYPE_ARCHIVE),
+    (0, b'\x89PNG\r\n\x1a\n', FILE_TYPE_IMAGE),
+    (0, b'\xff\xd8\xff', FILE_TYPE_IMAGE),
+    (0, b'GIF87a', FILE_TYPE_IMAGE),
+    (0, b'GIF89a', FILE_TYPE_IMAGE),
+    (0, b'II*\x00', FILE_TYPE_IMAGE),
+    (0, b'MM\x00*', FILE_TYPE_IMAGE),
+    (0, b'\x00\x00\x01\x00', FILE_TYPE_IMAGE),  # ICO
+    (0, b'ID3', FILE_TYPE_AUDIO),
+    (0, b'fLaC', FILE_TYPE_AUDIO),
+    (0, b'OggS', FILE_TYPE_AUDIO),
+    (0, b'\xff\xfb', FILE_TYPE_AUDIO),  # MPEG audio frame
+    (0, b'\xff\xf3', FILE_TYPE_AUDIO),
+    (0, b'\xff\xf1', FILE_TYPE_AUDIO),  # AAC ADTS
+    (0, b'\x1aE\xdf\xa3', FILE_TYPE_VIDEO),  # Matroska / WebM
+    (4, b'ftyp', FILE_TYPE_VIDEO),  # MP4, MOV, HEIF
+)
+# RIFF containers name their format at offset 8
+RIFF_FORMATS: Dict[bytes, str] = {
+    b'WAVE': FILE_TYPE_AUDIO,
+    b'AVI ': FILE_TYPE_VIDEO,
+    b'WEBP': FILE_TYPE_IMAGE,
+}
+
+# Text whose first bytes contain one of these is treated as a script
+SCRIPT_MARKERS = (
+    b'#!', b'<script', b'@echo off', b'powershell', b'wscript', b'cscript', b'createobject(',
+    b'<?php', b'function ', b'invoke-', b'set-', b'param(', b'dim ', b'eval(', b'exec('
+)
+TEXT_BOMS = (b'\xef\xbb\xbf', b'\xff\xfe', b'\xfe\xff')
+TEXT_BYTES = frozenset(b'\t\n\r\f\b\x1b') | frozenset(range(0x20, 0x7F)) | frozenset(range(0x80, 0x100))
+MIN_TEXT_RATIO = 0.95
+
+# Heuristic rules that apply to each file type; types not listed get every rule
+DEFAULT_TRIAGE_RULES: Dict[str, FrozenSet[str]] = {
+    FILE_TYPE_SCRIPT: frozenset({'HR001', 'HR002', 'HR003', 'HR006'}),
+    FILE_TYPE_TEXT: frozenset({'HR006'}),
+    # Compressed streams make entropy meaningless; embedded macros still carry strings
+    FILE_TYPE_DOCUMENT: frozenset({'HR001', 'HR002', 'HR003', 'HR006'}),
+    # High entropy is expected and strings are compressed away
+    FILE_TYPE_ARCHIVE: frozenset(),
+    FILE_TYPE_IMAGE: frozenset(),
+    FILE_TYPE_AUDIO: frozenset(),
+    FILE_TYPE_VIDEO: frozenset(),
+    FILE_TYPE_EMPTY: frozenset(),
+}
+
+
+def classify_file(header: bytes) -> str:
+    """Classify a file from its first bytes (at least TRIAGE_HEADER_SIZE when available)"""
+    if not header:
+        return FILE_TYPE_EMPTY
+
+    for offset, magic, file_type in MAGIC_SIGNATURES:
+        if header.startswith(magic, offset):
+            return file_type
+    if header.startswith(b'RIFF'):
+        riff_type = RIFF_FORMATS.get(bytes(header[8:12]))
+        if riff_type:
+            return riff_type
+
+    return _classify_text(bytes(header[:TRIAGE_HEADER_SIZE]))
+
+
+def _classify_text(sample: bytes) -> str:
+    if sample.startswith(TEXT_BOMS[1:]):
+        # UTF-16; drop the zero bytes so markers still match
+        sample = sample[2:].replace(b'\0', b'')
+    elif b'\0' in sample:
+        return FILE_TYPE_UNKNOWN
+    elif sample.startswith(TEXT_BOMS[0]):
+        sample = sample[3:]
+
+    if not sample:
+        return FILE_TYPE_TEXT
+    text_bytes = sum(1 for byte in sample if byte in TEXT_BYTES)
+    if text_bytes < len(sample) * MIN_TEXT_RATIO:
+        return FILE_TYPE_UNKNOWN
+
+    lowered = sample.lower()
+    if any(marker in lowered for marker in SCRIPT_MARKERS):
+        return FILE_TYPE_SCRIPT
+    return FILE_TYPE_TEXT
+
+
+def rules_for_file_type(file_type: str,
+                        overrides: Optional[Dict[str, object]] = None) -> Optional[FrozenSet[str]]:
+    """Get the rule IDs that apply to a file type; None means every rule applies"""
+    if overrides and file_type in overrides:
+        rules = overrides[file_type]
+        return None if rules is None else frozenset(rules)
+    return DEFAULT_TRIAGE_RULES.get(file_type)
@@ -0,0 +1,410 @@
+"""
+File Watcher Module
+Real-time protection: scans files as they change under watched directories
+"""
+
+import ctypes
+import ctypes.util
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+import logging
+
+from base_scanner import BaseScanner, BaseScannerError, ScanResult
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEBOUNCE_SECONDS = 0.5  # Quiet time after the last write before a file is scanned
+DEFAULT_QUEUE_SIZE = 1024  # Files waiting for a scan worker
+DEFAULT_MAX_PENDING = 100_000  # Files waiting out their debounce before falling back to a rescan
+DEFAULT_POLL_INTERVAL = 2.0
+EVENT_READ_TIMEOUT = 0.1
+
+# Event kinds produced by event sources
+EVENT_CHANGED = 'changed'  # A file was written or moved in
+EVENT_REMOVED = 'removed'  # A file was deleted or moved away
+EVENT_DIRECTORY = 'directory'  # A directory appeared; everything in it needs scanning
+EVENT_OVERFLOW = 'overflow'  # Events were lost; the roots need a full rescan
+
+WatchEvent = Tuple[str, str]  # (kind, path)
+
+# inotify constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | \
+    IN_DELETE | IN_DELETE_SELF
+INOTIFY_EVENT = struct.Struct('iIII')  # wd, mask, cookie, name length
+INOTIFY_READ_SIZE = 64 * 1024
+
+
+class FileWatcherError(BaseScannerError):
+    """Exception specific to file watching"""
+    pass
+
+
+class InotifyEventSource:
+    """Linux inotify event source watching directory trees recursively"""
+
+    def __init__(self, roots: List[Path], walk: Callable[[Path, bool], Iterator[os.DirEntry]]):
+        libc_name = ctypes.util.find_library('c')
+        try:
+            self._libc = ctypes.CDLL(libc_name, use_errno=True)
+            self._libc.inotify_init1.argtypes = [ctypes.c_int]
+            self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        except (OSError, AttributeError) as e:
+            raise FileWatcherError(f"inotify is not available: {str(e)}")
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise FileWatcherError(f"inotify_init1 failed: {os.strerror(ctypes.get_errno())}")
+        self._directories: Dict[int, str] = {}  # watch descriptor -> directory path
+        for root in roots:
+            self._watch_tree(str(root))
+
+    def _watch_tree(self, directory: str) -> None:
+        """Watch a directory and every directory below it"""
+        pending = [directory]
+        while pending:
+            path = pending.pop()
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+            if wd < 0:
+                logger.error(f"Cannot watch {path}: {os.strerror(ctypes.get_errno())}")
+                continue
+            self._directories[wd] = path
+            try:
+                with os.scandir(path) as entries:
+                    pending.extend(entry.path for entry in entries
+                                   if entry.is_dir(follow_symlinks=False))
+            except OSError as e:
+                logger.error(f"Failed to list directory: {str(e)}")
+
+    def read_events(self, timeout: float) -> List[WatchEvent]:
+        """Wait up to timeout for events and translate them into watch events"""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self._fd, INOTIFY_READ_SIZE)
+        except BlockingIOError:
+            return []
+
+        events = []
+        position = 0
+        while position + INOTIFY_EVENT.size <= len(data):
+            wd, mask, _, name_length = INOTIFY_EVENT.unpack_from(data, position)
+            name = data[position + INOTIFY_EVENT.size:position + INOTIFY_EVENT.size + name_length]
+            position += INOTIFY_EVENT.size + name_length
+
+            if mask & IN_Q_OVERFLOW:
+                events.append((EVENT_OVERFLOW, ''))
+                continue
+            if mask & IN_IGNORED:
+                self._directories.pop(wd, None)
+                continue
+            directory = self._directories.get(wd)
+            if directory is None or mask & IN_DELETE_SELF:
+                continue
+            path = os.path.join(directory, os.fsdecode(name.rstrip(b'\0')))
+
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._watch_tree(path)
+                    events.append((EVENT_DIRECTORY, path))
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                events.append((EVENT_REMOVED, path))
+            elif mask & (IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO):
+                events.append((EVENT_CHANGED, path))
+        return events
+
+    def close(self) -> None:
+        """Release the inotify instance"""
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class PollingEventSource:
+    """Portable event source that compares periodic (size, mtime) snapshots"""
+
+    def __init__(self, roots: List[Path], walk: Callable[[Path, bool], Iterator[os.DirEntry]],
+                 interval: float = DEFAULT_POLL_INTERVAL):
+        self.roots = roots
+        self.interval = interval
+        self._walk = walk
+        self._snapshot = self._take_snapshot()
+        self._next_poll = time.monotonic() + interval
+
+    def _take_snapshot(self) -> Dict[str, Tuple[int, int]]:
+        snapshot = {}
+        for root in self.roots:
+            for entry in self._walk(root, True):
+                try:
+                    stat = entry.stat()
+                    snapshot[entry.path] = (stat.st_size, stat.st_mtime_ns)
+                except OSError:
+                    continue
+        return snapshot
+
+    def read_events(self, timeout: float) -> List[WatchEvent]:
+        """Wait up to timeout for the next poll and report what changed since the last one"""
+        remaining = self._next_poll - time.monotonic()
+        if remaining > timeout:
+            time.sleep(timeout)
+            return []
+        time.sleep(max(remaining, 0))
+        self._next_poll = time.monotonic() + self.interval
+
+        snapshot = self._take_snapshot()
+        events = [(EVENT_CHANGED, path) for path, state in snapshot.items()
+                  if self._snapshot.get(path) != state]
+        events.extend((EVENT_REMOVED, path) for path in self._snapshot.keys() - snapshot.keys())
+        self._snapshot = snapshot
+        return events
+
+    def close(self) -> None:
+        """Drop the snapshot"""
+        self._snapshot = {}
+
+
+class FileWatcher:
+    """Watches directory trees and pushes changed files through a scanner
+
+    Events for a file are coalesced while it is being written, and the file is
+    scanned once it has been quiet for the debounce interval. Debounced files
+    wait in a bounded queue for the scan workers; when the queue is full they
+    stay pending, where further events for them coalesce. If even the pending
+    set outgrows its limit, or the kernel drops events, the watcher falls back
+    to a rescan of the roots, which the scanner's verdict cache makes cheap
+    for unchanged files.
+    """
+
+    def __init__(self, scanner: BaseScanner, roots: List[Path],
+                 on_result: Optional[Callable[[ScanResult], None]] = None,
+                 config: Optional[Dict[str, Any]] = None):
+        self.scanner = scanner
+        self.roots = [Path(root).resolve() for root in roots]
+        self.on_result = on_result or self._log_result
+        self.config = config or {}
+        self.debounce = self.config.get('watch_debounce_seconds', DEFAULT_DEBOUNCE_SECONDS)
+        self.max_pending = self.config.get('watch_max_pending', DEFAULT_MAX_PENDING)
+        self._queue: 'queue.Queue[str]' = queue.Queue(self.config.get('watch_queue_size', DEFAULT_QUEUE_SIZE))
+        self._pending: Dict[str, float] = {}  # path -> time it becomes due for scanning
+        self._queued: Set[str] = set()
+        self._queued_lock = threading.Lock()
+        self._rescans: List[Iterator[os.DirEntry]] = []  # Walks feeding the queue lazily
+        self._rescan_carry: Optional[str] = None  # Walked file that did not fit in the queue
+        self._source = None
+        self._threads: List[threading.Thread] = []
+        self._stop = threading.Event()
+        self._room = threading.Event()  # Set whenever a scan worker takes a file off the queue
+        self._ignored_prefixes = self._build_ignored_prefixes()
+        self._statistics_lock = threading.Lock()
+        self.statistics = {
+            'events': 0, 'coalesced': 0, 'scanned': 0, 'threats': 0,
+            'scan_errors': 0, 'overflows': 0, 'rescans': 0
+        }
+
+    def _build_ignored_prefixes(self) -> Tuple[str, ...]:
+        """Paths the watcher writes itself, which would otherwise trigger endless rescans"""
+        prefixes = list(self.config.get('watch_exclude', []))
+        cache_path = self.scanner.config.get('verdict_cache_path')
+        if cache_path:
+            # The cache database together with its -wal and -shm files
+            prefixes.append(str(Path(cache_path).resolve()))
+        return tuple(prefixes)
+
+    def _create_source(self):
+        backend = self.config.get('watch_backend', 'auto')
+        if backend in ('auto', 'inotify') and sys.platform.startswith('linux'):
+            try:
+                return InotifyEventSource(self.roots, self.scanner._walk_directory)
+            except FileWatcherError as e:
+                if backend == 'inotify':
+                    raise
+                logger.warning(f"Falling back to polling: {str(e)}")
+        elif backend == 'inotify':
+            raise FileWatcherError("inotify is only available on Linux")
+        return PollingEventSource(self.roots, self.scanner._walk_directory,
+                                  self.config.get('watch_poll_interval', DEFAULT_POLL_INTERVAL))
+
+    def start(self) -> None:
+        """Start watching the roots in background threads"""
+        if self._threads:
+            raise FileWatcherError("Watcher already started")
+        if not self.scanner.is_initialized:
+            raise FileWatcherError("Scanner not initialized")
+        for root in self.roots:
+            if not root.is_dir():
+                raise FileWatcherError(f"Invalid directory: {root}")
+
+        self._stop.clear()
+        self._source = self._create_source()
+        logger.info(f"Watching {len(self.roots)} roots with {self._source.__class__.__name__}")
+        self._threads = [threading.Thread(target=self._event_loop, name='file-watcher-events',
+                                          daemon=True)]
+        for index in range(self.config.get('watch_workers', 1)):
+            self._threads.append(threading.Thread(target=self._scan_loop, daemon=True,
+                                                  name=f"file-watcher-scan-{index}"))
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Stop watching; files not yet scanned are dropped"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        if self._source is not None:
+            self._source.close()
+            self._source = None
+        self.scanner._flush_cached_verdicts()
+
+    def __enter__(self) -> 'FileWatcher':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _event_loop(self) -> None:
+        """Collect events, coalesce them per file and feed due files to the queue"""
+        backlog = False
+        while not self._stop.is_set():
+            try:
+                # With a backlog, only drain events that are already there
+                events = self._source.read_events(0 if backlog else EVENT_READ_TIMEOUT)
+            except OSError as e:
+                logger.error(f"Failed to read file events: {str(e)}")
+                events = []
+            now = time.monotonic()
+            for kind, path in events:
+                self._handle_event(kind, path, now)
+
+            self._room.clear()
+            backlog = self._dispatch(now)
+            if backlog:
+                # Wait for a scan worker to take a file before dispatching again
+                self._room.wait(EVENT_READ_TIMEOUT)
+
+    def _handle_event(self, kind: str, path: str, now: float) -> None:
+        if path and path.startswith(self._ignored_prefixes):
+            return
+        self.statistics['events'] += 1
+        if kind == EVENT_CHANGED:
+            if path in self._pending:
+                self.statistics['coalesced'] += 1
+            self._pending[path] = now + self.debounce
+        elif kind == EVENT_REMOVED:
+            self._pending.pop(path, None)
+        elif kind == EVENT_DIRECTORY:
+            self._rescans.append(self.scanner._walk_directory(Path(path), True))
+        elif kind == EVENT_OVERFLOW:
+            self._schedule_full_rescan('event queue overflow')
+
+        if len(self._pending) > self.max_pending:
+            self._schedule_full_rescan(f"more than {self.max_pending} files pending")
+
+    def _schedule_full_rescan(self, reason: str) -> None:
+        """Replace all pending work with a rescan of every root"""
+        logger.warning(f"Rescanning watched roots: {reason}")
+        self.statistics['overflows'] += 1
+        self._pending = {}
+        self._rescans = [self.scanner._walk_directory(root, True) for root in self.roots]
+        self._rescan_carry = None
+
+    def _dispatch(self, now: float) -> bool:
+        """Move due files into the scan queue; True if some had to wait for room"""
+        due = [path for path, deadline in self._pending.items() if deadline <= now]
+        for path in due:
+            if not self._enqueue(path):
+                return True  # The rest stays pending and keeps coalescing
+            del self._pending[path]
+
+        if self._rescan_carry is not None:
+            if not self._enqueue(self._rescan_carry):
+                return True
+            self._rescan_carry = None
+        while self._rescans:
+            for entry in self._rescans[0]:
+                if entry.path.startswith(self._ignored_prefixes):
+                    continue
+                if not self._enqueue(entry.path):
+                    self._rescan_carry = entry.path
+                    return True
+            self._rescans.pop(0)
+            self.statistics['rescans'] += 1
+        return False
+
+    def _enqueue(self, path: str) -> bool:
+        """Queue a file for scanning unless it already waits there; False when the queue is full"""
+        with self._queued_lock:
+            if path in self._queued:
+                return True
+            try:
+                self._queue.put_nowait(path)
+            except queue.Full:
+                return False
+            self._queued.add(path)
+            return True
+
+    def _scan_loop(self) -> None:
+        """Scan queued files until the watcher stops"""
+        while not self._stop.is_set():
+            try:
+                path = self._queue.get(timeout=EVENT_READ_TIMEOUT)
+            except queue.Empty:
+                continue
+            self._room.set()
+            with self._queued_lock:
+                # Changes from now on must queue the file again
+                self._queued.discard(path)
+            try:
+                result = self.scanner.scan_file(Path(path))
+            except Exception as e:
+                # Files deleted between the event and the scan are not errors
+                if os.path.exists(path):
+                    logger.error(f"Failed to scan {path}: {str(e)}")
+                    self._count('scan_errors')
+                continue
+            self._count('scanned')
+            if result.threat_detected:
+                self._count('threats')
+            try:
+                self.on_result(result)
+            except Exception as e:
+                logger.error(f"Result handler failed for {path}: {str(e)}")
+
+    def _count(self, name: str) -> None:
+        with self._statistics_lock:
+            self.statistics[name] += 1
+
+    @staticmethod
+    def _log_result(result: ScanResult) -> None:
+        if result.threat_detected:
+            logger.warning(f"Threat detected in {result.file_path}: {result.threat_type}")
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get event, scan and backlog counts"""
+        return {
+            **self.statistics,
+            'backend': self._source.__class__.__name__ if self._source else None,
+            'pending': len(self._pending),
+            'queued': self._queue.qsize(),
+            'rescans_in_progress': len(self._rescans)
+        }
+
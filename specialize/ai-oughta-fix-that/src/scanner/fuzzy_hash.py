@@ -0,0 +1,249 @@
+"""
+Fuzzy Hash Module
+Context-triggered piecewise hashing summarized as MinHash, with an LSH index for variant lookups
+"""
+
+import bisect
+import hashlib
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+
+import numpy as np
+
+from file_features import ChunkConsumer
+
+logger = logging.getLogger(__name__)
+
+FUZZY_HASH_PREFIX = 'minhash64:'
+PERMUTATIONS = 64  # MinHash values per fuzzy hash
+LSH_BANDS = 16  # Bands of PERMUTATIONS // LSH_BANDS values; candidates share at least one band
+MAX_BAND_CANDIDATES = 1024  # Per band, so common content cannot make a lookup linear
+
+# Pieces end where a multiplicative hash of the last CONTEXT_SIZE bytes falls
+# below a limit, so boundaries depend only on nearby content and edits only
+# move the boundaries around them
+CONTEXT_SIZE = 4
+CONTEXT_MULTIPLIER = np.uint32(0x9E3779B1)
+CONTEXT_OFFSET = np.uint32(0x7F4A7C15)  # Chosen so no run of one repeated byte value triggers
+AVERAGE_PIECE_SIZE = 1024
+TRIGGER_LIMIT = 2 ** 32 // AVERAGE_PIECE_SIZE
+MIN_PIECE_SIZE = 128
+MAX_PIECE_SIZE = 16 * 1024
+MIN_PIECES = 4  # Files with fewer pieces are too small to compare
+SLICE_SIZE = 256 * 1024  # Bytes of a chunk processed at a time, bounding temporary arrays
+
+
+def _constants(label: bytes, count: int) -> np.ndarray:
+    # Derived from a hash rather than a PRNG so fuzzy hashes stay comparable across NumPy versions
+    return np.frombuffer(hashlib.shake_256(label).digest(count * 8), dtype='<u8').astype(np.uint64)
+
+
+PERMUTATION_MULTIPLIERS = _constants(b'fuzzy-hash-multipliers', PERMUTATIONS) | np.uint64(1)
+PERMUTATION_OFFSETS = _constants(b'fuzzy-hash-offsets', PERMUTATIONS)
+BAND_MULTIPLIERS = _constants(b'fuzzy-hash-bands', 2) | np.uint64(1)
+
+
+def format_fuzzy_hash(fuzzy_hash: np.ndarray) -> str:
+    """Encode a fuzzy hash as the pattern of a 'fuzzy' signature"""
+    return FUZZY_HASH_PREFIX + fuzzy_hash.astype('<u4').tobytes().hex()
+
+
+def parse_fuzzy_hash(text: str) -> Optional[np.ndarray]:
+    """Decode a fuzzy hash from its text form; None if it is malformed"""
+    if not text.startswith(FUZZY_HASH_PREFIX):
+        return None
+    try:
+        raw = bytes.fromhex(text[len(FUZZY_HASH_PREFIX):])
+    except ValueError:
+        return None
+    if len(raw) != PERMUTATIONS * 4:
+        return None
+    return np.frombuffer(raw, dtype='<u4').astype(np.uint32)
+
+
+def fuzzy_similarity(first: np.ndarray, second: np.ndarray) -> float:
+    """Estimate the share of pieces two files have in common (their Jaccard similarity)"""
+    return float(np.count_nonzero(first == second)) / PERMUTATIONS
+
+
+class FuzzyHasher(ChunkConsumer):
+    """Streams a file into a fuzzy hash
+
+    The file is split into content-defined pieces, each piece is reduced to
+    a CRC-32, and the set of piece hashes is summarized by MinHash. Two files
+    sharing most pieces, such as a recompiled or patched variant, then agree
+    on most MinHash values. State is a fixed size whatever the file size.
+    """
+
+    def __init__(self):
+        self.piece_count = 0
+        self._tail = b''  # Last bytes of the previous slice, which start a context
+        self._since_trigger = MIN_PIECE_SIZE  # Bytes since the last trigger, across slices
+        self._piece_crc = 0
+        self._piece_length = 0
+        self._piece_hashes: List[int] = []
+        self._minimum = np.full(PERMUTATIONS, 0xFFFFFFFF, dtype=np.uint64)
+
+    def update(self, chunk: bytes, offset: int) -> None:
+        """Consume the next chunk of the file"""
+        view = memoryview(chunk)
+        for start in range(0, len(view), SLICE_SIZE):
+            self._update_slice(view[start:start + SLICE_SIZE])
+        self._fold_pieces()
+
+    def _update_slice(self, data: memoryview) -> None:
+        window = self._tail + data
+        lead = CONTEXT_SIZE - len(self._tail)
+        self._tail = window[-(CONTEXT_SIZE - 1):]
+        triggers = np.zeros(0, dtype=np.intp)
+        if len(window) >= CONTEXT_SIZE:
+            # Every unaligned CONTEXT_SIZE-byte word of the window, read in place
+            contexts = np.ndarray((len(window) - CONTEXT_SIZE + 1,), dtype='<u4',
+                                  buffer=window, strides=(1,)).copy()
+            contexts *= CONTEXT_MULTIPLIER
+            contexts += CONTEXT_OFFSET
+            # Context i ends at data[i + CONTEXT_SIZE - 1 - len(tail)]; cut just after it
+            triggers = np.flatnonzero(contexts < TRIGGER_LIMIT) + lead
+
+        cuts: List[int] = []
+        if len(triggers):
+            # Runs of triggers, as in uniform data, would only yield minimum-size
+            # pieces; keep the triggers that follow a gap so such runs stay cheap.
+            # Gaps are measured across slices so chunk size never moves a boundary
+            gaps = np.diff(triggers, prepend=-self._since_trigger)
+            cuts = triggers[gaps >= MIN_PIECE_SIZE].tolist()
+            self._since_trigger = len(data) - int(triggers[-1])
+        else:
+            self._since_trigger += len(data)
+
+        position = 0
+        while True:
+            earliest = position + max(MIN_PIECE_SIZE - self._piece_length, 1)
+            index = bisect.bisect_left(cuts, earliest)
+            cut = cuts[index] if index < len(cuts) else None
+            limit = position + MAX_PIECE_SIZE - self._piece_length
+            if cut is None or cut > limit:
+                if limit > len(data):
+                    break
+                cut = limit  # No boundary in sight; force one so pieces stay bounded
+            self._end_piece(data[position:cut])
+            position = cut
+
+        self._piece_crc = zlib.crc32(data[position:], self._piece_crc)
+        self._piece_length += len(data) - position
+
+    def _end_piece(self, data: memoryview) -> None:
+        self._piece_hashes.append(zlib.crc32(data, self._piece_crc))
+        self._piece_crc = 0
+        self._piece_length = 0
+
+    def _fold_pieces(self) -> None:
+        if not self._piece_hashes:
+            return
+        pieces = np.array(self._piece_hashes, dtype=np.uint64)
+        self.piece_count += len(pieces)
+        self._piece_hashes = []
+        # Multiply-shift hashing, one permutation per column; uint64 arithmetic wraps
+        permuted = (pieces[:, None] * PERMUTATION_MULTIPLIERS + PERMUTATION_OFFSETS) >> np.uint64(32)
+        np.minimum(self._minimum, permuted.min(axis=0), out=self._minimum)
+
+    def finish(self) -> Optional[np.ndarray]:
+        """Return the fuzzy hash, or None if the file has too few pieces to compare"""
+        if self._piece_length:
+            self._piece_hashes.append(self._piece_crc)
+            self._piece_length = 0
+        self._fold_pieces()
+        if self.piece_count < MIN_PIECES:
+            return None
+        return self._minimum.astype(np.uint32)
+
+
+def fuzzy_hash_file(file_path: str, chunk_size: int = 1024 * 1024) -> Optional[str]:
+    """Compute the text form of a file's fuzzy hash, e.g. to build a 'fuzzy' signature"""
+    hasher = FuzzyHasher()
+    with open(file_path, 'rb') as f:
+        offset = 0
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            hasher.update(chunk, offset)
+            offset += len(chunk)
+    fuzzy_hash = hasher.finish()
+    return format_fuzzy_hash(fuzzy_hash) if fuzzy_hash is not None else None
+
+
+class FuzzyHashIndex:
+    """Locality-sensitive hashing index over fuzzy hashes
+
+    Each hash is cut into LSH_BANDS bands and every band is looked up in its
+    own sorted key table, so a query costs a few binary searches plus a
+    comparison against the candidates sharing a band, rather than a scan of
+    the whole corpus. The tables are rebuilt lazily after the index changes.
+    """
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[np.ndarray, Any]] = {}
+        self._values: List[Any] = []
+        self._matrix = np.zeros((0, PERMUTATIONS), dtype=np.uint32)
+        self._band_keys = np.zeros((LSH_BANDS, 0), dtype=np.uint64)
+        self._band_rows = np.zeros((LSH_BANDS, 0), dtype=np.int64)
+        self._stale = False
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, key: str, fuzzy_hash: np.ndarray, value: Any) -> None:
+        """Index a fuzzy hash under a key, replacing any previous entry for it"""
+        self._entries[key] = (fuzzy_hash, value)
+        self._stale = True
+
+    def remove(self, key: str) -> bool:
+        """Remove the entry for a key"""
+        if self._entries.pop(key, None) is None:
+            return False
+        self._stale = True
+        return True
+
+    @staticmethod
+    def _band_hashes(matrix: np.ndarray) -> np.ndarray:
+        """Reduce every band of every row to one 64-bit key, shaped (rows, bands)"""
+        pairs = np.ascontiguousarray(matrix, dtype='<u4').view('<u8').astype(np.uint64)
+        pairs = pairs.reshape(len(matrix), LSH_BANDS, -1)
+        return (pairs * BAND_MULTIPLIERS[:pairs.shape[2]]).sum(axis=2, dtype=np.uint64)
+
+    def prepare(self) -> None:
+        """Build the band tables now rather than on the next query, e.g. before sharing the index"""
+        if self._stale:
+            self._rebuild()
+
+    def _rebuild(self) -> None:
+        self._values = [value for _, value in self._entries.values()]
+        self._matrix = np.array([fuzzy_hash for fuzzy_hash, _ in self._entries.values()],
+                                dtype=np.uint32).reshape(-1, PERMUTATIONS)
+        keys = self._band_hashes(self._matrix).T
+        self._band_rows = np.argsort(keys, axis=1, kind='stable')
+        self._band_keys = np.take_along_axis(keys, self._band_rows, axis=1)
+        self._stale = False
+        logger.debug(f"Rebuilt fuzzy hash index with {len(self._values)} entries")
+
+    def query(self, fuzzy_hash: np.ndarray, threshold: float) -> List[Tuple[Any, float]]:
+        """Find indexed values at least threshold similar to a fuzzy hash, most similar first"""
+        if self._stale:
+            self._rebuild()
+        if not self._values:
+            return []
+
+        query_keys = self._band_hashes(fuzzy_hash.reshape(1, PERMUTATIONS))[0]
+        candidates = []
+        for band, key in enumerate(query_keys):
+            keys = self._band_keys[band]
+            start = int(np.searchsorted(keys, key, side='left'))
+            end = int(np.searchsorted(keys, key, side='right'))
+            candidates.append(self._band_rows[band, start:min(end, start + MAX_BAND_CANDIDATES)])
+        rows = np.unique(np.concatenate(candidates))
+        if not len(rows):
+            return []
+
+        similarities = np.count_nonzero(self._matrix[rows] == fuzzy_hash, axis=1) / PERMUTATIONS
+        order = np.argsort(-similarities, kind='stable')
+        return [(self._values[rows[i]], float(similarities[i]))
+                for i in order if similarities[i] >= threshold]
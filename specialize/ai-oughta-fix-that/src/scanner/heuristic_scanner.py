@@ -3,23 +3,130 @@ Heuristic Scanner Module
 Implements behavior-based and heuristic malware detection techniques
 """
 
+import hashlib
+import json
 import os
-import re
 import struct
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Set, Tuple
+from typing import List, Dict, Any, Callable, ContextManager, FrozenSet, Iterable, Optional, Set, Tuple
 import logging
 
 from base_scanner import BaseScanner, ScanResult, BaseScannerError
+from file_features import ChunkConsumer, FileFeatureExtractor, FileFeatures, DEFAULT_CHUNK_SIZE
+from pattern_matcher import PatternMatcher, PatternMatcherStream
+from entropy import (EntropyAccumulator, EntropyProfile, shannon_entropy,
+                     DEFAULT_WINDOW_SIZE, DEFAULT_WINDOW_STRIDE)
+from instrumentation import ScanInstrumentation, MEASURE_FEATURES_SIZE
+from pe_parser import PEFile, PEFormatError
+from file_triage import classify_file, rules_for_file_type, TRIAGE_HEADER_SIZE
+from api_index import ApiCombination, ApiIndex, ImportProfile, DEFAULT_API_COMBINATIONS
+from definitions import DefinitionsGeneration, DefinitionsManager
 
 logger = logging.getLogger(__name__)
 
+# Key under which suspicious string matches are stored in FileFeatures.extras
+STRING_MATCHES_KEY = 'suspicious_strings'
+ENTROPY_PROFILE_KEY = 'entropy_profile'
+# Key under which PE structure analysis leaves the file's ImportProfile
+IMPORT_PROFILE_KEY = 'import_profile'
+
+# Feature extraction stages each rule depends on; triage skips the rest
+RULE_STAGES = {
+    'HR005': ('histogram', ENTROPY_PROFILE_KEY),
+    'HR006': (STRING_MATCHES_KEY,),
+}
+BEHAVIORAL_RULES = frozenset({'HR001', 'HR002', 'HR003'})
+# Rules evaluated from the parsed PE image; behavioral rules work from its imports
+PE_RULES = BEHAVIORAL_RULES | {'HR004', 'HR005'}
+
+DEFAULT_ANOMALY_THRESHOLDS = {
+    'entropy_threshold': 7.0,  # High entropy indicates encryption/packing
+    'section_count_threshold': 10,  # Unusual number of PE sections
+    'import_count_threshold': 100,  # Excessive imports
+    'suspicious_api_threshold': 3,  # Suspicious APIs imported outside any known combination
+}
+
+MIN_ENTROPY_SECTION_SIZE = 512  # Smaller sections have too few bytes for a meaningful entropy
+MAX_STRING_VALUE_LENGTH = 50  # Characters of a suspicious string reported in its indicator
+# Maps printable ASCII bytes to 1 and every other byte to 0
+PRINTABLE_MASK = bytes(1 if 0x20 <= byte <= 0x7E else 0 for byte in range(256))
+
+# Checks timed by instrumentation: method name -> timing name. HR001-HR005 all
+# use the parsed PE file, so pe_structure times parsing and everything done
+# with it; the pe_structure.* timings nested within it split that per rule
+INSTRUMENTED_CHECKS = {
+    '_check_file_entropy': 'rule.HR005',
+    '_analyze_pe_structure': 'pe_structure',
+    '_profile_imports': 'pe_structure.imports.HR001-HR003',
+    '_check_pe_anomalies': 'pe_structure.HR004',
+    '_check_section_entropy': 'pe_structure.sections.HR005',
+    '_check_suspicious_strings': 'rule.HR006',
+    '_check_behavioral_patterns': 'rule.HR001-HR003',
+}
+
 
 class HeuristicScannerError(BaseScannerError):
     """Exception specific to heuristic scanner operations"""
     pass
 
 
+class _SuspiciousStringStream(ChunkConsumer):
+    """Reduces suspicious string matches to the printable strings containing them
+    
+    Each run of printable ASCII is reported once, with its offset and first
+    MAX_STRING_VALUE_LENGTH characters, however many suspicious strings it
+    holds; runs may span chunks.
+    """
+    
+    def __init__(self, stream: PatternMatcherStream):
+        self._stream = stream
+        self.strings: List[List[Any]] = []  # [offset, leading bytes] of each string
+        self._open = False  # Whether the last string's value may continue into the next chunk
+        self._run_start = 0  # Offset of the printable run the previous chunk ended in
+        self._run_prefix = b''  # Leading bytes of that run
+        
+    def update(self, chunk: bytes, offset: int) -> None:
+        found = len(self._stream.matches)
+        self._stream.update(chunk, offset)
+        mask = chunk.translate(PRINTABLE_MASK)
+        
+        if self._open:
+            end = mask.find(0)
+            end = len(chunk) if end < 0 else end
+            value = self.strings[-1][1]
+            self.strings[-1][1] = value + chunk[:min(end, MAX_STRING_VALUE_LENGTH - len(value))]
+            self._open = end == len(chunk) and len(self.strings[-1][1]) < MAX_STRING_VALUE_LENGTH
+            
+        last_start = self.strings[-1][0] if self.strings else -1
+        for match_offset, _ in self._stream.matches[found:]:
+            # Matches may begin in the previous chunk
+            position = max(match_offset - offset, 0)
+            boundary = mask.rfind(0, 0, position)
+            if boundary >= 0:
+                start, prefix = offset + boundary + 1, b''
+            else:
+                start, prefix = self._run_start, self._run_prefix
+            if start == last_start:
+                continue
+            end = mask.find(0, position)
+            end = len(chunk) if end < 0 else end
+            value = (prefix + chunk[max(start - offset, 0):end])[:MAX_STRING_VALUE_LENGTH]
+            self.strings.append([start, value])
+            self._open = end == len(chunk) and len(value) < MAX_STRING_VALUE_LENGTH
+            last_start = start
+            
+        boundary = mask.rfind(0)
+        if boundary >= 0:
+            self._run_start = offset + boundary + 1
+            self._run_prefix = chunk[boundary + 1:boundary + 1 + MAX_STRING_VALUE_LENGTH]
+        elif len(self._run_prefix) < MAX_STRING_VALUE_LENGTH:
+            self._run_prefix = (self._run_prefix + chunk)[:MAX_STRING_VALUE_LENGTH]
+            
+    def finish(self) -> List[Tuple[int, str]]:
+        """Return the (offset, leading characters) of every string holding a match"""
+        return [(start, value.decode('ascii')) for start, value in self.strings]
+
+
 class HeuristicRule:
     """Represents a heuristic detection rule"""
     
@@ -42,28 +149,190 @@ class HeuristicRule:
             'description': self.description,
             'enabled': self.enabled
         }
+        
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'HeuristicRule':
+        """Create a rule from its dictionary format"""
+        rule = cls(
+            rule_id=data['rule_id'],
+            name=data['name'],
+            category=data['category'],
+            weight=data.get('weight', 1.0),
+            description=data.get('description', '')
+        )
+        rule.enabled = data.get('enabled', True)
+        return rule
+
+
+class HeuristicGeneration(DefinitionsGeneration):
+    """Rules, patterns and thresholds frozen for the scans that pin them
+    
+    The string matcher and API index are reused from the previous generation
+    when the patterns they are compiled from are unchanged.
+    """
+    
+    def __init__(self, rules: Dict[str, HeuristicRule], suspicious_apis: FrozenSet[str],
+                 suspicious_strings: FrozenSet[str], api_combinations: Tuple[ApiCombination, ...],
+                 thresholds: Dict[str, float], settings: Dict[str, Any],
+                 previous: Optional['HeuristicGeneration'] = None):
+        # Copies, so later edits such as disable_rule cannot reach a published generation
+        self.rules = {rule_id: HeuristicRule.from_dict(rule.to_dict()) for rule_id, rule in rules.items()}
+        self.enabled_rules = frozenset(rule_id for rule_id, rule in self.rules.items() if rule.enabled)
+        self.suspicious_apis = suspicious_apis
+        self.suspicious_strings = suspicious_strings
+        self.api_combinations = api_combinations
+        self.thresholds = dict(thresholds)
+        self.rule_state = [rule.to_dict() for _, rule in sorted(self.rules.items())]
+        
+        if previous is not None and previous.suspicious_strings == suspicious_strings:
+            self.string_matcher = previous.string_matcher
+        else:
+            # Case-insensitive matcher over suspicious_strings
+            matcher = PatternMatcher(case_insensitive=True)
+            for suspicious in suspicious_strings:
+                if suspicious:
+                    matcher.add_pattern(suspicious.encode('utf-8'), suspicious)
+            self.string_matcher = matcher.compile() if matcher.pattern_count else None
+            
+        if previous is not None and previous.suspicious_apis == suspicious_apis and \
+                previous.api_combinations == api_combinations:
+            self.api_index = previous.api_index
+        else:
+            # Bitmask index over suspicious_apis and api_combinations
+            self.api_index = ApiIndex(suspicious_apis, api_combinations)
+            
+        definitions = {
+            'rules': self.rule_state,
+            'suspicious_apis': sorted(suspicious_apis),
+            'suspicious_strings': sorted(suspicious_strings),
+            'api_combinations': [[rule_id, indicator, list(apis)] for rule_id, indicator, apis in api_combinations],
+            'thresholds': self.thresholds,
+            **settings
+        }
+        encoded = json.dumps(definitions, sort_keys=True).encode('utf-8')
+        super().__init__(hashlib.sha256(encoded).hexdigest()[:16])
 
 
 class HeuristicScanner(BaseScanner):
     """Scanner that uses heuristic and behavioral analysis for malware detection"""
     
+    error_class = HeuristicScannerError
+    
     def __init__(self, config: Optional[Dict[str, Any]] = None):
         super().__init__("HeuristicScanner", config)
+        if not self.config.get('duplicate_verdicts', False):
+            # No rule needs a digest, so the table would cost hashing every file
+            self._duplicate_verdicts = None
         self.rules: Dict[str, HeuristicRule] = {}
         self.suspicious_apis: Set[str] = set()
         self.suspicious_strings: Set[str] = set()
-        self.file_anomaly_thresholds = {
-            'entropy_threshold': 7.0,  # High entropy indicates encryption/packing
-            'section_count_threshold': 10,  # Unusual number of PE sections
-            'import_count_threshold': 100,  # Excessive imports
-        }
+        self.file_anomaly_thresholds = dict(DEFAULT_ANOMALY_THRESHOLDS)
+        self.api_combinations: List[ApiCombination] = []
+        self._cached_definitions_version: Optional[str] = None
+        # The attributes above are the definitions as edited; scans use the
+        # generation last published from them. Edit them through the methods
+        # below, which mark the edit so the next scan publishes it
+        self._definitions = DefinitionsManager(self._snapshot_definitions()(None))
+        self.feature_extractor = FileFeatureExtractor(
+            hash_algorithms=('sha256',) if self._duplicate_verdicts is not None else (),
+            collect_strings=False,
+            chunk_size=self.config.get('chunk_size', DEFAULT_CHUNK_SIZE),
+            memory_limit=self.config.get('max_scan_memory')
+        )
+        self.feature_extractor.register_consumer(STRING_MATCHES_KEY, self._create_string_stream)
+        self.feature_extractor.register_consumer(ENTROPY_PROFILE_KEY, self._create_entropy_accumulator)
+        if self.config.get('triage', True):
+            self.feature_extractor.triage = self._triage
+        self.instrumentation: Optional[ScanInstrumentation] = None
+        if self.config.get('instrumentation'):
+            self.enable_instrumentation(self.config.get('instrumentation_log_interval'))
         
     def _initialize(self) -> None:
         """Initialize the heuristic scanner"""
-        self._load_heuristic_rules()
-        self._load_suspicious_patterns()
+        self._load_definitions()
+        self._cached_definitions_version = self.get_definitions_version()
         logger.info(f"Initialized with {len(self.rules)} heuristic rules")
         
+    def _load_definitions(self) -> None:
+        """Load the built-in rules and patterns, apply any rules file, and publish the result
+        
+        Scans keep using the current generation while the new one compiles.
+        """
+        with self._definitions.edit_lock:
+            self.rules = {}
+            self.file_anomaly_thresholds = dict(DEFAULT_ANOMALY_THRESHOLDS)
+            self._load_heuristic_rules()
+            self._load_suspicious_patterns()
+            if self.config.get('heuristic_rules_path'):
+                self._load_rules_file(Path(self.config['heuristic_rules_path']))
+            self._definitions.mark_edited()
+        self._publish_definitions()
+            
+    def _load_rules_file(self, rules_path: Path) -> None:
+        """Override the built-in definitions with those in a JSON rules file
+        
+        Each top-level key (rules, suspicious_apis, suspicious_strings,
+        api_combinations, thresholds) is optional; rules and thresholds are
+        merged into the built-in ones, the other keys replace them.
+        """
+        try:
+            with open(rules_path, 'r') as f:
+                data = json.load(f)
+            rules = [HeuristicRule.from_dict(rule) for rule in data.get('rules', [])]
+            combinations = [(rule_id, indicator, tuple(apis))
+                            for rule_id, indicator, apis in data.get('api_combinations', [])]
+        except Exception as e:
+            raise HeuristicScannerError(f"Failed to load heuristic rules: {str(e)}")
+            
+        for rule in rules:
+            self.rules[rule.rule_id] = rule
+        if 'suspicious_apis' in data:
+            self.suspicious_apis = set(data['suspicious_apis'])
+        if 'suspicious_strings' in data:
+            self.suspicious_strings = set(data['suspicious_strings'])
+        if 'api_combinations' in data:
+            self.api_combinations = combinations
+        self.file_anomaly_thresholds.update(data.get('thresholds', {}))
+        logger.info(f"Loaded heuristic definitions from {rules_path}")
+        
+    def _snapshot_definitions(self) -> Callable[[Optional[HeuristicGeneration]], HeuristicGeneration]:
+        """Copy the edited definitions and return a builder compiling them into a generation"""
+        settings = {
+            'scoring': [self.config.get('threat_threshold', 1.0), self.config.get('max_score', 5.0)],
+            'entropy_window': [self.config.get('entropy_window_size', DEFAULT_WINDOW_SIZE),
+                               self.config.get('entropy_window_stride', DEFAULT_WINDOW_STRIDE)],
+            'triage': [self.config.get('triage', True),
+                       {file_type: sorted(rules) if rules is not None else None
+                        for file_type, rules in (self.config.get('triage_rules') or {}).items()}]
+        }
+        rules = {rule_id: HeuristicRule.from_dict(rule.to_dict()) for rule_id, rule in self.rules.items()}
+        suspicious_apis = frozenset(self.suspicious_apis)
+        suspicious_strings = frozenset(self.suspicious_strings)
+        api_combinations = tuple(self.api_combinations)
+        thresholds = dict(self.file_anomaly_thresholds)
+        return lambda previous: HeuristicGeneration(rules, suspicious_apis, suspicious_strings, api_combinations,
+                                                    thresholds, settings, previous)
+        
+    def _publish_definitions(self, wait: bool = True) -> None:
+        """Publish the edited definitions; scans already running keep their generation
+        
+        Without wait, nothing is published while another thread is already
+        compiling a generation.
+        """
+        self._definitions.rebuild(self._snapshot_definitions, wait)
+        
+    @property
+    def _generation(self) -> HeuristicGeneration:
+        """The generation pinned by the running scan, publishing pending edits outside scans"""
+        if self._definitions.is_stale and not self._definitions.is_pinned:
+            self._publish_definitions(wait=False)
+        return self._definitions.pinned
+        
+    def _pin_definitions(self) -> ContextManager:
+        if self._definitions.is_stale:
+            self._publish_definitions(wait=False)
+        return self._definitions.pin()
+        
     def _load_heuristic_rules(self) -> None:
         """Load heuristic detection rules"""
         # Initialize default rules
@@ -110,110 +379,192 @@ class HeuristicScanner(BaseScanner):
             'encrypt', 'decrypt', 'payment', 'bitcoin_address'
         }
         
-    def scan_file(self, file_path: Path) -> ScanResult:
-        """Scan a file using heuristic analysis"""
+        # API combinations behind the behavioral rules
+        self.api_combinations = list(DEFAULT_API_COMBINATIONS)
+        
+    def scan_file(self, file_path: Path, features: Optional[FileFeatures] = None) -> ScanResult:
+        """Scan a file using heuristic analysis
+        
+        Pre-extracted features may be passed in to share a single read of the
+        file with other scanners.
+        """
         if not self.is_initialized:
             raise HeuristicScannerError("Scanner not initialized")
             
-        if not file_path.exists():
+        if features is None and not file_path.exists():
             raise HeuristicScannerError(f"File not found: {file_path}")
             
         logger.debug(f"Performing heuristic scan on: {file_path}")
         
         try:
-            # Collect all heuristic indicators
-            indicators = []
-            threat_score = 0.0
+            with self._pin_definitions():
+                cache_identity = None
+                archive = None
+                if features is None:
+                    # Skip files whose verdict is still valid for these rules
+                    cached, cache_identity = self._lookup_cached_verdict(file_path)
+                    if cached is not None:
+                        return cached
+                    # Read the file once; every check below works from these features
+                    features, archive = self._extract_features(file_path)
+                    # Copies of a file already scanned reuse its verdict
+                    duplicate = self._lookup_duplicate_verdict(file_path, features)
+                    if duplicate is not None:
+                        self._store_cached_verdict(cache_identity, duplicate)
+                        return duplicate
+                    
+                result = self._stamp_generation(self._scan_features(file_path, features))
+                if archive is not None:
+                    result = self._fold_archive_members(result, archive)
+                self._store_cached_verdict(cache_identity, result)
+                self._store_duplicate_verdict(features, result)
+            if self.instrumentation is not None:
+                self.instrumentation.maybe_log()
+            return result
+            
+        except Exception as e:
+            logger.error(f"Error during heuristic scan of {file_path}: {str(e)}")
+            raise HeuristicScannerError(f"Heuristic scan failed: {str(e)}")
             
-            # Check file entropy
-            entropy_result = self._check_file_entropy(file_path)
+    def _scan_features(self, file_path: Path, features: FileFeatures) -> ScanResult:
+        """Apply the heuristic rules to the features extracted from a file"""
+        # Collect all heuristic indicators
+        indicators = []
+        threat_score = 0.0
+        file_type, rules = self._rules_for_file(features)
+        
+        # Check file entropy
+        entropy_result = self._check_file_entropy(features) if 'HR005' in rules else None
+        if entropy_result:
+            indicators.append(entropy_result)
+            threat_score += entropy_result['weight']
+            
+        # Analyze PE structure (if applicable)
+        if self._is_pe_file(features) and rules & PE_RULES:
+            pe_results = [r for r in self._analyze_pe_structure(features) if r['rule_id'] in rules]
             if entropy_result:
-                indicators.append(entropy_result)
-                threat_score += entropy_result['weight']
-                
-            # Analyze PE structure (if applicable)
-            if self._is_pe_file(file_path):
-                pe_results = self._analyze_pe_structure(file_path)
-                indicators.extend(pe_results)
-                threat_score += sum(r['weight'] for r in pe_results)
-                
-            # Check for suspicious strings
-            string_results = self._check_suspicious_strings(file_path)
+                # HR005 already scored on the whole file; keep the section detail only
+                for section_result in [r for r in pe_results if r['rule_id'] == 'HR005']:
+                    entropy_result['sections'] = section_result['sections']
+                    pe_results.remove(section_result)
+            indicators.extend(pe_results)
+            threat_score += sum(r['weight'] for r in pe_results)
+            
+        # Check for suspicious strings
+        if 'HR006' in rules:
+            string_results = self._check_suspicious_strings(features)
             indicators.extend(string_results)
             threat_score += sum(r['weight'] for r in string_results)
-            
-            # Check for suspicious patterns
-            pattern_results = self._check_behavioral_patterns(file_path)
+        
+        # Check for suspicious patterns
+        if rules & BEHAVIORAL_RULES:
+            pattern_results = [r for r in self._check_behavioral_patterns(features) if r['rule_id'] in rules]
             indicators.extend(pattern_results)
             threat_score += sum(r['weight'] for r in pattern_results)
+        
+        if self.instrumentation is not None:
+            if file_type is not None:
+                self.instrumentation.count(f"triage.{file_type}")
+            for indicator in indicators:
+                self.instrumentation.count(f"triggered.{indicator['rule_id']}")
             
-            # Determine if threat detected based on cumulative score
-            threat_detected = threat_score >= self.config.get('threat_threshold', 1.0)
-            confidence = min(threat_score / self.config.get('max_score', 5.0), 1.0)
-            
-            # Classify threat type based on indicators
-            threat_type = self._classify_threat(indicators) if threat_detected else None
-            
-            return ScanResult(
-                file_path=str(file_path),
-                threat_detected=threat_detected,
-                threat_type=threat_type,
-                confidence=confidence,
-                details={
-                    'scan_type': 'heuristic',
-                    'threat_score': threat_score,
-                    'indicators': indicators,
-                    'rules_triggered': [ind['rule_id'] for ind in indicators]
-                }
-            )
-            
-        except Exception as e:
-            logger.error(f"Error during heuristic scan of {file_path}: {str(e)}")
-            raise HeuristicScannerError(f"Heuristic scan failed: {str(e)}")
-            
-    def scan_directory(self, directory_path: Path, recursive: bool = True) -> List[ScanResult]:
-        """Scan a directory using heuristic analysis"""
-        if not self.is_initialized:
-            raise HeuristicScannerError("Scanner not initialized")
-            
-        if not directory_path.exists() or not directory_path.is_dir():
-            raise HeuristicScannerError(f"Invalid directory: {directory_path}")
+        # Determine if threat detected based on cumulative score
+        threat_detected = threat_score >= self.config.get('threat_threshold', 1.0)
+        confidence = min(threat_score / self.config.get('max_score', 5.0), 1.0)
+        
+        # Classify threat type based on indicators
+        threat_type = self._classify_threat(indicators) if threat_detected else None
+        
+        return ScanResult(
+            file_path=str(file_path),
+            threat_detected=threat_detected,
+            threat_type=threat_type,
+            confidence=confidence,
+            details={
+                'scan_type': 'heuristic',
+                'threat_score': threat_score,
+                'indicators': indicators,
+                'rules_triggered': [ind['rule_id'] for ind in indicators],
+                'file_type': file_type,
+                'rules_evaluated': sorted(rules),
+                'imphash': self._get_imphash(features)
+            }
+        )
             
-        results = []
-        pattern = "**/*" if recursive else "*"
+    def _rules_for_type(self, file_type: Optional[str]) -> FrozenSet[str]:
+        """Get the enabled rules that apply to a file type"""
+        enabled = self._generation.enabled_rules
+        if file_type is None:
+            return enabled
+        routed = rules_for_file_type(file_type, self.config.get('triage_rules'))
+        return enabled if routed is None else enabled & routed
         
-        for file_path in directory_path.glob(pattern):
-            if file_path.is_file():
-                try:
-                    result = self.scan_file(file_path)
-                    results.append(result)
-                except Exception as e:
-                    logger.error(f"Failed to scan {file_path}: {str(e)}")
-                    
-        return results
+    def _rules_for_file(self, features: FileFeatures) -> Tuple[Optional[str], FrozenSet[str]]:
+        """Get a file's type and the rules to evaluate on it"""
+        file_type = features.file_type
+        if file_type is None and self.config.get('triage', True):
+            # Features extracted by another extractor, e.g. the orchestrator's combined one
+            file_type = classify_file(features.header[:TRIAGE_HEADER_SIZE])
+        return file_type, self._rules_for_type(file_type)
         
+    def _triage(self, header: bytes) -> Tuple[str, Set[str]]:
+        """Classify a file from its first chunk and name the extraction stages its rules need"""
+        file_type = classify_file(header[:TRIAGE_HEADER_SIZE])
+        stages = {'hashes'} if self._duplicate_verdicts is not None else set()
+        for rule_id in self._rules_for_type(file_type):
+            stages.update(RULE_STAGES.get(rule_id, ()))
+        return file_type, stages
+            
     def update_definitions(self) -> bool:
-        """Update heuristic rules and patterns"""
+        """Update heuristic rules and patterns
+        
+        With heuristic_rules_path configured, the built-in definitions and the
+        rules file are reloaded into a new generation while scans continue on
+        the current one; the swap is atomic and the old generation is released
+        once the scans using it finish.
+        """
         try:
-            # TODO: Implement rule update mechanism
             logger.info("Updating heuristic rules and patterns...")
-            # Placeholder for update logic
+            if self.config.get('heuristic_rules_path'):
+                self._load_definitions()
+                
+            # Rules may also have changed through add_rule/disable_rule since the last update
+            if self.get_definitions_version() != self._cached_definitions_version:
+                self._invalidate_cached_verdicts()
+                self._cached_definitions_version = self.get_definitions_version()
             return True
         except Exception as e:
             logger.error(f"Failed to update heuristic definitions: {str(e)}")
             return False
             
-    def _check_file_entropy(self, file_path: Path) -> Optional[Dict[str, Any]]:
-        """Calculate and check file entropy for potential packing/encryption"""
+    def _check_file_entropy(self, features: FileFeatures) -> Optional[Dict[str, Any]]:
+        """Calculate and check file entropy for potential packing/encryption
+        
+        Besides the whole-file average, packed regions inside large files are
+        flagged from the sliding-window entropy profile.
+        """
         try:
-            entropy = self._calculate_entropy(file_path)
+            threshold = self._generation.thresholds['entropy_threshold']
+            entropy = shannon_entropy(features.histogram)
             
-            if entropy >= self.file_anomaly_thresholds['entropy_threshold']:
+            if entropy >= threshold:
                 return {
                     'rule_id': 'HR005',
                     'indicator': 'High file entropy',
                     'value': entropy,
-                    'weight': self.rules['HR005'].weight,
+                    'weight': self._generation.rules['HR005'].weight,
+                    'severity': 'medium'
+                }
+                
+            profile: Optional[EntropyProfile] = features.extras.get(ENTROPY_PROFILE_KEY)
+            if profile is not None and profile.max_window_entropy >= threshold:
+                return {
+                    'rule_id': 'HR005',
+                    'indicator': 'High entropy region',
+                    'value': profile.max_window_entropy,
+                    'regions': profile.high_entropy_regions,
+                    'file_entropy': entropy,
+                    'weight': self._generation.rules['HR005'].weight,
                     'severity': 'medium'
                 }
         except Exception as e:
@@ -221,104 +572,209 @@ class HeuristicScanner(BaseScanner):
             
         return None
         
-    def _calculate_entropy(self, file_path: Path) -> float:
-        """Calculate Shannon entropy of a file"""
-        with open(file_path, 'rb') as f:
-            data = f.read()
-            
-        if not data:
-            return 0.0
-            
-        # Calculate byte frequency
-        frequency = {}
-        for byte in data:
-            frequency[byte] = frequency.get(byte, 0) + 1
+    def _create_entropy_accumulator(self) -> EntropyAccumulator:
+        """Create per-file sliding-window entropy state for the feature extractor"""
+        return EntropyAccumulator(
+            window_size=self.config.get('entropy_window_size', DEFAULT_WINDOW_SIZE),
+            stride=self.config.get('entropy_window_stride', DEFAULT_WINDOW_STRIDE),
+            threshold=self._generation.thresholds['entropy_threshold']
+        )
+        
+    def _is_pe_file(self, features: FileFeatures) -> bool:
+        """Check if file is a PE (Portable Executable) file"""
+        # Check DOS header magic number captured during feature extraction
+        return features.is_pe
             
-        # Calculate entropy
-        entropy = 0.0
-        data_len = len(data)
+    def _analyze_pe_structure(self, features: FileFeatures) -> List[Dict[str, Any]]:
+        """Analyze PE file structure for anomalies
         
-        for count in frequency.values():
-            if count > 0:
-                probability = count / data_len
-                entropy -= probability * (probability.bit_length() - 1)
-                
-        return entropy
+        The file is memory-mapped, or taken from memory for archive members,
+        and parsed in place, so section bodies are never copied; high-entropy sections are reported under HR005. The
+        import table is left in the features for the behavioral checks.
+        """
+        indicators = []
+        if features.content is None and features.container is not None:
+            logger.debug(f"Not analyzing PE structure of {features.file_path}: too large to buffer")
+            return indicators
         
-    def _is_pe_file(self, file_path: Path) -> bool:
-        """Check if file is a PE (Portable Executable) file"""
         try:
-            with open(file_path, 'rb') as f:
-                # Check DOS header magic number
-                dos_header = f.read(2)
-                return dos_header == b'MZ'
-        except:
-            return False
+            pe = PEFile(features.content) if features.content is not None else PEFile.open(features.file_path)
+            with pe:
+                features.extras[IMPORT_PROFILE_KEY] = self._profile_imports(pe)
+                indicators.extend(self._check_pe_anomalies(pe))
+                section_result = self._check_section_entropy(pe)
+                if section_result:
+                    indicators.append(section_result)
+        except PEFormatError as e:
+            # MZ files without valid NT headers include plain DOS programs
+            logger.debug(f"Not analyzing PE structure of {features.file_path}: {str(e)}")
+        except OSError as e:
+            logger.error(f"Error analyzing PE structure: {str(e)}")
             
-    def _analyze_pe_structure(self, file_path: Path) -> List[Dict[str, Any]]:
-        """Analyze PE file structure for anomalies"""
-        indicators = []
+        return indicators
         
-        # TODO: Implement detailed PE analysis
-        # This is a placeholder for PE structure analysis
+    def _profile_imports(self, pe: PEFile) -> ImportProfile:
+        """Index a parsed PE file's imports for the behavioral checks"""
+        return self._get_api_index().profile(pe.imports, pe.imphash())
         
-        return indicators
+    def _check_pe_anomalies(self, pe: PEFile) -> List[Dict[str, Any]]:
+        """Check parsed PE headers against the structural anomaly rules"""
+        anomalies = []
+        
+        if pe.section_count > self._generation.thresholds['section_count_threshold']:
+            anomalies.append(('Unusual number of sections', pe.section_count))
+            
+        import_count = sum(len(functions) for functions in pe.imports.values())
+        if import_count > self._generation.thresholds['import_count_threshold']:
+            anomalies.append(('Excessive imports', import_count))
+            
+        writable_code = [s.name for s in pe.sections if s.is_writable and s.is_executable]
+        if writable_code:
+            anomalies.append(('Writable and executable sections', writable_code))
+            
+        entry_section = pe.entry_point_section()
+        if pe.entry_point and (entry_section is None or not entry_section.is_executable):
+            anomalies.append(('Entry point outside code sections',
+                              entry_section.name if entry_section else pe.entry_point))
+            
+        if pe.is_truncated:
+            anomalies.append(('Sections extend past end of file', pe.size))
+            
+        return [{
+            'rule_id': 'HR004',
+            'indicator': indicator,
+            'value': value,
+            'weight': self._generation.rules['HR004'].weight,
+            'severity': 'medium'
+        } for indicator, value in anomalies]
+        
+    def _check_section_entropy(self, pe: PEFile) -> Optional[Dict[str, Any]]:
+        """Check the entropy of every PE section for packing/encryption"""
+        threshold = self._generation.thresholds['entropy_threshold']
+        sections = []
+        for section in pe.sections:
+            if section.raw_size < MIN_ENTROPY_SECTION_SIZE:
+                continue
+            entropy = pe.section_entropy(section)
+            if entropy >= threshold:
+                sections.append({'name': section.name, 'entropy': entropy})
+                
+        if not sections:
+            return None
+        return {
+            'rule_id': 'HR005',
+            'indicator': 'High entropy section',
+            'value': max(section['entropy'] for section in sections),
+            'sections': sections,
+            'weight': self._generation.rules['HR005'].weight,
+            'severity': 'medium'
+        }
         
-    def _check_suspicious_strings(self, file_path: Path) -> List[Dict[str, Any]]:
+    def _check_suspicious_strings(self, features: FileFeatures) -> List[Dict[str, Any]]:
         """Check for suspicious strings in the file"""
         indicators = []
         
         try:
-            with open(file_path, 'rb') as f:
-                content = f.read()
+            strings = features.extras.get(STRING_MATCHES_KEY)
+            if strings is None:
+                strings = self._match_suspicious_strings(features.file_path)
+                
+            # One indicator per printable string, however many suspicious strings it holds
+            for offset, string in strings:
+                indicators.append({
+                    'rule_id': 'HR006',
+                    'indicator': 'Suspicious string found',
+                    'value': string,
+                    'offset': offset,
+                    'weight': self._generation.rules['HR006'].weight,
+                    'severity': 'low'
+                })
                 
-            # Extract printable strings
-            strings = self._extract_strings(content)
-            
-            # Check against suspicious patterns
-            for string in strings:
-                for suspicious in self.suspicious_strings:
-                    if suspicious.lower() in string.lower():
-                        indicators.append({
-                            'rule_id': 'HR006',
-                            'indicator': f'Suspicious string found',
-                            'value': string[:50],  # Truncate for display
-                            'weight': self.rules['HR006'].weight,
-                            'severity': 'low'
-                        })
-                        break
-                        
         except Exception as e:
             logger.error(f"Error checking strings: {str(e)}")
             
         return indicators
         
-    def _extract_strings(self, data: bytes, min_length: int = 4) -> List[str]:
-        """Extract printable strings from binary data"""
-        # Simple ASCII string extraction
-        pattern = rb'[\x20-\x7E]{%d,}' % min_length
-        strings = re.findall(pattern, data)
-        return [s.decode('ascii', errors='ignore') for s in strings]
+    def _match_suspicious_strings(self, file_path: str) -> List[Tuple[int, str]]:
+        """Find the strings holding suspicious strings in a separate pass over the file"""
+        stream = self._create_string_stream()
+        if stream is None:
+            return []
+            
+        with open(file_path, 'rb') as f:
+            offset = 0
+            for chunk in iter(lambda: f.read(self.feature_extractor.chunk_size), b''):
+                stream.update(chunk, offset)
+                offset += len(chunk)
+                
+        return stream.finish()
+        
+    def _get_string_matcher(self) -> Optional[PatternMatcher]:
+        """Get the compiled suspicious string matcher of the definitions in use"""
+        return self._generation.string_matcher
         
-    def _check_behavioral_patterns(self, file_path: Path) -> List[Dict[str, Any]]:
-        """Check for suspicious behavioral patterns"""
-        indicators = []
+    def _create_string_stream(self) -> Optional[_SuspiciousStringStream]:
+        """Create per-file suspicious string matching state for the feature extractor"""
+        matcher = self._get_string_matcher()
+        if matcher is None:
+            return None
+        return _SuspiciousStringStream(matcher.stream(max_matches=self.config.get('max_string_matches', 1000)))
         
-        # TODO: Implement behavioral pattern detection
-        # This would include checking for:
-        # - API import analysis
-        # - Code pattern analysis
-        # - Anti-analysis techniques
+    def _check_behavioral_patterns(self, features: FileFeatures) -> List[Dict[str, Any]]:
+        """Check imported API combinations for injection, anti-analysis and other suspicious behavior
         
+        Works from the import profile left by PE structure analysis, so every
+        check is an AND of the file's API mask with a precomputed mask.
+        """
+        profile: Optional[ImportProfile] = features.extras.get(IMPORT_PROFILE_KEY)
+        if profile is None or not profile.api_mask:
+            return []
+            
+        index = self._get_api_index()
+        matched: Dict[str, List[Tuple[str, int]]] = {}
+        explained_mask = 0
+        for rule_id, indicator, mask in index.match(profile.api_mask):
+            matched.setdefault(rule_id, []).append((indicator, mask))
+            explained_mask |= mask
+            
+        # Suspicious APIs no combination accounts for still count towards HR001
+        suspicious_mask = profile.api_mask & index.suspicious_mask & ~explained_mask
+        if 'HR001' not in matched and \
+                bin(suspicious_mask).count('1') >= self._generation.thresholds['suspicious_api_threshold']:
+            matched['HR001'] = [('Suspicious API imports', suspicious_mask)]
+            
+        indicators = []
+        for rule_id, combinations in sorted(matched.items()):
+            if rule_id not in self._generation.rules:
+                continue
+            mask = 0
+            for _, combination_mask in combinations:
+                mask |= combination_mask
+            indicators.append({
+                'rule_id': rule_id,
+                'indicator': ', '.join(dict.fromkeys(indicator for indicator, _ in combinations)),
+                'value': index.api_names(mask),
+                'weight': self._generation.rules[rule_id].weight,
+                'severity': 'high' if rule_id == 'HR002' else 'medium'
+            })
         return indicators
         
+    def _get_api_index(self) -> ApiIndex:
+        """Get the suspicious API index of the definitions in use"""
+        return self._generation.api_index
+        
+    def _get_imphash(self, features: FileFeatures) -> Optional[str]:
+        """Get the import hash found by PE structure analysis, if any"""
+        profile: Optional[ImportProfile] = features.extras.get(IMPORT_PROFILE_KEY)
+        return profile.imphash if profile is not None else None
+        
     def _classify_threat(self, indicators: List[Dict[str, Any]]) -> str:
         """Classify the type of threat based on indicators"""
         # Simple classification based on indicator patterns
         categories = {}
         
         for indicator in indicators:
-            rule = self.rules.get(indicator['rule_id'])
+            rule = self._generation.rules.get(indicator['rule_id'])
             if rule:
                 category = rule.category
                 categories[category] = categories.get(category, 0) + 1
@@ -331,19 +787,79 @@ class HeuristicScanner(BaseScanner):
         
     def add_rule(self, rule: HeuristicRule) -> None:
         """Add a new heuristic rule"""
-        self.rules[rule.rule_id] = rule
+        with self._definitions.edit_lock:
+            self.rules[rule.rule_id] = rule
+            self._definitions.mark_edited()
         logger.debug(f"Added heuristic rule: {rule.name}")
         
     def disable_rule(self, rule_id: str) -> bool:
         """Disable a heuristic rule"""
-        if rule_id in self.rules:
+        with self._definitions.edit_lock:
+            if rule_id not in self.rules:
+                return False
             self.rules[rule_id].enabled = False
-            logger.debug(f"Disabled rule: {rule_id}")
-            return True
-        return False
+            self._definitions.mark_edited()
+        logger.debug(f"Disabled rule: {rule_id}")
+        return True
+        
+    def add_suspicious_strings(self, strings: Iterable[str]) -> None:
+        """Add strings whose presence triggers HR006"""
+        with self._definitions.edit_lock:
+            self.suspicious_strings.update(strings)
+            self._definitions.mark_edited()
+            
+    def add_suspicious_apis(self, apis: Iterable[str]) -> None:
+        """Add imported APIs counted as suspicious by the PE checks"""
+        with self._definitions.edit_lock:
+            self.suspicious_apis.update(apis)
+            self._definitions.mark_edited()
+            
+    def set_threshold(self, name: str, value: float) -> None:
+        """Change one of the file anomaly thresholds"""
+        with self._definitions.edit_lock:
+            self.file_anomaly_thresholds[name] = value
+            self._definitions.mark_edited()
+        
+    def get_definitions_version(self) -> str:
+        """Get a digest identifying the rules, patterns and thresholds in use"""
+        return self._generation.version
         
+    def enable_instrumentation(self, log_interval: Optional[float] = None) -> ScanInstrumentation:
+        """Start recording per-rule and per-extractor call counts, time and bytes
+        
+        With a log interval, a summary is logged at most that often (in seconds).
+        """
+        if self.instrumentation is None:
+            self.instrumentation = ScanInstrumentation(log_interval)
+            # Shadow the rule checks with timed wrappers; disabling removes them again
+            for method_name, timing_name in INSTRUMENTED_CHECKS.items():
+                # Every check takes the file's features or its parsed PE, both with a size
+                setattr(self, method_name, self.instrumentation.wrap(
+                    timing_name, getattr(self, method_name), MEASURE_FEATURES_SIZE
+                ))
+            self.scan_file = self.instrumentation.wrap('scan_file', self.scan_file)
+            self.feature_extractor.instrumentation = self.instrumentation
+        self.instrumentation.log_interval = log_interval
+        return self.instrumentation
+        
+    def disable_instrumentation(self) -> None:
+        """Stop recording and remove all timing wrappers"""
+        if self.instrumentation is None:
+            return
+        for method_name in list(INSTRUMENTED_CHECKS) + ['scan_file']:
+            self.__dict__.pop(method_name, None)
+        self.feature_extractor.instrumentation = None
+        self.instrumentation = None
+        
+    def _take_worker_statistics(self) -> Optional[Dict[str, Any]]:
+        return self.instrumentation.take() if self.instrumentation is not None else None
+        
+    def _merge_worker_statistics(self, statistics: Dict[str, Any]) -> None:
+        if self.instrumentation is not None:
+            self.instrumentation.merge(statistics)
+            
     def get_rule_statistics(self) -> Dict[str, Any]:
-        """Get statistics about heuristic rules"""
+        """Get statistics about heuristic rules, with timings if instrumentation is enabled"""
         return {
             'total_rules': len(self.rules),
             'enabled_rules': sum(1 for r in self.rules.values() if r.enabled),
@@ -351,5 +867,13 @@ class HeuristicScanner(BaseScanner):
                 'behavioral': sum(1 for r in self.rules.values() if r.category == 'behavioral'),
                 'structural': sum(1 for r in self.rules.values() if r.category == 'structural'),
                 'anomaly': sum(1 for r in self.rules.values() if r.category == 'anomaly')
-            }
+            },
+            'instrumentation': self.instrumentation.get_statistics() if self.instrumentation else None
         }
+        
+    def get_scanner_info(self) -> Dict[str, Any]:
+        """Get information about the scanner and its rules"""
+        info = super().get_scanner_info()
+        info['rule_statistics'] = self.get_rule_statistics()
+        info['definitions'] = self._definitions.get_statistics()
+        return info
@@ -0,0 +1,170 @@
+"""
+Instrumentation Module
+Call counts, cumulative time and bytes processed for scanner hot paths
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# How a timed call determines the number of bytes it processed
+MEASURE_NONE = 'none'
+MEASURE_FIRST_ARGUMENT = 'argument'  # len() of the first argument, e.g. a chunk
+MEASURE_RESULT = 'result'  # len() of the return value, e.g. a read
+MEASURE_FEATURES_SIZE = 'features'  # size of the FileFeatures, or parsed PE file, passed first
+
+
+class TimingStats:
+    """Accumulated measurements of one instrumented operation"""
+
+    __slots__ = ('calls', 'seconds', 'bytes')
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.bytes = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the measurements to dictionary format"""
+        return {
+            'calls': self.calls,
+            'total_seconds': self.seconds,
+            'mean_ms': self.seconds / self.calls * 1000 if self.calls else 0.0,
+            'bytes': self.bytes,
+            'mb_per_second': self.bytes / (1024 * 1024) / self.seconds if self.seconds else 0.0
+        }
+
+
+class TimedCall:
+    """Callable wrapper recording each call of a function into TimingStats
+
+    A class rather than a closure so instrumented scanners can still be
+    pickled into parallel scan workers.
+    """
+
+    def __init__(self, function: Callable, stats: TimingStats, instrumentation: 'ScanInstrumentation',
+                 measure: str = MEASURE_NONE):
+        self.function = function
+        self.stats = stats
+        self.instrumentation = instrumentation
+        self.measure = measure
+
+    def __call__(self, *args, **kwargs):
+        started = time.perf_counter()
+        result = self.function(*args, **kwargs)
+        seconds = time.perf_counter() - started
+        processed = 0
+        if self.measure == MEASURE_FIRST_ARGUMENT:
+            processed = len(args[0])
+        elif self.measure == MEASURE_RESULT:
+            processed = len(result)
+        elif self.measure == MEASURE_FEATURES_SIZE:
+            processed = args[0].size
+        self.instrumentation.record(self.stats, seconds, processed)
+        return result
+
+
+class ScanInstrumentation:
+    """Registry of timing statistics and counters for one scanner
+
+    Instrumentation is opt-in: code paths are only wrapped once it is enabled,
+    so a scanner without it pays nothing beyond an occasional None check.
+    Measurements may be recorded from several threads, and those taken in
+    parallel scan workers are merged back with take() and merge().
+    """
+
+    def __init__(self, log_interval: Optional[float] = None):
+        self.log_interval = log_interval  # Seconds between statistics dumps; None disables
+        self.timings: Dict[str, TimingStats] = {}
+        self.counters: Dict[str, int] = {}
+        self._last_log = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def stats(self, name: str) -> TimingStats:
+        """Get the statistics recorded under a name, creating them if needed"""
+        with self._lock:
+            return self._stats(name)
+
+    def _stats(self, name: str) -> TimingStats:
+        stats = self.timings.get(name)
+        if stats is None:
+            stats = self.timings[name] = TimingStats()
+        return stats
+
+    def wrap(self, name: str, function: Callable, measure: str = MEASURE_NONE) -> TimedCall:
+        """Wrap a function so every call is recorded under name"""
+        return TimedCall(function, self.stats(name), self, measure)
+
+    def record(self, stats: TimingStats, seconds: float, processed: int = 0) -> None:
+        """Add one call's time and bytes processed to its statistics"""
+        with self._lock:
+            stats.calls += 1
+            stats.seconds += seconds
+            stats.bytes += processed
+
+    def count(self, name: str, amount: int = 1) -> None:
+        """Increment a named counter"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get every timing and counter recorded so far"""
+        with self._lock:
+            return {
+                'timings': {name: stats.to_dict() for name, stats in sorted(self.timings.items())},
+                'counters': dict(sorted(self.counters.items()))
+            }
+
+    def take(self) -> Dict[str, Any]:
+        """Get the raw measurements recorded so far and start over, e.g. in a scan worker"""
+        with self._lock:
+            taken = {
+                'timings': {name: (stats.calls, stats.seconds, stats.bytes)
+                            for name, stats in self.timings.items() if stats.calls},
+                'counters': self.counters
+            }
+            self._reset()
+        return taken
+
+    def merge(self, taken: Dict[str, Any]) -> None:
+        """Add measurements taken from another copy of this instrumentation"""
+        with self._lock:
+            for name, (calls, seconds, processed) in taken['timings'].items():
+                stats = self._stats(name)
+                stats.calls += calls
+                stats.seconds += seconds
+                stats.bytes += processed
+            for name, amount in taken['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + amount
+
+    def maybe_log(self) -> None:
+        """Log a statistics summary if the log interval has elapsed"""
+        if self.log_interval is None or time.monotonic() - self._last_log < self.log_interval:
+            return
+        self._last_log = time.monotonic()
+        timings = self.get_statistics()['timings']
+        for name, summary in sorted(timings.items(), key=lambda item: -item[1]['total_seconds']):
+            logger.info(f"{name}: {summary['calls']} calls, {summary['total_seconds']:.3f}s, "
+                        f"{summary['bytes']} bytes, {summary['mb_per_second']:.1f} MB/s")
+
+    def reset(self) -> None:
+        """Discard everything recorded so far"""
+        with self._lock:
+            self._reset()
+
+    def _reset(self) -> None:
+        for stats in self.timings.values():
+            stats.calls, stats.seconds, stats.bytes = 0, 0.0, 0
+        self.counters = {}
@@ -0,0 +1,502 @@
+"""
+Pattern Matcher Module
+Multi-pattern byte matching: a vectorized anchor filter for most patterns and
+an Aho-Corasick automaton for the shortest ones
+"""
+
+import re
+from typing import Dict, List, Any, Optional, Tuple
+import logging
+
+import numpy as np
+
+from file_features import ChunkConsumer
+
+logger = logging.getLogger(__name__)
+
+# Longest pattern prefix, and most distinct prefixes, used to skip ahead from the root
+MAX_SKIP_PREFIX_LENGTH = 3
+MAX_SKIP_PREFIXES = 1024
+
+# Patterns at least this long are found through an anchor window, whose leading uint32 is filtered
+PREFIX_LENGTH = 4
+ANCHOR_LENGTH = 8  # Patterns at least this long are looked up by a uint64 window
+COMMON_BYTES = b'\x00\xff\x20\x90\xcc'  # Padding, space, NOP and INT3; poor anchors
+PREFIX_HASH_MULTIPLIER = np.uint32(2654435761)  # Knuth's multiplicative hash
+MIN_PREFIX_FILTER_BITS = 16
+MAX_PREFIX_FILTER_BITS = 22  # A 4 MiB filter; larger ones only add cache misses
+PREFIX_FILTER_SLOTS_PER_PREFIX = 16  # Keeps about 6% of filter slots set
+MATCH_BLOCK_SIZE = 256 * 1024  # Positions filtered at once, bounding the working arrays
+MAX_CANDIDATE_PAIRS = 1024 * 1024  # (position, pattern) pairs compared at once
+
+
+class AhoCorasickAutomaton:
+    """Compiled automaton that finds every occurrence of many byte patterns in one pass"""
+
+    def __init__(self, case_insensitive: bool = False):
+        self.case_insensitive = case_insensitive
+        self.pattern_count = 0
+        self._goto: List[dict] = [{}]
+        self._fail: List[int] = [0]
+        self._own_output: List[List[Tuple[int, Any]]] = [[]]
+        self._output: List[Optional[Tuple[Tuple[int, Any], ...]]] = []
+        self._min_pattern_length = 0
+        self._root_skip = None
+        self._root_skip_length = 0
+        self._compiled = False
+
+    def add_pattern(self, pattern: bytes, value: Any) -> None:
+        """Add a pattern; value is reported back for every match"""
+        if not pattern:
+            raise ValueError("Cannot add an empty pattern")
+        if self._compiled:
+            raise ValueError("Cannot add patterns to a compiled automaton")
+        if self.case_insensitive:
+            pattern = pattern.lower()
+
+        state = 0
+        for byte in pattern:
+            next_state = self._goto[state].get(byte)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][byte] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._own_output.append([])
+            state = next_state
+
+        self._own_output[state].append((len(pattern), value))
+        self.pattern_count += 1
+        if not self._min_pattern_length or len(pattern) < self._min_pattern_length:
+            self._min_pattern_length = len(pattern)
+
+    def compile(self) -> 'AhoCorasickAutomaton':
+        """Build failure links and merged outputs; no patterns may be added afterwards"""
+        goto, fail, own_output = self._goto, self._fail, self._own_output
+        output: List[Optional[Tuple[Tuple[int, Any], ...]]] = [None] * len(goto)
+        output[0] = tuple(own_output[0]) or None
+
+        # Breadth-first so every failure target is finished before its dependents
+        queue = list(goto[0].values())
+        for state in queue:
+            fail[state] = 0
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            merged = own_output[state] + list(output[fail[state]] or ())
+            output[state] = tuple(merged) or None
+
+            for byte, child in goto[state].items():
+                fallback = fail[state]
+                while byte not in goto[fallback] and fallback != 0:
+                    fallback = fail[fallback]
+                fail[child] = goto[fallback].get(byte, 0)
+                queue.append(child)
+
+        self._output = output
+        self._own_output = []  # Merged into _output, no longer needed
+
+        self._build_root_skip()
+        self._compiled = True
+        logger.debug(f"Compiled automaton with {self.pattern_count} patterns "
+                     f"and {len(goto)} states")
+        return self
+
+    def _build_root_skip(self) -> None:
+        """Compile a regex that jumps to the next position where a pattern can start
+
+        From the root state no match can begin at a position unless the bytes there
+        spell a pattern prefix, so the regex engine finds those positions in C.
+        """
+        longest = min(self._min_pattern_length, MAX_SKIP_PREFIX_LENGTH)
+        for length in range(longest, 0, -1):
+            prefixes = self._prefixes(length)
+            if len(prefixes) <= MAX_SKIP_PREFIXES:
+                break
+        else:
+            return
+        if length == 1 and len(prefixes) == 256:
+            return  # Every byte starts a pattern, nothing to skip
+
+        alternatives = b'|'.join(
+            b''.join(b'\\x%02x' % byte for byte in prefix) for prefix in sorted(prefixes)
+        )
+        self._root_skip = re.compile(b'(?:' + alternatives + b')')
+        self._root_skip_length = length
+
+    def _prefixes(self, length: int) -> List[bytes]:
+        """Collect every distinct pattern prefix of the given length from the trie"""
+        level = [(b'', 0)]
+        for _ in range(length):
+            level = [
+                (prefix + bytes((byte,)), child)
+                for prefix, state in level
+                for byte, child in self._goto[state].items()
+            ]
+            if len(level) > MAX_SKIP_PREFIXES:
+                break
+        return [prefix for prefix, _ in level]
+
+    def search(self, data: bytes, max_matches: Optional[int] = None) -> List[Tuple[int, Any]]:
+        """Find all (offset, value) matches in a single buffer"""
+        stream = self.stream(max_matches)
+        stream.update(data, 0)
+        return stream.finish()
+
+    def stream(self, max_matches: Optional[int] = None) -> 'AhoCorasickStream':
+        """Create matching state that can be fed a file chunk by chunk"""
+        if not self._compiled:
+            raise ValueError("Automaton must be compiled before matching")
+        return AhoCorasickStream(self, max_matches)
+
+
+class AhoCorasickStream(ChunkConsumer):
+    """Per-file matching state; matches spanning chunk boundaries are still found"""
+
+    def __init__(self, automaton: AhoCorasickAutomaton, max_matches: Optional[int] = None):
+        self.automaton = automaton
+        self.max_matches = max_matches
+        self.matches: List[Tuple[int, Any]] = []
+        self._state = 0
+
+    @property
+    def is_complete(self) -> bool:
+        """Whether the match limit has been reached"""
+        return self.max_matches is not None and len(self.matches) >= self.max_matches
+
+    def update(self, chunk: bytes, offset: int) -> None:
+        """Feed the next chunk of data, starting at the given file offset"""
+        if self.is_complete:
+            return
+
+        automaton = self.automaton
+        if automaton.case_insensitive:
+            chunk = chunk.lower()
+        goto, fail, output = automaton._goto, automaton._fail, automaton._output
+        root_skip = automaton._root_skip
+        # A prefix straddling the chunk end is invisible to the regex, so the
+        # last few bytes are always stepped through the automaton
+        skip_limit = len(chunk) - automaton._root_skip_length + 1
+        matches = self.matches
+
+        state = self._state
+        position = 0
+        length = len(chunk)
+        while position < length:
+            if state == 0 and root_skip is not None and position < skip_limit:
+                skip = root_skip.search(chunk, position)
+                position = skip.start() if skip is not None else skip_limit
+                if position >= length:
+                    break
+
+            byte = chunk[position]
+            while True:
+                next_state = goto[state].get(byte)
+                if next_state is not None:
+                    state = next_state
+                    break
+                if state == 0:
+                    break
+                state = fail[state]
+
+            found = output[state]
+            if found is not None:
+                end = offset + position + 1
+                for pattern_length, value in found:
+                    matches.append((end - pattern_length, value))
+                if self.is_complete:
+                    del matches[self.max_matches:]
+                    break
+            position += 1
+
+        self._state = state
+
+    def finish(self) -> List[Tuple[int, Any]]:
+        """Return all matches found so far"""
+        return self.matches
+
+
+class PatternMatcher:
+    """Finds every occurrence of many byte patterns, chunk by chunk
+
+    Reports the same matches in the same order as AhoCorasickAutomaton, with
+    the per-position work done in NumPy. Each pattern is found through an
+    anchor: the window of ANCHOR_LENGTH bytes (PREFIX_LENGTH for shorter
+    patterns) holding its most varied bytes, so runs such as zero padding in
+    a pattern rarely decide where it is looked for. Every position's next
+    PREFIX_LENGTH bytes are hashed into a filter of the anchors' leading
+    bytes, the positions that pass are looked up by their whole anchor, and
+    the (position, pattern) pairs left are compared a uint32 word at a time,
+    each dropped at its first mismatch. Patterns shorter than the prefix go
+    to an AhoCorasickAutomaton, which is fast for the handful there can be.
+    """
+
+    def __init__(self, case_insensitive: bool = False):
+        self.case_insensitive = case_insensitive
+        self.pattern_count = 0
+        self._short = AhoCorasickAutomaton()
+        self._patterns: Dict[bytes, List[Any]] = {}  # Pattern -> values, until compiled
+        self._values: List[Tuple[Any, ...]] = []  # By pattern index
+        self._lengths = np.zeros(0, dtype=np.int64)
+        self._anchor_offsets = np.zeros(0, dtype=np.int64)
+        # Every pattern's uint32 words at offsets 0, 4, ... and finally length - 4
+        self._words = np.zeros(0, dtype=np.uint32)
+        self._word_starts = np.zeros(0, dtype=np.int64)
+        self._word_counts = np.zeros(0, dtype=np.int64)
+        # Sorted anchors and the range of pattern indexes sharing each, for
+        # PREFIX_LENGTH and ANCHOR_LENGTH anchors
+        self._short_anchors = np.zeros(0, dtype=np.uint32)
+        self._short_groups = np.zeros(1, dtype=np.int64)
+        self._long_anchors = np.zeros(0, dtype=np.uint64)
+        self._long_groups = np.zeros(1, dtype=np.int64)
+        self._prefix_filter: Optional[np.ndarray] = None
+        self._hash_shift = np.uint32(0)
+        self._max_pattern_length = 0
+        self._compiled = False
+
+    def add_pattern(self, pattern: bytes, value: Any) -> None:
+        """Add a pattern; value is reported back for every match"""
+        if not pattern:
+            raise ValueError("Cannot add an empty pattern")
+        if self._compiled:
+            raise ValueError("Cannot add patterns to a compiled matcher")
+        if self.case_insensitive:
+            pattern = pattern.lower()
+
+        if len(pattern) < PREFIX_LENGTH:
+            self._short.add_pattern(pattern, (len(pattern), value))
+        else:
+            self._patterns.setdefault(pattern, []).append(value)
+        self.pattern_count += 1
+
+    def compile(self) -> 'PatternMatcher':
+        """Build the anchor filter and tables; no patterns may be added afterwards"""
+        anchors = {pattern: _choose_anchor(pattern) for pattern in self._patterns}
+        # Grouped by anchor: short anchors first
+        patterns = sorted(self._patterns, key=lambda pattern: anchors[pattern][1:])
+        self._values = [tuple(self._patterns[pattern]) for pattern in patterns]
+        self._patterns = {}
+        self._lengths = np.array([len(pattern) for pattern in patterns], dtype=np.int64)
+        self._anchor_offsets = np.array([anchors[pattern][0] for pattern in patterns], dtype=np.int64)
+        self._max_pattern_length = int(self._lengths.max()) if patterns else 0
+
+        self._word_counts = (self._lengths + 3) // 4
+        self._word_starts = np.zeros(len(patterns), dtype=np.int64)
+        np.cumsum(self._word_counts[:-1], out=self._word_starts[1:])
+        words = bytearray()
+        for pattern in patterns:
+            words += pattern[:len(pattern) - len(pattern) % 4]
+            if len(pattern) % 4:
+                words += pattern[-4:]
+        self._words = np.frombuffer(bytes(words), dtype='<u4').astype(np.uint32)
+
+        short_count = sum(1 for pattern in patterns if not anchors[pattern][1])
+        self._short_anchors, self._short_groups = _group_anchors(
+            [anchors[pattern][2] for pattern in patterns[:short_count]], 0, np.uint32)
+        self._long_anchors, self._long_groups = _group_anchors(
+            [anchors[pattern][2] for pattern in patterns[short_count:]], short_count, np.uint64)
+
+        if patterns:
+            leading = np.unique(np.array([key & 0xFFFFFFFF for _, _, key in anchors.values()], dtype=np.uint32))
+            bits = (len(leading) * PREFIX_FILTER_SLOTS_PER_PREFIX - 1).bit_length()
+            bits = min(max(bits, MIN_PREFIX_FILTER_BITS), MAX_PREFIX_FILTER_BITS)
+            self._hash_shift = np.uint32(32 - bits)
+            self._prefix_filter = np.zeros(1 << bits, dtype=bool)
+            self._prefix_filter[(leading * PREFIX_HASH_MULTIPLIER) >> self._hash_shift] = True
+
+        self._short = self._short.compile() if self._short.pattern_count else None
+        self._compiled = True
+        logger.debug(f"Compiled matcher with {self.pattern_count} patterns, "
+                     f"{len(self._short_anchors) + len(self._long_anchors)} distinct anchors")
+        return self
+
+    def _find(self, data: bytes, start: int, end: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the start offsets and pattern indexes of patterns anchored in data[start:end]
+
+        end may be at most len(data) - PREFIX_LENGTH + 1; patterns running
+        past either end of data are not reported.
+        """
+        windows = np.ndarray((len(data) - PREFIX_LENGTH + 1,), dtype='<u4', buffer=data, strides=(1,))
+        hashes = windows[start:end] * PREFIX_HASH_MULTIPLIER
+        hashes >>= self._hash_shift
+        candidates = np.flatnonzero(self._prefix_filter.take(hashes, mode='clip')) + start
+
+        found = [(candidates[:0], candidates[:0])]
+        if len(candidates) and len(self._short_anchors):
+            groups = _lookup(self._short_anchors, windows[candidates])
+            found.append(self._verify(windows, len(data), candidates[groups >= 0], groups[groups >= 0],
+                                      self._short_groups))
+        if len(candidates) and len(self._long_anchors):
+            # Long anchors are two words; positions too close to the end cannot hold one
+            candidates = candidates[candidates + ANCHOR_LENGTH <= len(data)]
+            keys = windows[candidates].astype(np.uint64)
+            keys |= windows[candidates + PREFIX_LENGTH].astype(np.uint64) << np.uint64(32)
+            groups = _lookup(self._long_anchors, keys)
+            found.append(self._verify(windows, len(data), candidates[groups >= 0], groups[groups >= 0],
+                                      self._long_groups))
+        starts, indexes = zip(*found)
+        return np.concatenate(starts), np.concatenate(indexes)
+
+    def _verify(self, windows: np.ndarray, size: int, positions: np.ndarray, groups: np.ndarray,
+                bounds: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Compare every pattern of each anchor position's group with the data, word by word"""
+        matched_starts, matched_indexes = [positions[:0]], [positions[:0]]
+        counts = bounds[groups + 1] - bounds[groups]
+        totals = np.cumsum(counts)
+        # Positions are expanded into (start, pattern) pairs a bounded batch at a time
+        batch_start = 0
+        while batch_start < len(positions):
+            done = int(totals[batch_start - 1]) if batch_start else 0
+            batch_end = max(int(np.searchsorted(totals, done + MAX_CANDIDATE_PAIRS, side='right')),
+                            batch_start + 1)
+            batch_counts = counts[batch_start:batch_end]
+            first = bounds[groups[batch_start:batch_end]] - (totals[batch_start:batch_end] - batch_counts)
+            indexes = np.repeat(first, batch_counts) + np.arange(done, totals[batch_end - 1], dtype=np.int64)
+            starts = np.repeat(positions[batch_start:batch_end], batch_counts) - self._anchor_offsets[indexes]
+            batch_start = batch_end
+
+            lengths = self._lengths[indexes]
+            inside = (starts >= 0) & (starts + lengths <= size)
+            starts, indexes, lengths = starts[inside], indexes[inside], lengths[inside]
+            word = 0
+            while len(indexes):
+                complete = self._word_counts[indexes] <= word
+                matched_starts.append(starts[complete])
+                matched_indexes.append(indexes[complete])
+                pending = ~complete
+                starts, indexes, lengths = starts[pending], indexes[pending], lengths[pending]
+                offsets = np.minimum(word * 4, lengths - 4)
+                same = windows[starts + offsets] == self._words[self._word_starts[indexes] + word]
+                starts, indexes, lengths = starts[same], indexes[same], lengths[same]
+                word += 1
+
+        return np.concatenate(matched_starts), np.concatenate(matched_indexes)
+
+    def search(self, data: bytes, max_matches: Optional[int] = None) -> List[Tuple[int, Any]]:
+        """Find all (offset, value) matches in a single buffer"""
+        stream = self.stream(max_matches)
+        stream.update(data, 0)
+        return stream.finish()
+
+    def stream(self, max_matches: Optional[int] = None) -> 'PatternMatcherStream':
+        """Create matching state that can be fed a file chunk by chunk"""
+        if not self._compiled:
+            raise ValueError("Matcher must be compiled before matching")
+        return PatternMatcherStream(self, max_matches)
+
+
+def _choose_anchor(pattern: bytes) -> Tuple[int, bool, int]:
+    """Pick the (offset, is long, little-endian key) of the window with a pattern's most varied bytes"""
+    length = ANCHOR_LENGTH if len(pattern) >= ANCHOR_LENGTH else PREFIX_LENGTH
+
+    def variety(offset: int) -> Tuple[int, int]:
+        window = pattern[offset:offset + length]
+        return len(set(window)), -max(window.count(byte) for byte in COMMON_BYTES)
+
+    offset = max(range(len(pattern) - length + 1), key=variety)
+    return offset, length == ANCHOR_LENGTH, int.from_bytes(pattern[offset:offset + length], 'little')
+
+
+def _group_anchors(keys: List[int], first: int, dtype: type) -> Tuple[np.ndarray, np.ndarray]:
+    """Get the distinct sorted anchors and where each one's patterns start, then the end"""
+    unique, starts = np.unique(np.array(keys, dtype=dtype), return_index=True)
+    return unique, np.append(starts, len(keys)).astype(np.int64) + first
+
+
+def _lookup(keys: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Get the index of every value in the sorted keys, or -1 where it is missing"""
+    index = np.searchsorted(keys, values)
+    index[index == len(keys)] = 0
+    index[keys[index] != values] = -1
+    return index
+
+
+class PatternMatcherStream(ChunkConsumer):
+    """Per-file matching state; matches spanning chunk boundaries are still found"""
+
+    def __init__(self, matcher: PatternMatcher, max_matches: Optional[int] = None):
+        self.matcher = matcher
+        self.max_matches = max_matches
+        self.matches: List[Tuple[int, Any]] = []
+        self._short = matcher._short.stream(max_matches) if matcher._short is not None else None
+        self._tail = b''  # Last bytes of the data so far, where a match may begin
+
+    @property
+    def is_complete(self) -> bool:
+        """Whether the match limit has been reached"""
+        return self.max_matches is not None and len(self.matches) >= self.max_matches
+
+    def update(self, chunk: bytes, offset: int) -> None:
+        """Feed the next chunk of data, starting at the given file offset"""
+        if self.is_complete:
+            return
+
+        matcher = self.matcher
+        if matcher.case_insensitive:
+            chunk = chunk.lower()
+        # End offsets, lengths and pattern indexes of the matches ending in this
+        # chunk; automaton matches are indexed from the end of the pattern list
+        ends: List[np.ndarray] = []
+        lengths: List[np.ndarray] = []
+        indexes: List[np.ndarray] = []
+        short_values: List[Any] = []
+
+        if self._short is not None:
+            seen = len(self._short.matches)
+            self._short.update(chunk, offset)
+            short = self._short.matches[seen:]
+            short_values = [value for _, (_, value) in short]
+            lengths.append(np.array([length for _, (length, _) in short], dtype=np.int64))
+            ends.append(np.array([start for start, _ in short], dtype=np.int64) + lengths[-1])
+            indexes.append(np.arange(len(short), dtype=np.int64) + len(matcher._values))
+
+        if matcher._prefix_filter is not None:
+            needed = None if self.max_matches is None else self.max_matches - len(self.matches)
+            tail = self._tail
+            if tail:
+                # Matches starting in earlier data and ending in this chunk; the
+                # chunk itself is not copied
+                boundary = tail + bytes(chunk[:matcher._max_pattern_length - 1])
+                if len(boundary) >= PREFIX_LENGTH:
+                    starts, found = matcher._find(boundary, 0, len(boundary) - PREFIX_LENGTH + 1)
+                    found_lengths = matcher._lengths[found]
+                    keep = (starts < len(tail)) & (starts + found_lengths > len(tail))
+                    ends.append(starts[keep] + found_lengths[keep] + (offset - len(tail)))
+                    lengths.append(found_lengths[keep])
+                    indexes.append(found[keep])
+
+            last = len(chunk) - PREFIX_LENGTH + 1
+            for start in range(0, max(last, 0), MATCH_BLOCK_SIZE):
+                starts, found = matcher._find(chunk, start, min(start + MATCH_BLOCK_SIZE, last))
+                found_lengths = matcher._lengths[found]
+                ends.append(starts + found_lengths + offset)
+                lengths.append(found_lengths)
+                indexes.append(found)
+                # Matches anchored in later blocks end after the next block starts
+                bound = offset + start + MATCH_BLOCK_SIZE + PREFIX_LENGTH
+                if needed is not None and sum(int((block < bound).sum()) for block in ends) >= needed:
+                    break
+            keep = matcher._max_pattern_length - 1
+            self._tail = (tail + bytes(chunk[-keep:]))[-keep:]
+
+        if not ends:
+            return
+        ends, lengths, indexes = np.concatenate(ends), np.concatenate(lengths), np.concatenate(indexes)
+        # Automaton order: by end offset, longer patterns first
+        order = np.lexsort((-lengths, ends))
+        if self.max_matches is not None:
+            order = order[:self.max_matches - len(self.matches)]
+        matches = self.matches
+        pattern_count = len(matcher._values)
+        for end, length, index in zip(ends[order].tolist(), lengths[order].tolist(), indexes[order].tolist()):
+            if index < pattern_count:
+                matches.extend((end - length, value) for value in matcher._values[index])
+            else:
+                matches.append((end - length, short_values[index - pattern_count]))
+        if self.is_complete:
+            del matches[self.max_matches:]
+
+    def finish(self) -> List[Tuple[int, Any]]:
+        """Return all matches found so far"""
+        return self.matches
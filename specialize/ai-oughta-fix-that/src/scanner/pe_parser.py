@@ -0,0 +1,334 @@
+"""
+PE Parser Module
+Lazy, zero-copy parsing of Portable Executable headers, sections and imports
+"""
+
+import hashlib
+import mmap
+import struct
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+import logging
+
+import numpy as np
+
+from base_scanner import BaseScannerError
+from entropy import shannon_entropy
+
+logger = logging.getLogger(__name__)
+
+DOS_MAGIC = b'MZ'
+PE_SIGNATURE = b'PE\0\0'
+OPTIONAL_HEADER_MAGIC_PE32 = 0x10B
+OPTIONAL_HEADER_MAGIC_PE32_PLUS = 0x20B
+
+# e_lfanew: offset of the PE signature
+DOS_HEADER_LFANEW = struct.Struct('<I')
+DOS_HEADER_LFANEW_OFFSET = 0x3C
+# machine, section count, timestamp, symbol table, symbol count, optional header size, characteristics
+FILE_HEADER = struct.Struct('<HHIIIHH')
+# name, virtual size, virtual address, raw size, raw offset, (relocation/line number fields), characteristics
+SECTION_HEADER = struct.Struct('<8sIIII12xI')
+# original first thunk, timestamp, forwarder chain, name, first thunk
+IMPORT_DESCRIPTOR = struct.Struct('<IIIII')
+DATA_DIRECTORY = struct.Struct('<II')
+DATA_DIRECTORY_IMPORT = 1
+
+SECTION_EXECUTE = 0x20000000
+SECTION_WRITE = 0x80000000
+
+# Bounds that keep malformed or hostile files from making parsing expensive
+MAX_SECTIONS = 96  # The Windows loader limit
+MAX_IMPORTED_DLLS = 1024
+MAX_IMPORTED_FUNCTIONS = 16384
+MAX_NAME_LENGTH = 256
+SECTION_CHUNK_SIZE = 1024 * 1024  # Section bytes histogrammed at a time
+
+Buffer = Union[bytes, bytearray, memoryview, mmap.mmap]
+
+
+class PEFormatError(BaseScannerError):
+    """Raised when a file is not a well-formed PE image"""
+    pass
+
+
+class PESection:
+    """One entry of the section table"""
+
+    __slots__ = ('name', 'virtual_size', 'virtual_address', 'raw_size', 'raw_offset', 'characteristics')
+
+    def __init__(self, name: str, virtual_size: int, virtual_address: int,
+                 raw_size: int, raw_offset: int, characteristics: int):
+        self.name = name
+        self.virtual_size = virtual_size
+        self.virtual_address = virtual_address
+        self.raw_size = raw_size
+        self.raw_offset = raw_offset
+        self.characteristics = characteristics
+
+    @property
+    def is_executable(self) -> bool:
+        return bool(self.characteristics & SECTION_EXECUTE)
+
+    @property
+    def is_writable(self) -> bool:
+        return bool(self.characteristics & SECTION_WRITE)
+
+    def contains_rva(self, rva: int) -> bool:
+        """Whether a relative virtual address falls inside this section"""
+        return self.virtual_address <= rva < self.virtual_address + max(self.virtual_size, self.raw_size)
+
+
+class PEFile:
+    """Parses a PE image in place over a buffer or a memory-mapped file
+
+    Only the headers are read up front; the section table, imports and
+    section bodies are decoded on first access. Section data is exposed as
+    memoryview slices of the underlying buffer, so nothing is copied.
+    """
+
+    def __init__(self, data: Buffer):
+        self._map: Optional[mmap.mmap] = data if isinstance(data, mmap.mmap) else None
+        self._view = memoryview(data)
+        self.size = len(self._view)
+        self._sections: Optional[List[PESection]] = None
+        self._imports: Optional[Dict[str, List[str]]] = None
+        try:
+            self._parse_headers()
+        except Exception:
+            # A live view would keep the caller from closing its buffer or mapping
+            self._view.release()
+            raise
+
+    @classmethod
+    def open(cls, file_path: Path) -> 'PEFile':
+        """Map a file read-only and parse it; close() releases the mapping"""
+        with open(file_path, 'rb') as f:
+            try:
+                mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                raise PEFormatError(f"Empty file: {file_path}")
+        try:
+            return cls(mapping)
+        except Exception:
+            mapping.close()
+            raise
+
+    def __enter__(self) -> 'PEFile':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Release the buffer and any mapping this parser opened"""
+        self._view.release()
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def _unpack(self, structure: struct.Struct, offset: int) -> tuple:
+        if offset < 0 or offset + structure.size > self.size:
+            raise PEFormatError(f"Truncated structure at offset {offset}")
+        return structure.unpack_from(self._view, offset)
+
+    def _parse_headers(self) -> None:
+        if self._view[:2] != DOS_MAGIC:
+            raise PEFormatError("Missing DOS header")
+        self.pe_offset, = self._unpack(DOS_HEADER_LFANEW, DOS_HEADER_LFANEW_OFFSET)
+        if self._view[self.pe_offset:self.pe_offset + 4] != PE_SIGNATURE:
+            raise PEFormatError("Missing PE signature")
+
+        (self.machine, self.section_count, self.timestamp, _, _,
+         optional_header_size, self.characteristics) = self._unpack(FILE_HEADER, self.pe_offset + 4)
+        self.optional_header_offset = self.pe_offset + 4 + FILE_HEADER.size
+        self.section_table_offset = self.optional_header_offset + optional_header_size
+
+        self.optional_header_magic = 0
+        self.entry_point = 0
+        self.size_of_headers = 0
+        self._data_directories_offset = 0
+        self._data_directory_count = 0
+        if optional_header_size >= 2:
+            self.optional_header_magic, = self._unpack(struct.Struct('<H'), self.optional_header_offset)
+            self.entry_point, = self._unpack(struct.Struct('<I'), self.optional_header_offset + 16)
+            self.size_of_headers, = self._unpack(struct.Struct('<I'), self.optional_header_offset + 60)
+            # The data directories follow the fixed part, whose size depends on the format
+            directories_at = 92 if self.optional_header_magic == OPTIONAL_HEADER_MAGIC_PE32 else 108
+            if optional_header_size >= directories_at + 4:
+                self._data_directory_count, = self._unpack(
+                    struct.Struct('<I'), self.optional_header_offset + directories_at
+                )
+                self._data_directories_offset = self.optional_header_offset + directories_at + 4
+
+    @property
+    def is_64bit(self) -> bool:
+        return self.optional_header_magic == OPTIONAL_HEADER_MAGIC_PE32_PLUS
+
+    @property
+    def sections(self) -> List[PESection]:
+        """The section table, decoded on first access"""
+        if self._sections is None:
+            sections = []
+            for index in range(min(self.section_count, MAX_SECTIONS)):
+                offset = self.section_table_offset + index * SECTION_HEADER.size
+                if offset + SECTION_HEADER.size > self.size:
+                    break
+                name, virtual_size, virtual_address, raw_size, raw_offset, characteristics = \
+                    SECTION_HEADER.unpack_from(self._view, offset)
+                sections.append(PESection(
+                    name.rstrip(b'\0').decode('latin-1'), virtual_size, virtual_address,
+                    raw_size, raw_offset, characteristics
+                ))
+            self._sections = sections
+        return self._sections
+
+    @property
+    def is_truncated(self) -> bool:
+        """Whether the section table or any section's raw data runs past the end of the file"""
+        if len(self.sections) < min(self.section_count, MAX_SECTIONS):
+            return True
+        return any(s.raw_offset + s.raw_size > self.size for s in self.sections if s.raw_size)
+
+    def section_data(self, section: PESection) -> memoryview:
+        """The raw bytes of a section as a view into the buffer, clipped to the file"""
+        start = min(section.raw_offset, self.size)
+        return self._view[start:min(section.raw_offset + section.raw_size, self.size)]
+
+    def section_entropy(self, section: PESection) -> float:
+        """Shannon entropy of a section's raw bytes, computed without copying them
+
+        The section is histogrammed a chunk at a time and mapped pages are
+        released behind the scan, so memory use is bounded for any section size.
+        """
+        data = self.section_data(section)
+        histogram = np.zeros(256, dtype=np.int64)
+        start = min(section.raw_offset, self.size)
+        for position in range(0, len(data), SECTION_CHUNK_SIZE):
+            chunk = data[position:position + SECTION_CHUNK_SIZE]
+            histogram += np.bincount(np.frombuffer(chunk, dtype=np.uint8), minlength=256)
+            self._release_pages(start + position, start + position + len(chunk))
+        return shannon_entropy(histogram)
+
+    def _release_pages(self, start: int, end: int) -> None:
+        """Drop mapped file pages in [start, end) from this process's resident set"""
+        if self._map is None or not hasattr(mmap, 'MADV_DONTNEED'):
+            return
+        start -= start % mmap.PAGESIZE
+        try:
+            self._map.madvise(mmap.MADV_DONTNEED, start, end - start)
+        except (OSError, ValueError):
+            pass
+
+    @property
+    def overlay_offset(self) -> int:
+        """Offset of data appended after the last section, or the file size if there is none"""
+        end = max((s.raw_offset + s.raw_size for s in self.sections if s.raw_size),
+                  default=self.size_of_headers)
+        return min(end, self.size)
+
+    @property
+    def overlay_size(self) -> int:
+        return self.size - self.overlay_offset
+
+    def entry_point_section(self) -> Optional[PESection]:
+        """The section containing the entry point, if any"""
+        for section in self.sections:
+            if section.contains_rva(self.entry_point):
+                return section
+        return None
+
+    def rva_to_offset(self, rva: int) -> Optional[int]:
+        """Translate a relative virtual address to a file offset"""
+        if rva < self.size_of_headers:
+            return rva
+        for section in self.sections:
+            if section.contains_rva(rva):
+                offset = rva - section.virtual_address + section.raw_offset
+                return offset if offset < self.size else None
+        return None
+
+    def _data_directory(self, index: int) -> Optional[tuple]:
+        if index >= self._data_directory_count or not self._data_directories_offset:
+            return None
+        rva, size = self._unpack(DATA_DIRECTORY, self._data_directories_offset + index * DATA_DIRECTORY.size)
+        return (rva, size) if rva else None
+
+    def _read_name(self, offset: Optional[int]) -> Optional[str]:
+        if offset is None or offset >= self.size:
+            return None
+        raw = self._view[offset:offset + MAX_NAME_LENGTH].tobytes()
+        return raw.split(b'\0', 1)[0].decode('latin-1')
+
+    @property
+    def imports(self) -> Dict[str, List[str]]:
+        """Imported function names by DLL (ordinal imports as '#<ordinal>'), decoded on first access"""
+        if self._imports is None:
+            self._imports = {}
+            try:
+                self._parse_imports()
+            except PEFormatError as e:
+                logger.debug(f"Malformed import table: {str(e)}")
+        return self._imports
+
+    def _parse_imports(self) -> None:
+        directory = self._data_directory(DATA_DIRECTORY_IMPORT)
+        offset = self.rva_to_offset(directory[0]) if directory else None
+        if offset is None:
+            return
+
+        thunk = struct.Struct('<Q' if self.is_64bit else '<I')
+        ordinal_flag = 1 << (thunk.size * 8 - 1)
+        function_count = 0
+        for _ in range(MAX_IMPORTED_DLLS):
+            lookup_rva, _, _, name_rva, address_rva = self._unpack(IMPORT_DESCRIPTOR, offset)
+            if not name_rva and not address_rva:
+                break
+            offset += IMPORT_DESCRIPTOR.size
+            dll = self._read_name(self.rva_to_offset(name_rva))
+            if not dll:
+                continue
+            functions = self._imports.setdefault(dll.lower(), [])
+
+            thunk_offset = self.rva_to_offset(lookup_rva or address_rva)
+            while thunk_offset is not None and function_count < MAX_IMPORTED_FUNCTIONS:
+                entry, = self._unpack(thunk, thunk_offset)
+                if not entry:
+                    break
+                thunk_offset += thunk.size
+                function_count += 1
+                if entry & ordinal_flag:
+                    functions.append(f"#{entry & 0xFFFF}")
+                else:
+                    # Skip the two-byte hint in front of the name
+                    name_offset = self.rva_to_offset(entry & 0x7FFFFFFF)
+                    name = self._read_name(name_offset + 2 if name_offset is not None else None)
+                    if name:
+                        functions.append(name)
+
+    def imphash(self) -> Optional[str]:
+        """MD5 of the import table in the conventional 'library.function' form; None without imports"""
+        entries = []
+        for dll, functions in self.imports.items():
+            library = dll.rsplit('.', 1)[0] if dll.rsplit('.', 1)[-1] in ('dll', 'ocx', 'sys') else dll
+            for function in functions:
+                name = f"ord{function[1:]}" if function.startswith('#') else function
+                entries.append(f"{library}.{name.lower()}")
+        if not entries:
+            return None
+        return hashlib.md5(','.join(entries).encode('latin-1')).hexdigest()
+
+    def get_summary(self) -> Dict[str, Any]:
+        """Describe the headers and sections in dictionary format"""
+        return {
+            'machine': self.machine,
+            'is_64bit': self.is_64bit,
+            'section_count': self.section_count,
+            'entry_point': self.entry_point,
+            'overlay_size': self.overlay_size,
+            'sections': [
+                {'name': s.name, 'virtual_address': s.virtual_address, 'raw_size': s.raw_size,
+                 'characteristics': s.characteristics}
+                for s in self.sections
+            ]
+        }
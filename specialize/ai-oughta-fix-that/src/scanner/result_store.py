@@ -0,0 +1,181 @@
+"""
+Result Store Module
+Columnar, append-only storage for large numbers of scan results
+"""
+
+from array import array
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import logging
+
+from base_scanner import ScanResult
+
+logger = logging.getLogger(__name__)
+
+# Which result details are retained
+DETAILS_ALL = 'all'
+DETAILS_THREATS = 'threats'
+DETAILS_NONE = 'none'
+DETAILS_MODES = (DETAILS_ALL, DETAILS_THREATS, DETAILS_NONE)
+
+# Verdict bitfield flags
+FLAG_THREAT_DETECTED = 0x01
+FLAG_HAS_DETAILS = 0x02  # Details were retained for this result
+
+NO_THREAT_TYPE = 0  # Threat type code of results without a threat type
+
+
+class ResultStore:
+    """Stores scan results as typed arrays rather than one object per file
+
+    Paths are split into an interned directory table and a packed UTF-8 name
+    buffer, verdicts are bitfields, confidences are float32 and threat types
+    are codes into a table. ScanResult objects and dictionaries are only
+    materialized when a result is read back.
+    """
+
+    def __init__(self, keep_details: str = DETAILS_THREATS):
+        if keep_details not in DETAILS_MODES:
+            raise ValueError(f"Unknown details mode: {keep_details}")
+        self.keep_details = keep_details
+        self._directories: List[str] = []
+        self._directory_codes: Dict[str, int] = {}
+        self._path_directories = array('I')
+        self._names = bytearray()
+        self._name_offsets = array('Q', [0])
+        self._flags = array('B')
+        self._confidences = array('f')
+        self._threat_types: List[Optional[str]] = [None]
+        self._threat_type_codes: Dict[str, int] = {}
+        self._threat_codes = array('I')
+        # Definitions generation IDs, coded like threat types; a scan sees very few
+        self._generations: List[Optional[str]] = [None]
+        self._generation_codes: Dict[str, int] = {}
+        self._generation_column = array('I')
+        # Sparse columns, keyed by result index
+        self._details: Dict[int, Dict[str, Any]] = {}
+        self._timestamps: Dict[int, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self._flags)
+
+    def append(self, result: ScanResult) -> int:
+        """Add a result and return its index"""
+        index = len(self._flags)
+        directory, name = os.path.split(result.file_path)
+
+        directory_code = self._directory_codes.get(directory)
+        if directory_code is None:
+            directory_code = self._directory_codes[directory] = len(self._directories)
+            self._directories.append(directory)
+        self._path_directories.append(directory_code)
+        self._names += name.encode('utf-8', 'surrogateescape')
+        self._name_offsets.append(len(self._names))
+
+        flags = FLAG_THREAT_DETECTED if result.threat_detected else 0
+        if result.details and (self.keep_details == DETAILS_ALL or
+                               (self.keep_details == DETAILS_THREATS and result.threat_detected)):
+            flags |= FLAG_HAS_DETAILS
+            self._details[index] = result.details
+        self._flags.append(flags)
+        self._confidences.append(result.confidence)
+        self._threat_codes.append(self._threat_type_code(result.threat_type))
+        self._generation_column.append(self._generation_code(result.generation))
+        if result.timestamp is not None:
+            self._timestamps[index] = result.timestamp
+        return index
+
+    def extend(self, results: Iterable[ScanResult]) -> int:
+        """Add every result from an iterable and return how many were added"""
+        count = 0
+        for result in results:
+            self.append(result)
+            count += 1
+        return count
+
+    def _threat_type_code(self, threat_type: Optional[str]) -> int:
+        if threat_type is None:
+            return NO_THREAT_TYPE
+        code = self._threat_type_codes.get(threat_type)
+        if code is None:
+            code = self._threat_type_codes[threat_type] = len(self._threat_types)
+            self._threat_types.append(threat_type)
+        return code
+
+    def _generation_code(self, generation: Optional[str]) -> int:
+        if generation is None:
+            return 0
+        code = self._generation_codes.get(generation)
+        if code is None:
+            code = self._generation_codes[generation] = len(self._generations)
+            self._generations.append(generation)
+        return code
+
+    def file_path(self, index: int) -> str:
+        """Get the path of a stored result"""
+        name = self._names[self._name_offsets[index]:self._name_offsets[index + 1]]
+        return os.path.join(self._directories[self._path_directories[index]],
+                            name.decode('utf-8', 'surrogateescape'))
+
+    def is_threat(self, index: int) -> bool:
+        """Whether a stored result is a detection"""
+        return bool(self._flags[index] & FLAG_THREAT_DETECTED)
+
+    def __getitem__(self, index: int) -> ScanResult:
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("Result index out of range")
+        result = ScanResult(
+            file_path=self.file_path(index),
+            threat_detected=self.is_threat(index),
+            threat_type=self._threat_types[self._threat_codes[index]],
+            confidence=self._confidences[index],
+            details=self._details.get(index)
+        )
+        result.timestamp = self._timestamps.get(index)
+        result.generation = self._generations[self._generation_column[index]]
+        return result
+
+    def __iter__(self) -> Iterator[ScanResult]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def to_dict(self, index: int) -> Dict[str, Any]:
+        """Materialize the dictionary format of one stored result"""
+        return self[index].to_dict()
+
+    def iter_threats(self) -> Iterator[ScanResult]:
+        """Yield only the results that are detections"""
+        for index, flags in enumerate(self._flags):
+            if flags & FLAG_THREAT_DETECTED:
+                yield self[index]
+
+    @property
+    def threat_count(self) -> int:
+        """Number of stored detections"""
+        return sum(flags & FLAG_THREAT_DETECTED for flags in self._flags)
+
+    def get_threat_type_counts(self) -> Dict[str, int]:
+        """Count detections per threat type"""
+        counts = [0] * len(self._threat_types)
+        for code in self._threat_codes:
+            counts[code] += 1
+        return {threat_type: counts[code] for code, threat_type in enumerate(self._threat_types)
+                if threat_type is not None and counts[code]}
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get result counts and the approximate memory used by the columns"""
+        column_bytes = sum(
+            column.itemsize * len(column) for column in
+            (self._path_directories, self._name_offsets, self._flags,
+             self._confidences, self._threat_codes, self._generation_column)
+        ) + len(self._names)
+        return {
+            'results': len(self),
+            'threats': self.threat_count,
+            'directories': len(self._directories),
+            'threat_types': len(self._threat_types) - 1,
+            'retained_details': len(self._details),
+            'column_bytes': column_bytes
+        }
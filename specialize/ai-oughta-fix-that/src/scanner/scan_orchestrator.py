@@ -0,0 +1,215 @@
+"""
+Scan Orchestrator Module
+Runs several scanner engines over a single walk and a single read of every file
+"""
+
+import hashlib
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+import logging
+
+from base_scanner import BaseScanner, ScanResult, BaseScannerError
+from file_features import FileFeatureExtractor, FileFeatures, DEFAULT_CHUNK_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class ScanOrchestratorError(BaseScannerError):
+    """Exception specific to scan orchestration"""
+    pass
+
+
+class ScanOrchestrator(BaseScanner):
+    """Scanner that combines the verdicts of several engines into one result per file
+
+    Every engine must expose a feature_extractor and a _scan_features method.
+    Their extractors are merged so each file is read once, and every engine's
+    hashes and chunk consumers run over that whole read. Engines then evaluate
+    their rules in registration order: once an engine returns a definitive
+    detection (e.g. a hash signature match, known only once the whole file
+    has been hashed) the remaining engines' rule evaluation is skipped, such
+    as the heuristic PE structure analysis. The shared read itself is never
+    cut short, so exact engines should be registered first only to save that
+    evaluation.
+    """
+
+    error_class = ScanOrchestratorError
+
+    def __init__(self, config: Optional[Dict[str, Any]] = None,
+                 engines: Optional[List[BaseScanner]] = None):
+        super().__init__("ScanOrchestrator", config)
+        self.engines: List[BaseScanner] = []
+        self.feature_extractor = FileFeatureExtractor.combine(
+            [], chunk_size=self.config.get('chunk_size', DEFAULT_CHUNK_SIZE),
+            memory_limit=self.config.get('max_scan_memory')
+        )
+        for engine in engines or []:
+            self.register_engine(engine)
+
+    def register_engine(self, engine: BaseScanner) -> None:
+        """Add an engine; it runs after every engine registered before it"""
+        if not hasattr(engine, 'feature_extractor') or not hasattr(engine, '_scan_features'):
+            raise ScanOrchestratorError(f"Engine cannot scan shared features: {engine.name}")
+        if any(existing.name == engine.name for existing in self.engines):
+            raise ScanOrchestratorError(f"Engine already registered: {engine.name}")
+
+        engines = self.engines + [engine]
+        try:
+            self.feature_extractor = FileFeatureExtractor.combine(
+                [e.feature_extractor for e in engines],
+                chunk_size=self.config.get('chunk_size', DEFAULT_CHUNK_SIZE),
+                memory_limit=self.config.get('max_scan_memory')
+            )
+        except ValueError as e:
+            raise ScanOrchestratorError(f"Cannot register engine {engine.name}: {str(e)}")
+        self.engines = engines
+        logger.debug(f"Registered scan engine: {engine.name}")
+
+    def _initialize(self) -> None:
+        """Initialize every registered engine"""
+        if not self.engines:
+            logger.warning("No scan engines registered")
+        for engine in self.engines:
+            if not engine.is_initialized:
+                engine.initialize()
+
+    def scan_file(self, file_path: Path, features: Optional[FileFeatures] = None) -> ScanResult:
+        """Scan a file with every engine from a single read of its contents"""
+        if not self.is_initialized:
+            raise ScanOrchestratorError("Scanner not initialized")
+
+        if features is None and not file_path.exists():
+            raise ScanOrchestratorError(f"File not found: {file_path}")
+
+        logger.debug(f"Scanning file with {len(self.engines)} engines: {file_path}")
+
+        try:
+            with self._pin_definitions():
+                cache_identity = None
+                archive = None
+                if features is None:
+                    cached, cache_identity = self._lookup_cached_verdict(file_path)
+                    if cached is not None:
+                        return cached
+                    features, archive = self._extract_features(file_path)
+                    # Copies of a file already scanned reuse its verdict
+                    duplicate = self._lookup_duplicate_verdict(file_path, features)
+                    if duplicate is not None:
+                        self._store_cached_verdict(cache_identity, duplicate)
+                        return duplicate
+
+                result = self._stamp_generation(self._scan_features(file_path, features))
+                if archive is not None:
+                    result = self._fold_archive_members(result, archive)
+                self._store_cached_verdict(cache_identity, result)
+                self._store_duplicate_verdict(features, result)
+                return result
+
+        except Exception as e:
+            logger.error(f"Error scanning file {file_path}: {str(e)}")
+            raise ScanOrchestratorError(f"Scan failed: {str(e)}")
+
+    def _scan_features(self, file_path: Path, features: FileFeatures) -> ScanResult:
+        """Run the engines' rules in order over shared features and merge their results
+
+        The features are complete; a definitive detection skips only the
+        rule evaluation of the engines after it.
+        """
+        results: List[Tuple[BaseScanner, ScanResult]] = []
+        errors: Dict[str, str] = {}
+        skipped: List[str] = []
+
+        for index, engine in enumerate(self.engines):
+            try:
+                result = engine._scan_features(file_path, features)
+            except Exception as e:
+                logger.error(f"{engine.name} failed on {file_path}: {str(e)}")
+                errors[engine.name] = str(e)
+                continue
+            results.append((engine, result))
+            if self._is_definitive(result):
+                skipped = [e.name for e in self.engines[index + 1:]]
+                break
+
+        if not results:
+            raise ScanOrchestratorError(f"Every engine failed: {errors}")
+        return self._merge_results(file_path, results, skipped, errors)
+
+    def _is_definitive(self, result: ScanResult) -> bool:
+        """Whether a detection is certain enough that later engines cannot change the verdict"""
+        return result.threat_detected and \
+            result.confidence >= self.config.get('definitive_confidence', 1.0)
+
+    def _merge_results(self, file_path: Path, results: List[Tuple[BaseScanner, ScanResult]],
+                       skipped: List[str], errors: Dict[str, str]) -> ScanResult:
+        """Merge per-engine results; the most confident detection decides the verdict"""
+        detections = [(engine, result) for engine, result in results if result.threat_detected]
+        if detections:
+            _, verdict = max(detections, key=lambda item: item[1].confidence)
+        else:
+            _, verdict = results[0]
+
+        details: Dict[str, Any] = {
+            'scan_type': 'combined',
+            'detected_by': [engine.name for engine, _ in detections],
+            'engines': {engine.name: result.details for engine, result in results}
+        }
+        if skipped:
+            details['skipped_engines'] = skipped
+        if errors:
+            details['engine_errors'] = errors
+
+        return ScanResult(
+            file_path=str(file_path),
+            threat_detected=verdict.threat_detected,
+            threat_type=verdict.threat_type,
+            confidence=verdict.confidence,
+            details=details
+        )
+
+    def update_definitions(self) -> bool:
+        """Update the definitions of every engine"""
+        previous_version = self.get_definitions_version()
+        success = all([engine.update_definitions() for engine in self.engines])
+        if self.get_definitions_version() != previous_version:
+            self._invalidate_cached_verdicts()
+        return success
+
+    def get_definitions_version(self) -> str:
+        """Get a digest of the engine order and every engine's definitions version"""
+        digest = hashlib.sha256()
+        for engine in self.engines:
+            digest.update(f"{engine.name}:{engine.get_definitions_version()};".encode('utf-8'))
+        digest.update(str(self.config.get('definitive_confidence', 1.0)).encode('ascii'))
+        return digest.hexdigest()[:16]
+
+    @contextmanager
+    def _pin_definitions(self) -> Iterator[None]:
+        """Pin every engine's definitions generation for the duration of a scan"""
+        with ExitStack() as stack:
+            for engine in self.engines:
+                stack.enter_context(engine._pin_definitions())
+            yield
+
+    def _take_worker_statistics(self) -> Dict[str, Any]:
+        """Get and reset every engine's measurements, by engine name"""
+        return {engine.name: engine._take_worker_statistics() for engine in self.engines}
+
+    def _merge_worker_statistics(self, statistics: Dict[str, Any]) -> None:
+        """Add each engine's measurements from a scan worker"""
+        for engine in self.engines:
+            if statistics.get(engine.name) is not None:
+                engine._merge_worker_statistics(statistics[engine.name])
+
+    def _cleanup(self) -> None:
+        """Clean up every registered engine"""
+        for engine in self.engines:
+            if engine.is_initialized:
+                engine.cleanup()
+
+    def get_scanner_info(self) -> Dict[str, Any]:
+        """Get information about the orchestrator and its engines"""
+        info = super().get_scanner_info()
+        info['engines'] = [engine.get_scanner_info() for engine in self.engines]
+        return info
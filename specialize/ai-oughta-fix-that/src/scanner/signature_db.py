@@ -0,0 +1,299 @@
+"""
+Signature Database Module
+Compact memory-mapped binary signature database with sorted digest tables
+
+Layout (little-endian):
+    header        magic, format version, content digest and section offsets
+    table index   one entry per hash algorithm: name, digest size, count, offset
+    records       fixed-width records of string table references; records for
+                  byte pattern and string signatures come first so they can be
+                  loaded without touching the hash records
+    digest tables per algorithm, sorted (digest, record index) pairs
+    string table  UTF-8 names and metadata, deduplicated
+    bloom filter  optional bit array over every digest, checked before the tables
+"""
+
+import hashlib
+import mmap
+import struct
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import logging
+
+from base_scanner import BaseScannerError
+from bloom_filter import BloomFilter, DEFAULT_FALSE_POSITIVE_RATE
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'AOFTSIGD'
+FORMAT_VERSION = 2
+
+# magic, version, table count, content digest, records offset, record count,
+# pattern record count, string table offset, string table size, bloom filter
+# offset, bloom filter bit count, bloom filter hash count, bloom filter false
+# positive rate
+HEADER = struct.Struct('<8sII16sQQQQQQQId')
+# algorithm name, digest size, entry count, table offset
+TABLE_ENTRY = struct.Struct('<16sIQQ')
+# signature type, then (offset, length) of name, pattern, threat level, description
+RECORD = struct.Struct('<B3x' + 'QI' * 4)
+RECORD_INDEX = struct.Struct('<I')
+
+SIGNATURE_TYPES = ('hash', 'byte_pattern', 'string', 'fuzzy')
+
+
+class SignatureDatabaseError(BaseScannerError):
+    """Raised when a signature database is missing, corrupt or unsupported"""
+    pass
+
+
+def is_signature_database(path: Path) -> bool:
+    """Check whether a file is in the binary signature database format"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+class SignatureDatabase:
+    """Read-only view over a memory-mapped signature database
+
+    Digest lookups binary-search the mapped tables directly, so opening a
+    database costs nearly nothing and resident memory does not grow with its
+    size; only pages touched by lookups are read from disk.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = None
+        self._map: Optional[mmap.mmap] = None
+        self._views: List[memoryview] = []
+        self.bloom: Optional[BloomFilter] = None
+        self.tables: Dict[str, Tuple[int, int, int]] = {}  # algo -> (digest size, count, offset)
+        self._open()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Mappings cannot be pickled; other processes map the same file again
+        return {'path': self.path}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__init__(state['path'])
+
+    def _open(self) -> None:
+        try:
+            self._file = open(self.path, 'rb')
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            self.close()
+            raise SignatureDatabaseError(f"Cannot open signature database {self.path}: {str(e)}")
+
+        if len(self._map) < HEADER.size:
+            self.close()
+            raise SignatureDatabaseError(f"Truncated signature database: {self.path}")
+        (magic, version, table_count, content_digest, self._records_offset, self.record_count,
+         self.pattern_record_count, self._strings_offset, self._strings_size,
+         bloom_offset, bloom_bit_count, bloom_hash_count, bloom_false_positive_rate) = \
+            HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise SignatureDatabaseError(f"Unsupported signature database format: {self.path}")
+        self.content_digest = content_digest.hex()
+
+        for index in range(table_count):
+            name, digest_size, count, offset = TABLE_ENTRY.unpack_from(
+                self._map, HEADER.size + index * TABLE_ENTRY.size
+            )
+            self.tables[name.rstrip(b'\0').decode('ascii')] = (digest_size, count, offset)
+
+        if bloom_bit_count:
+            # The filter's bits stay in the mapping; nothing is copied into memory
+            view = memoryview(self._map)
+            bits = view[bloom_offset:bloom_offset + (bloom_bit_count + 7) // 8]
+            self._views.extend((bits, view))
+            self.bloom = BloomFilter(bloom_bit_count, bloom_hash_count, bits=bits,
+                                     false_positive_rate=bloom_false_positive_rate)
+
+    @property
+    def hash_count(self) -> int:
+        """Number of hash signatures in the database"""
+        return self.record_count - self.pattern_record_count
+
+    def lookup(self, algorithm: str, digest: bytes) -> Optional[Dict[str, Any]]:
+        """Find the signature for a raw digest by binary search, if any"""
+        table = self.tables.get(algorithm)
+        if table is None:
+            return None
+        digest_size, count, offset = table
+        if len(digest) != digest_size:
+            return None
+        if self.bloom is not None and digest not in self.bloom:
+            return None
+
+        data = self._map
+        entry_size = digest_size + RECORD_INDEX.size
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            position = offset + middle * entry_size
+            candidate = data[position:position + digest_size]
+            if candidate < digest:
+                low = middle + 1
+            elif candidate > digest:
+                high = middle
+            else:
+                record_index, = RECORD_INDEX.unpack_from(data, position + digest_size)
+                return self._read_record(record_index, digest)
+        if self.bloom is not None:
+            self.bloom.false_positives += 1
+        return None
+
+    def iter_pattern_signatures(self) -> Iterator[Dict[str, Any]]:
+        """Yield the byte pattern and string signatures stored ahead of hash records"""
+        for record_index in range(self.pattern_record_count):
+            yield self._read_record(record_index)
+
+    def iter_signatures(self) -> Iterator[Dict[str, Any]]:
+        """Yield every signature in the database; hash patterns are rebuilt from the tables"""
+        yield from self.iter_pattern_signatures()
+        for digest_size, count, offset in self.tables.values():
+            entry_size = digest_size + RECORD_INDEX.size
+            for entry in range(count):
+                position = offset + entry * entry_size
+                record_index, = RECORD_INDEX.unpack_from(self._map, position + digest_size)
+                yield self._read_record(record_index, self._map[position:position + digest_size])
+
+    def _read_record(self, record_index: int, digest: Optional[bytes] = None) -> Dict[str, Any]:
+        fields = RECORD.unpack_from(self._map, self._records_offset + record_index * RECORD.size)
+        name, pattern, threat_level, description = (
+            self._read_string(fields[position], fields[position + 1]) for position in (1, 3, 5, 7)
+        )
+        return {
+            'name': name,
+            'type': SIGNATURE_TYPES[fields[0]],
+            'pattern': digest.hex() if digest is not None else pattern,
+            'threat_level': threat_level,
+            'description': description
+        }
+
+    def _read_string(self, offset: int, length: int) -> str:
+        start = self._strings_offset + offset
+        return self._map[start:start + length].decode('utf-8')
+
+    def close(self) -> None:
+        """Unmap and close the database file"""
+        self.bloom = None
+        for view in self._views:
+            view.release()
+        self._views = []
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class SignatureDatabaseWriter:
+    """Builds a signature database file from signature dictionaries"""
+
+    def __init__(self):
+        self._pattern_records: List[Dict[str, Any]] = []
+        self._hash_records: List[Dict[str, Any]] = []
+        self._digests: Dict[str, Dict[bytes, int]] = {}  # algo -> digest -> hash record index
+
+    def add(self, signature: Dict[str, Any],
+            hash_digest: Optional[Tuple[str, bytes]] = None) -> None:
+        """Add a signature in MalwareSignature.to_dict() format
+
+        Hash signatures must come with their (algorithm, raw digest); a later
+        signature with the same digest replaces an earlier one.
+        """
+        if signature['type'] not in SIGNATURE_TYPES:
+            raise SignatureDatabaseError(f"Unknown signature type: {signature['type']}")
+        if signature['type'] != 'hash':
+            self._pattern_records.append(signature)
+            return
+        if hash_digest is None:
+            raise SignatureDatabaseError(f"Hash signature without a valid digest: {signature['name']}")
+
+        algorithm, digest = hash_digest
+        entries = self._digests.setdefault(algorithm, {})
+        if digest in entries:
+            self._hash_records[entries[digest]] = signature
+        else:
+            entries[digest] = len(self._hash_records)
+            self._hash_records.append(signature)
+
+    def write(self, path: Path,
+              bloom_false_positive_rate: Optional[float] = DEFAULT_FALSE_POSITIVE_RATE) -> int:
+        """Write the database and return the number of signatures stored
+
+        A bloom filter over all digests is included unless the false positive
+        rate is None.
+        """
+        strings = bytearray()
+        string_offsets: Dict[str, int] = {}
+
+        def reference(value: str) -> Tuple[int, int]:
+            encoded = value.encode('utf-8')
+            if value not in string_offsets:
+                string_offsets[value] = len(strings)
+                strings.extend(encoded)
+            return string_offsets[value], len(encoded)
+
+        pattern_count = len(self._pattern_records)
+        records = bytearray()
+        for record in self._pattern_records + self._hash_records:
+            # Hash patterns are recovered from the digest tables instead of stored twice
+            pattern = '' if record['type'] == 'hash' else record['pattern']
+            records += RECORD.pack(
+                SIGNATURE_TYPES.index(record['type']),
+                *reference(record['name']), *reference(pattern),
+                *reference(record.get('threat_level', 'medium')),
+                *reference(record.get('description', ''))
+            )
+        record_count = pattern_count + len(self._hash_records)
+
+        tables = []
+        table_data = bytearray()
+        records_offset = HEADER.size + TABLE_ENTRY.size * len(self._digests)
+        offset = records_offset + len(records)
+        for algorithm in sorted(self._digests):
+            entries = self._digests[algorithm]
+            digest_size = len(next(iter(entries)))
+            for digest in sorted(entries):
+                table_data += digest
+                table_data += RECORD_INDEX.pack(pattern_count + entries[digest])
+            tables.append(TABLE_ENTRY.pack(algorithm.encode('ascii'), digest_size, len(entries), offset))
+            offset += len(entries) * (digest_size + RECORD_INDEX.size)
+        strings_offset = offset
+
+        bloom_bits = b''
+        bloom_bit_count = bloom_hash_count = 0
+        if bloom_false_positive_rate is not None:
+            bloom = BloomFilter.for_capacity(sum(len(entries) for entries in self._digests.values()),
+                                             bloom_false_positive_rate)
+            for entries in self._digests.values():
+                for digest in entries:
+                    bloom.add(digest)
+            bloom_bits = bytes(bloom.bits)
+            bloom_bit_count, bloom_hash_count = bloom.bit_count, bloom.hash_count
+        bloom_offset = strings_offset + len(strings)
+
+        sections = (b''.join(tables), records, table_data, strings, bloom_bits)
+        content_digest = hashlib.sha256()
+        for section in sections:
+            content_digest.update(section)
+        header = HEADER.pack(MAGIC, FORMAT_VERSION, len(tables), content_digest.digest()[:16],
+                             records_offset, record_count, pattern_count,
+                             strings_offset, len(strings), bloom_offset, bloom_bit_count,
+                             bloom_hash_count, bloom_false_positive_rate or 0.0)
+
+        with open(path, 'wb') as f:
+            f.write(header)
+            for section in sections:
+                f.write(section)
+
+        logger.info(f"Wrote {record_count} signatures to {path}")
+        return record_count
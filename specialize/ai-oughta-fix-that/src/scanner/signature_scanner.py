@@ -6,13 +6,28 @@ Implements signature-based malware detection using pattern matching
 import hashlib
 import json
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Set
+from typing import List, Dict, Any, Callable, ContextManager, FrozenSet, Iterator, Optional, Set, Tuple
 import logging
 
 from base_scanner import BaseScanner, ScanResult, BaseScannerError
+from file_features import FileFeatureExtractor, FileFeatures, DEFAULT_CHUNK_SIZE
+from pattern_matcher import PatternMatcher, PatternMatcherStream
+from signature_db import SignatureDatabase, SignatureDatabaseWriter, is_signature_database
+from bloom_filter import DEFAULT_FALSE_POSITIVE_RATE
+from fuzzy_hash import FuzzyHasher, FuzzyHashIndex, parse_fuzzy_hash
+from definitions import DefinitionsGeneration, DefinitionsManager
 
 logger = logging.getLogger(__name__)
 
+# Hash signatures carry no explicit algorithm, so it is inferred from digest length
+HASH_ALGORITHMS_BY_DIGEST_SIZE = {16: 'md5', 20: 'sha1', 32: 'sha256'}
+
+# Key under which byte/string pattern matches are stored in FileFeatures.extras
+PATTERN_MATCHES_KEY = 'signature_patterns'
+PATTERN_SIGNATURE_TYPES = ('byte_pattern', 'string')
+FUZZY_HASH_KEY = 'signature_fuzzy_hash'
+DEFAULT_FUZZY_SIMILARITY_THRESHOLD = 0.6
+
 
 class SignatureScannerError(BaseScannerError):
     """Exception specific to signature scanner operations"""
@@ -25,7 +40,7 @@ class MalwareSignature:
     def __init__(self, name: str, signature_type: str, pattern: str, 
                  threat_level: str = "medium", description: str = ""):
         self.name = name
-        self.signature_type = signature_type  # 'hash', 'byte_pattern', 'string'
+        self.signature_type = signature_type  # 'hash', 'byte_pattern', 'string', 'fuzzy'
         self.pattern = pattern
         self.threat_level = threat_level
         self.description = description
@@ -39,16 +54,148 @@ class MalwareSignature:
             'threat_level': self.threat_level,
             'description': self.description
         }
+        
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'MalwareSignature':
+        """Create a signature from its dictionary format"""
+        return cls(
+            name=data['name'],
+            signature_type=data['type'],
+            pattern=data['pattern'],
+            threat_level=data.get('threat_level', 'medium'),
+            description=data.get('description', '')
+        )
+        
+    def hash_digest(self) -> Optional[Tuple[str, bytes]]:
+        """Get the (algorithm, raw digest) of a hash signature, if valid"""
+        if self.signature_type != 'hash':
+            return None
+        try:
+            digest = bytes.fromhex(self.pattern.strip())
+        except ValueError:
+            return None
+        algo = HASH_ALGORITHMS_BY_DIGEST_SIZE.get(len(digest))
+        return (algo, digest) if algo else None
+        
+    def pattern_bytes(self) -> Optional[bytes]:
+        """Get the bytes to match for a byte pattern (hex) or string signature"""
+        if self.signature_type == 'byte_pattern':
+            try:
+                return bytes.fromhex(self.pattern) or None
+            except ValueError:
+                return None
+        if self.signature_type == 'string':
+            return self.pattern.encode('utf-8') or None
+        return None
+
+
+def _signature_key(signature: MalwareSignature) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted(signature.to_dict().items()))
+
+
+class SignatureGeneration(DefinitionsGeneration):
+    """Signatures and the indexes compiled from them, shared read-only by the scans that pin them
+    
+    Pattern and fuzzy signature sets that are unchanged from the previous
+    generation reuse its pattern matcher and LSH index instead of compiling copies.
+    """
+    
+    def __init__(self, signatures: Dict[str, MalwareSignature], signature_db: Optional[SignatureDatabase],
+                 removed_db_signatures: FrozenSet[str], fuzzy_settings: str,
+                 previous: Optional['SignatureGeneration'] = None):
+        self.signatures = signatures
+        # Memory-mapped hash signatures, looked up in place rather than loaded
+        self.signature_db = signature_db
+        self.removed_db_signatures = removed_db_signatures
+        # algorithm -> raw digest -> signature, for constant-time hash lookups
+        self.hash_index: Dict[str, Dict[bytes, MalwareSignature]] = {}
+        pattern_signatures = []
+        fuzzy_signatures = []
+        for signature in signatures.values():
+            if signature.signature_type in PATTERN_SIGNATURE_TYPES:
+                pattern_signatures.append(signature)
+            elif signature.signature_type == 'fuzzy':
+                fuzzy_signatures.append(signature)
+            else:
+                hash_digest = signature.hash_digest()
+                if hash_digest is not None:
+                    algo, digest = hash_digest
+                    self.hash_index.setdefault(algo, {})[digest] = signature
+                
+        self._pattern_key = frozenset(_signature_key(s) for s in pattern_signatures)
+        if previous is not None and previous._pattern_key == self._pattern_key:
+            self.pattern_matcher = previous.pattern_matcher
+        else:
+            self.pattern_matcher = self._compile_patterns(pattern_signatures)
+            
+        # Fuzzy hash signatures, for variants that no exact hash matches
+        self._fuzzy_key = frozenset(_signature_key(s) for s in fuzzy_signatures)
+        if previous is not None and previous._fuzzy_key == self._fuzzy_key:
+            self.fuzzy_index = previous.fuzzy_index
+        else:
+            self.fuzzy_index = FuzzyHashIndex()
+            for signature in fuzzy_signatures:
+                fuzzy_hash = parse_fuzzy_hash(signature.pattern)
+                if fuzzy_hash is not None:
+                    self.fuzzy_index.add(signature.name, fuzzy_hash, signature)
+            self.fuzzy_index.prepare()
+        super().__init__(self._digest(fuzzy_settings))
+        
+    @staticmethod
+    def _compile_patterns(signatures: List[MalwareSignature]) -> Optional[PatternMatcher]:
+        matcher = PatternMatcher()
+        for signature in signatures:
+            pattern = signature.pattern_bytes()
+            if pattern is not None:
+                matcher.add_pattern(pattern, signature)
+        return matcher.compile() if matcher.pattern_count else None
+        
+    def _digest(self, fuzzy_settings: str) -> str:
+        digest = hashlib.sha256()
+        for name in sorted(self.signatures):
+            digest.update(json.dumps(self.signatures[name].to_dict(), sort_keys=True).encode('utf-8'))
+        if self.signature_db is not None:
+            digest.update(self.signature_db.content_digest.encode('ascii'))
+            for name in sorted(self.removed_db_signatures):
+                digest.update(name.encode('utf-8'))
+        if len(self.fuzzy_index):
+            digest.update(fuzzy_settings.encode('ascii'))
+        return digest.hexdigest()[:16]
+        
+    def is_active_db_signature(self, name: str) -> bool:
+        """Whether a database signature is neither masked nor overridden in memory"""
+        return name not in self.removed_db_signatures and name not in self.signatures
+        
+    def release(self, live: List[DefinitionsGeneration]) -> None:
+        """Unmap the signature database unless a live generation still uses it"""
+        if self.signature_db is not None and \
+                all(getattr(other, 'signature_db', None) is not self.signature_db for other in live):
+            self.signature_db.close()
 
 
 class SignatureScanner(BaseScanner):
     """Scanner that uses signature-based detection methods"""
     
+    error_class = SignatureScannerError
+    
     def __init__(self, config: Optional[Dict[str, Any]] = None):
         super().__init__("SignatureScanner", config)
+        # Signatures as edited; scans use the generation last published from them
         self.signatures: Dict[str, MalwareSignature] = {}
+        self._signature_db: Optional[SignatureDatabase] = None
+        self._removed_db_signatures: Set[str] = set()
         self.signature_db_path: Optional[Path] = None
         self.supported_hash_algorithms = ['md5', 'sha1', 'sha256']
+        self.feature_extractor = FileFeatureExtractor(
+            hash_algorithms=self.supported_hash_algorithms,
+            collect_histogram=False,
+            collect_strings=False,
+            chunk_size=self.config.get('chunk_size', DEFAULT_CHUNK_SIZE),
+            memory_limit=self.config.get('max_scan_memory')
+        )
+        self.feature_extractor.register_consumer(PATTERN_MATCHES_KEY, self._create_pattern_stream)
+        self.feature_extractor.register_consumer(FUZZY_HASH_KEY, self._create_fuzzy_hasher)
+        self._definitions = DefinitionsManager(self._snapshot_definitions()(None))
         
     def _initialize(self) -> None:
         """Initialize the signature scanner"""
@@ -60,158 +207,389 @@ class SignatureScanner(BaseScanner):
             logger.warning("No signature database path provided, using empty signature set")
             
     def _load_signatures(self) -> None:
-        """Load signatures from database file"""
+        """Load signatures from database file and publish them as a new generation
+        
+        Scans keep using the previous generation while the file is read and
+        its indexes are compiled.
+        """
         if not self.signature_db_path or not self.signature_db_path.exists():
             raise SignatureScannerError(f"Signature database not found: {self.signature_db_path}")
             
+        signatures: Dict[str, MalwareSignature] = {}
+        signature_db = None
         try:
-            # TODO: Implement actual signature loading logic
             logger.info(f"Loading signatures from {self.signature_db_path}")
-            # Placeholder for signature loading
-            pass
+            if is_signature_database(self.signature_db_path):
+                # Map a binary signature database; only pattern signatures become objects
+                signature_db = SignatureDatabase(self.signature_db_path)
+                for data in signature_db.iter_pattern_signatures():
+                    self._add_loaded_signature(signatures, MalwareSignature.from_dict(data))
+                logger.info(f"Mapped {signature_db.hash_count} hash signatures and loaded "
+                            f"{signature_db.pattern_record_count} pattern signatures")
+            else:
+                with open(self.signature_db_path, 'r') as f:
+                    signatures_data = json.load(f)
+                    
+                for data in signatures_data.values():
+                    self._add_loaded_signature(signatures, MalwareSignature.from_dict(data))
+                    
+                logger.info(f"Loaded {len(signatures_data)} signatures")
         except Exception as e:
+            if signature_db is not None:
+                signature_db.close()
             raise SignatureScannerError(f"Failed to load signatures: {str(e)}")
             
+        with self._definitions.edit_lock:
+            self.signatures = signatures
+            self._signature_db = signature_db
+            self._removed_db_signatures = set()
+            self._definitions.mark_edited()
+        self._publish_definitions()
+        
+    def _add_loaded_signature(self, signatures: Dict[str, MalwareSignature], signature: MalwareSignature) -> None:
+        self._validate_signature(signature)
+        signatures[signature.name] = signature
+        
     def add_signature(self, signature: MalwareSignature) -> None:
-        """Add a new signature to the scanner"""
-        self.signatures[signature.name] = signature
+        """Add a new signature to the scanner
+        
+        The change takes effect for scans started after it, which use a newly
+        published definitions generation.
+        """
+        self._validate_signature(signature)
+        with self._definitions.edit_lock:
+            self._removed_db_signatures.discard(signature.name)
+            self.signatures[signature.name] = signature
+            self._definitions.mark_edited()
         logger.debug(f"Added signature: {signature.name}")
         
     def remove_signature(self, signature_name: str) -> bool:
         """Remove a signature from the scanner"""
-        if signature_name in self.signatures:
-            del self.signatures[signature_name]
-            logger.debug(f"Removed signature: {signature_name}")
-            return True
+        with self._definitions.edit_lock:
+            if signature_name in self.signatures:
+                del self.signatures[signature_name]
+                self._definitions.mark_edited()
+                logger.debug(f"Removed signature: {signature_name}")
+                return True
+            if self._signature_db is not None:
+                # The mapped database is immutable, so its signatures are masked by name
+                self._removed_db_signatures.add(signature_name)
+                self._definitions.mark_edited()
+                logger.debug(f"Masked database signature: {signature_name}")
+                return True
         return False
         
-    def scan_file(self, file_path: Path) -> ScanResult:
-        """Scan a single file using signature matching"""
+    def _validate_signature(self, signature: MalwareSignature) -> None:
+        """Warn about signatures that cannot be indexed; they never match"""
+        if signature.signature_type == 'fuzzy':
+            if parse_fuzzy_hash(signature.pattern) is None:
+                logger.warning(f"Ignoring fuzzy signature with invalid hash: {signature.name}")
+        elif signature.signature_type in PATTERN_SIGNATURE_TYPES:
+            if signature.pattern_bytes() is None:
+                logger.warning(f"Ignoring pattern signature with invalid pattern: {signature.name}")
+        elif signature.signature_type == 'hash' and signature.hash_digest() is None:
+            logger.warning(f"Ignoring hash signature with invalid digest: {signature.name}")
+            
+    def _snapshot_definitions(self) -> Callable[[Optional[SignatureGeneration]], SignatureGeneration]:
+        """Copy the edited signatures and return a builder compiling them into a generation"""
+        threshold = self.config.get('fuzzy_similarity_threshold', DEFAULT_FUZZY_SIMILARITY_THRESHOLD)
+        # Copies, so later edits cannot reach a published generation
+        signatures = dict(self.signatures)
+        signature_db = self._signature_db
+        removed = frozenset(self._removed_db_signatures)
+        fuzzy_settings = f"fuzzy:{threshold}:{self.config.get('fuzzy_hash', True)}"
+        return lambda previous: SignatureGeneration(signatures, signature_db, removed, fuzzy_settings, previous)
+        
+    def _publish_definitions(self, wait: bool = True) -> None:
+        """Publish the edited signatures; scans already running keep their generation
+        
+        Without wait, nothing is published while another thread is already
+        compiling a generation.
+        """
+        self._definitions.rebuild(self._snapshot_definitions, wait)
+        
+    @property
+    def _generation(self) -> SignatureGeneration:
+        """The generation pinned by the running scan, publishing pending edits outside scans"""
+        if self._definitions.is_stale and not self._definitions.is_pinned:
+            self._publish_definitions(wait=False)
+        return self._definitions.pinned
+        
+    def _pin_definitions(self) -> ContextManager:
+        if self._definitions.is_stale:
+            self._publish_definitions(wait=False)
+        return self._definitions.pin()
+        
+    def scan_file(self, file_path: Path, features: Optional[FileFeatures] = None) -> ScanResult:
+        """Scan a single file using signature matching
+        
+        Pre-extracted features may be passed in to share a single read of the
+        file with other scanners.
+        """
         if not self.is_initialized:
             raise SignatureScannerError("Scanner not initialized")
             
-        if not file_path.exists():
+        if features is None and not file_path.exists():
             raise SignatureScannerError(f"File not found: {file_path}")
             
         logger.debug(f"Scanning file: {file_path}")
         
         try:
-            # Calculate file hashes
-            file_hashes = self._calculate_file_hashes(file_path)
-            
-            # Check hash signatures
-            hash_match = self._check_hash_signatures(file_hashes)
-            if hash_match:
-                return ScanResult(
-                    file_path=str(file_path),
-                    threat_detected=True,
-                    threat_type=hash_match.name,
-                    confidence=1.0,
-                    details={
-                        'signature_type': 'hash',
-                        'matched_signature': hash_match.to_dict(),
-                        'file_hashes': file_hashes
-                    }
-                )
-                
-            # Check byte pattern signatures
-            pattern_match = self._check_byte_patterns(file_path)
-            if pattern_match:
-                return ScanResult(
-                    file_path=str(file_path),
-                    threat_detected=True,
-                    threat_type=pattern_match.name,
-                    confidence=0.9,
-                    details={
-                        'signature_type': 'byte_pattern',
-                        'matched_signature': pattern_match.to_dict()
-                    }
-                )
+            with self._pin_definitions():
+                cache_identity = None
+                archive = None
+                if features is None:
+                    # Skip files whose verdict is still valid for these definitions
+                    cached, cache_identity = self._lookup_cached_verdict(file_path)
+                    if cached is not None:
+                        return cached
+                    # Read the file once and derive hashes from that pass
+                    features, archive = self._extract_features(file_path)
+                    # Copies of a file already scanned reuse its verdict
+                    duplicate = self._lookup_duplicate_verdict(file_path, features)
+                    if duplicate is not None:
+                        self._store_cached_verdict(cache_identity, duplicate)
+                        return duplicate
+                    
+                result = self._stamp_generation(self._scan_features(file_path, features))
+                if archive is not None:
+                    result = self._fold_archive_members(result, archive)
+                self._store_cached_verdict(cache_identity, result)
+                self._store_duplicate_verdict(features, result)
+                return result
                 
-            # No threats detected
+        except Exception as e:
+            logger.error(f"Error scanning file {file_path}: {str(e)}")
+            raise SignatureScannerError(f"Scan failed: {str(e)}")
+            
+    def _scan_features(self, file_path: Path, features: FileFeatures) -> ScanResult:
+        """Match signatures against the features extracted from a file"""
+        file_hashes = self._calculate_file_hashes(features)
+        
+        # Check hash signatures
+        hash_match = self._check_hash_signatures(features.digests)
+        if hash_match:
             return ScanResult(
                 file_path=str(file_path),
-                threat_detected=False,
+                threat_detected=True,
+                threat_type=hash_match.name,
                 confidence=1.0,
-                details={'scan_type': 'signature'}
+                details={
+                    'signature_type': 'hash',
+                    'matched_signature': hash_match.to_dict(),
+                    'file_hashes': file_hashes
+                }
             )
             
-        except Exception as e:
-            logger.error(f"Error scanning file {file_path}: {str(e)}")
-            raise SignatureScannerError(f"Scan failed: {str(e)}")
+        # Check byte pattern signatures
+        pattern_match = self._check_byte_patterns(features)
+        if pattern_match:
+            signature, match_offset = pattern_match
+            return ScanResult(
+                file_path=str(file_path),
+                threat_detected=True,
+                threat_type=signature.name,
+                confidence=0.9,
+                details={
+                    'signature_type': 'byte_pattern',
+                    'matched_signature': signature.to_dict(),
+                    'match_offset': match_offset
+                }
+            )
             
-    def scan_directory(self, directory_path: Path, recursive: bool = True) -> List[ScanResult]:
-        """Scan a directory for threats using signature matching"""
-        if not self.is_initialized:
-            raise SignatureScannerError("Scanner not initialized")
+        # Check fuzzy hash signatures; the confidence is the similarity to the known sample
+        fuzzy_match = self._check_fuzzy_signatures(features)
+        if fuzzy_match:
+            signature, similarity = fuzzy_match
+            return ScanResult(
+                file_path=str(file_path),
+                threat_detected=True,
+                threat_type=signature.name,
+                confidence=similarity,
+                details={
+                    'signature_type': 'fuzzy',
+                    'matched_signature': signature.to_dict(),
+                    'similarity': similarity,
+                    'file_hashes': file_hashes
+                }
+            )
             
-        if not directory_path.exists() or not directory_path.is_dir():
-            raise SignatureScannerError(f"Invalid directory: {directory_path}")
+        # No threats detected
+        return ScanResult(
+            file_path=str(file_path),
+            threat_detected=False,
+            confidence=1.0,
+            details={'scan_type': 'signature'}
+        )
             
-        results = []
-        pattern = "**/*" if recursive else "*"
-        
-        for file_path in directory_path.glob(pattern):
-            if file_path.is_file():
-                try:
-                    result = self.scan_file(file_path)
-                    results.append(result)
-                except Exception as e:
-                    logger.error(f"Failed to scan {file_path}: {str(e)}")
-                    
-        return results
-        
     def update_definitions(self) -> bool:
-        """Update signature definitions"""
+        """Update signature definitions
+        
+        The database is reloaded into a new generation while scans continue
+        on the current one; the swap is atomic and the old generation is
+        released once the scans using it finish.
+        """
         try:
-            # TODO: Implement signature update logic
             logger.info("Updating signature definitions...")
-            # Placeholder for update logic
+            previous_version = self.get_definitions_version()
+            
+            # Reload the signature database from scratch
+            if self.signature_db_path:
+                self._load_signatures()
+                
+            if self.get_definitions_version() != previous_version:
+                self._invalidate_cached_verdicts()
             return True
         except Exception as e:
             logger.error(f"Failed to update definitions: {str(e)}")
             return False
             
-    def _calculate_file_hashes(self, file_path: Path) -> Dict[str, str]:
-        """Calculate various hashes for a file"""
-        hashes = {}
+    def _calculate_file_hashes(self, features: FileFeatures) -> Dict[str, str]:
+        """Get the supported hashes computed during feature extraction"""
+        return {
+            algo: features.hashes[algo]
+            for algo in self.supported_hash_algorithms if algo in features.hashes
+        }
+        
+    def _check_hash_signatures(self, file_digests: Dict[str, bytes]) -> Optional[MalwareSignature]:
+        """Check if file digests match any known malware signatures"""
+        generation = self._generation
+        for hash_algo, digest in file_digests.items():
+            signature = generation.hash_index.get(hash_algo, {}).get(digest)
+            if signature:
+                return signature
+                
+        if generation.signature_db is not None:
+            for hash_algo, digest in file_digests.items():
+                data = generation.signature_db.lookup(hash_algo, digest)
+                if data and generation.is_active_db_signature(data['name']):
+                    return MalwareSignature.from_dict(data)
+        return None
         
-        with open(file_path, 'rb') as f:
-            file_content = f.read()
+    def _check_byte_patterns(self, features: FileFeatures) -> Optional[Tuple[MalwareSignature, int]]:
+        """Check if file contains any malicious byte patterns
+        
+        Returns the matched signature and the file offset of the match.
+        """
+        matcher = self._generation.pattern_matcher
+        if matcher is None:
+            return None
             
-        for algo in self.supported_hash_algorithms:
-            hash_obj = hashlib.new(algo)
-            hash_obj.update(file_content)
-            hashes[algo] = hash_obj.hexdigest()
+        matches = features.extras.get(PATTERN_MATCHES_KEY)
+        if matches is None:
+            # Features were extracted without our consumer, so match in a separate pass
+            stream = matcher.stream(max_matches=1)
+            with open(features.file_path, 'rb') as f:
+                offset = 0
+                for chunk in iter(lambda: f.read(self.feature_extractor.chunk_size), b''):
+                    stream.update(chunk, offset)
+                    offset += len(chunk)
+                    if stream.is_complete:
+                        break
+            matches = stream.finish()
             
-        return hashes
-        
-    def _check_hash_signatures(self, file_hashes: Dict[str, str]) -> Optional[MalwareSignature]:
-        """Check if file hashes match any known malware signatures"""
-        for signature in self.signatures.values():
-            if signature.signature_type == 'hash':
-                for hash_algo, hash_value in file_hashes.items():
-                    if signature.pattern.lower() == hash_value.lower():
-                        return signature
+        if matches:
+            match_offset, signature = matches[0]
+            return signature, match_offset
         return None
         
-    def _check_byte_patterns(self, file_path: Path) -> Optional[MalwareSignature]:
-        """Check if file contains any malicious byte patterns"""
-        # TODO: Implement byte pattern matching
-        # This is a placeholder for actual pattern matching logic
-        return None
+    def _create_pattern_stream(self) -> Optional[PatternMatcherStream]:
+        """Create per-file pattern matching state for the feature extractor"""
+        matcher = self._generation.pattern_matcher
+        return matcher.stream(max_matches=1) if matcher else None
+        
+    def _check_fuzzy_signatures(self, features: FileFeatures) -> Optional[Tuple[MalwareSignature, float]]:
+        """Find the fuzzy signature most similar to the file, if any is similar enough"""
+        fuzzy_index = self._generation.fuzzy_index
+        if not len(fuzzy_index) or not self.config.get('fuzzy_hash', True):
+            return None
+            
+        if FUZZY_HASH_KEY in features.extras:
+            fuzzy_hash = features.extras[FUZZY_HASH_KEY]
+        else:
+            # Features were extracted without our consumer, so hash in a separate pass
+            hasher = FuzzyHasher()
+            with open(features.file_path, 'rb') as f:
+                offset = 0
+                for chunk in iter(lambda: f.read(self.feature_extractor.chunk_size), b''):
+                    hasher.update(chunk, offset)
+                    offset += len(chunk)
+            fuzzy_hash = hasher.finish()
+        if fuzzy_hash is None:
+            return None
+            
+        threshold = self.config.get('fuzzy_similarity_threshold', DEFAULT_FUZZY_SIMILARITY_THRESHOLD)
+        matches = fuzzy_index.query(fuzzy_hash, threshold)
+        return matches[0] if matches else None
+        
+    def _create_fuzzy_hasher(self) -> Optional[FuzzyHasher]:
+        """Create per-file fuzzy hashing state for the feature extractor"""
+        if not len(self._generation.fuzzy_index) or not self.config.get('fuzzy_hash', True):
+            return None
+        return FuzzyHasher()
+        
+    def get_definitions_version(self) -> str:
+        """Get a digest identifying the loaded signature set"""
+        return self._generation.version
         
     def get_signature_count(self) -> int:
         """Get the number of loaded signatures"""
-        return len(self.signatures)
+        generation = self._generation
+        count = len(generation.signatures)
+        if generation.signature_db is not None:
+            count += generation.signature_db.hash_count
+        return count
         
+    def iter_signatures(self) -> Iterator[MalwareSignature]:
+        """Iterate over every active signature, including database-backed ones"""
+        generation = self._generation
+        yield from generation.signatures.values()
+        if generation.signature_db is not None:
+            for data in generation.signature_db.iter_signatures():
+                if data['type'] == 'hash' and generation.is_active_db_signature(data['name']):
+                    yield MalwareSignature.from_dict(data)
+                    
     def export_signatures(self, output_path: Path) -> None:
         """Export signatures to a file"""
         signatures_data = {
-            name: sig.to_dict() for name, sig in self.signatures.items()
+            sig.name: sig.to_dict() for sig in self.iter_signatures()
         }
         
         with open(output_path, 'w') as f:
             json.dump(signatures_data, f, indent=2)
             
         logger.info(f"Exported {len(signatures_data)} signatures to {output_path}")
+        
+    def export_signature_db(self, output_path: Path) -> int:
+        """Export signatures to the compact memory-mappable database format
+        
+        A bloom filter prefilter is built alongside the digest tables, sized by
+        the bloom_filter_fp_rate config value; None disables it.
+        """
+        writer = SignatureDatabaseWriter()
+        for signature in self.iter_signatures():
+            if signature.signature_type == 'hash' and signature.hash_digest() is None:
+                logger.warning(f"Skipping hash signature with invalid digest: {signature.name}")
+                continue
+            writer.add(signature.to_dict(), signature.hash_digest())
+        return writer.write(output_path, self.config.get('bloom_filter_fp_rate', DEFAULT_FALSE_POSITIVE_RATE))
+        
+    def get_scanner_info(self) -> Dict[str, Any]:
+        """Get information about the scanner and its signature database"""
+        info = super().get_scanner_info()
+        info['signature_count'] = self.get_signature_count()
+        generation = self._generation
+        info['fuzzy_signature_count'] = len(generation.fuzzy_index)
+        bloom = generation.signature_db.bloom if generation.signature_db is not None else None
+        info['bloom_filter'] = bloom.get_statistics() if bloom is not None else None
+        info['definitions'] = self._definitions.get_statistics()
+        return info
+        
+    def _cleanup(self) -> None:
+        """Unmap the signature database once no running scan uses it"""
+        with self._definitions.edit_lock:
+            if self._signature_db is None:
+                return
+            self._signature_db = None
+            self._definitions.mark_edited()
+        self._publish_definitions()
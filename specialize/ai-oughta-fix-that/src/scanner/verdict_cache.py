@@ -0,0 +1,232 @@
+"""
+Verdict Cache Module
+Persistent SQLite cache of scan verdicts keyed by file identity and definitions version
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 1_000_000
+EVICTION_CHECK_INTERVAL = 1000  # Stores between entry count checks
+FLUSH_INTERVAL_WRITES = 256  # Buffered writes before they are flushed
+FLUSH_INTERVAL_SECONDS = 1.0  # Longest a buffered write waits to be flushed
+
+# (device, inode, size, mtime_ns) of a file
+FileIdentity = Tuple[int, int, int, int]
+
+
+def file_identity(stat_result: os.stat_result) -> FileIdentity:
+    """Build the cache identity of a file from its stat result"""
+    return (stat_result.st_dev, stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns)
+
+
+class VerdictCache:
+    """On-disk verdict cache with least-recently-used, entry-count based eviction
+
+    A verdict is only returned while the file's size and mtime_ns and the
+    scanner's definitions version all still match what was stored. Cache
+    failures are logged and treated as misses so they never break a scan.
+
+    Writes are buffered in memory and flushed in short transactions so that
+    several worker processes can share one cache without holding its lock
+    while they scan. Within a process the cache may be shared between threads.
+    """
+
+    def __init__(self, db_path: Path, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.db_path = Path(db_path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._connection: Optional[sqlite3.Connection] = None
+        self._connection_pid = 0
+        self._pending_stores: Dict[Tuple[str, int, int], tuple] = {}
+        self._pending_touches: Dict[Tuple[str, int, int], float] = {}
+        self._last_flush = time.monotonic()
+        self._stores_since_check = 0
+        self._lock = threading.RLock()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Connections cannot cross processes; each process reopens the database
+        state = self.__dict__.copy()
+        state['_connection'] = None
+        state['_pending_stores'] = {}
+        state['_pending_touches'] = {}
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is not None and self._connection_pid != os.getpid():
+            # Inherited across fork; the parent still owns that connection
+            self._connection = None
+            self._pending_stores = {}
+            self._pending_touches = {}
+        if self._connection is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS verdicts ('
+                ' scanner TEXT NOT NULL, device INTEGER NOT NULL, inode INTEGER NOT NULL,'
+                ' size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL,'
+                ' definitions_version TEXT NOT NULL, result TEXT NOT NULL,'
+                ' last_used REAL NOT NULL,'
+                ' PRIMARY KEY (scanner, device, inode))'
+            )
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS verdicts_last_used ON verdicts (last_used)'
+            )
+            connection.commit()
+            self._connection = connection
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def get(self, scanner: str, identity: FileIdentity,
+            definitions_version: str) -> Optional[Dict[str, Any]]:
+        """Get the cached result dictionary for a file, if still valid"""
+        with self._lock:
+            device, inode, size, mtime_ns = identity
+            key = (scanner, device, inode)
+            try:
+                connection = self._connect()
+                pending = self._pending_stores.get(key)
+                if pending is not None:
+                    if pending[3:6] == (size, mtime_ns, definitions_version):
+                        self.hits += 1
+                        return json.loads(pending[6])
+                    self.misses += 1
+                    return None
+
+                row = connection.execute(
+                    'SELECT result FROM verdicts WHERE scanner = ? AND device = ? AND inode = ?'
+                    ' AND size = ? AND mtime_ns = ? AND definitions_version = ?',
+                    (scanner, device, inode, size, mtime_ns, definitions_version)
+                ).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+
+                self._pending_touches[key] = time.time()
+                self._maybe_flush()
+                self.hits += 1
+                return json.loads(row[0])
+            except (sqlite3.Error, ValueError) as e:
+                logger.error(f"Verdict cache lookup failed: {str(e)}")
+                self.misses += 1
+                return None
+
+    def put(self, scanner: str, identity: FileIdentity, definitions_version: str,
+            result: Dict[str, Any]) -> None:
+        """Store the result dictionary for a file, replacing any older verdict"""
+        with self._lock:
+            device, inode, size, mtime_ns = identity
+            key = (scanner, device, inode)
+            try:
+                self._connect()
+                self._pending_stores[key] = (scanner, device, inode, size, mtime_ns, definitions_version,
+                                             json.dumps(result, default=str), time.time())
+                self._pending_touches.pop(key, None)
+                self._stores_since_check += 1
+                self._maybe_flush()
+            except (sqlite3.Error, TypeError, ValueError) as e:
+                logger.error(f"Verdict cache store failed: {str(e)}")
+
+    def invalidate(self, scanner: str, keep_version: Optional[str] = None) -> int:
+        """Drop a scanner's verdicts, except those produced by keep_version"""
+        with self._lock:
+            try:
+                self.flush()
+                connection = self._connect()
+                cursor = connection.execute(
+                    'DELETE FROM verdicts WHERE scanner = ? AND definitions_version != ?',
+                    (scanner, keep_version or '')
+                ) if keep_version else connection.execute(
+                    'DELETE FROM verdicts WHERE scanner = ?', (scanner,)
+                )
+                connection.commit()
+                if cursor.rowcount:
+                    logger.info(f"Invalidated {cursor.rowcount} cached verdicts for {scanner}")
+                return cursor.rowcount
+            except sqlite3.Error as e:
+                logger.error(f"Verdict cache invalidation failed: {str(e)}")
+                return 0
+
+    def _evict(self) -> None:
+        """Drop the least recently used verdicts once the cache outgrows max_entries"""
+        connection = self._connect()
+        count = connection.execute('SELECT COUNT(*) FROM verdicts').fetchone()[0]
+        if count <= self.max_entries:
+            return
+        # Evict down to 90% so eviction does not run on every subsequent store
+        excess = count - int(self.max_entries * 0.9)
+        connection.execute(
+            'DELETE FROM verdicts WHERE rowid IN'
+            ' (SELECT rowid FROM verdicts ORDER BY last_used LIMIT ?)', (excess,)
+        )
+        connection.commit()
+        logger.info(f"Evicted {excess} cached verdicts")
+
+    def _maybe_flush(self) -> None:
+        pending = len(self._pending_stores) + len(self._pending_touches)
+        if pending >= FLUSH_INTERVAL_WRITES or \
+                time.monotonic() - self._last_flush >= FLUSH_INTERVAL_SECONDS:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write buffered verdicts to disk in a single short transaction"""
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._pending_stores and not self._pending_touches:
+                return
+            try:
+                connection = self._connect()
+                with connection:
+                    connection.executemany(
+                        'INSERT OR REPLACE INTO verdicts VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                        list(self._pending_stores.values())
+                    )
+                    connection.executemany(
+                        'UPDATE verdicts SET last_used = ? WHERE scanner = ? AND device = ? AND inode = ?',
+                        [(last_used,) + key for key, last_used in self._pending_touches.items()]
+                    )
+                if self._stores_since_check >= EVICTION_CHECK_INTERVAL:
+                    self._stores_since_check = 0
+                    self._evict()
+            except sqlite3.Error as e:
+                logger.error(f"Verdict cache flush failed: {str(e)}")
+            self._pending_stores = {}
+            self._pending_touches = {}
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """Get cache hit/miss counts"""
+        lookups = self.hits + self.misses
+        return {
+            'path': str(self.db_path),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+    def close(self) -> None:
+        """Flush buffered writes and close the database"""
+        with self._lock:
+            self.flush()
+            if self._connection is not None and self._connection_pid == os.getpid():
+                try:
+                    self._connection.close()
+                except sqlite3.Error as e:
+                    logger.error(f"Failed to close verdict cache: {str(e)}")
+            self._connection = None
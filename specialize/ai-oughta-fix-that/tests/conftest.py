@@ -0,0 +1,11 @@
+"""
+Shared pytest configuration: the scanner modules import each other flat, as
+they do when run from src/scanner.
+"""
+
+import sys
+from pathlib import Path
+
+SOURCE_DIR = Path(__file__).resolve().parent.parent / 'src'
+
+sys.path[:0] = [str(SOURCE_DIR / 'scanner'), str(SOURCE_DIR)]
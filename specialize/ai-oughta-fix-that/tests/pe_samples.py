@@ -0,0 +1,53 @@
+"""
+Synthetic PE images for the parser and heuristic tests.
+"""
+
+import struct
+from typing import Dict, List
+
+PE_OFFSET = 0x40
+OPTIONAL_HEADER_SIZE = 224  # PE32 with all 16 data directories
+HEADERS_SIZE = 0x200
+SECTION_RVA = 0x1000
+SECTION_SIZE = 0x400
+CODE_SECTION = 0x60000020  # Code, executable, readable
+
+
+def build_pe(imports: Dict[str, List[str]] = None, section_characteristics: int = CODE_SECTION) -> bytes:
+    """Build a PE32 image with one section holding the given import table"""
+    imports = imports or {}
+    section = bytearray(SECTION_SIZE)
+
+    # Descriptors first, then per DLL its lookup table, name and hint/name entries
+    cursor = (len(imports) + 1) * 20
+    for index, (dll, functions) in enumerate(imports.items()):
+        lookup = cursor
+        cursor += (len(functions) + 1) * 4
+        name = cursor
+        section[name:name + len(dll)] = dll.encode('ascii')
+        cursor += len(dll) + 1
+        for slot, function in enumerate(functions):
+            struct.pack_into('<I', section, lookup + slot * 4, SECTION_RVA + cursor)
+            section[cursor + 2:cursor + 2 + len(function)] = function.encode('ascii')
+            cursor += len(function) + 3
+        struct.pack_into('<IIIII', section, index * 20,
+                         SECTION_RVA + lookup, 0, 0, SECTION_RVA + name, SECTION_RVA + lookup)
+    assert cursor <= SECTION_SIZE
+
+    headers = bytearray(HEADERS_SIZE)
+    headers[0:2] = b'MZ'
+    struct.pack_into('<I', headers, 0x3C, PE_OFFSET)
+    headers[PE_OFFSET:PE_OFFSET + 4] = b'PE\0\0'
+    struct.pack_into('<HHIIIHH', headers, PE_OFFSET + 4, 0x14C, 1, 0, 0, 0, OPTIONAL_HEADER_SIZE, 0x102)
+
+    optional = PE_OFFSET + 24
+    struct.pack_into('<H', headers, optional, 0x10B)
+    struct.pack_into('<I', headers, optional + 16, SECTION_RVA)  # Entry point
+    struct.pack_into('<I', headers, optional + 60, HEADERS_SIZE)
+    struct.pack_into('<I', headers, optional + 92, 16)
+    if imports:
+        struct.pack_into('<II', headers, optional + 96 + 8, SECTION_RVA, (len(imports) + 1) * 20)
+
+    struct.pack_into('<8sIIII12xI', headers, optional + OPTIONAL_HEADER_SIZE, b'.text',
+                     SECTION_SIZE, SECTION_RVA, SECTION_SIZE, HEADERS_SIZE, section_characteristics)
+    return bytes(headers + section)
@@ -0,0 +1,78 @@
+"""
+Tests for the suspicious API index and the behavioral rules it drives (HR001-HR003).
+"""
+
+import pytest
+
+from api_index import ApiIndex, normalize_api_name
+from heuristic_scanner import HeuristicScanner
+from pe_parser import PEFile
+from tests.pe_samples import build_pe
+
+
+def test_normalize_api_name():
+    assert normalize_api_name('ShellExecuteW') == 'shellexecute'
+    assert normalize_api_name('RegSetValueExA') == 'regsetvalueex'
+    assert normalize_api_name('WinExec') == 'winexec'
+    assert normalize_api_name('GetTEXTA') == 'gettexta'  # Only a suffix after a lowercase letter
+
+
+def test_combinations_match_by_mask():
+    index = ApiIndex({'VirtualAllocEx', 'IsDebuggerPresent'}, [
+        ('HR002', 'Injection', ('VirtualAllocEx', 'WriteProcessMemory')),
+        ('HR003', 'Debugger', ('IsDebuggerPresent',)),
+    ])
+    profile = index.profile({'kernel32.dll': ['VirtualAllocEx', 'WriteProcessMemory', 'GetProcAddress']},
+                            'imphash')
+    assert profile.functions == {'virtualallocex', 'writeprocessmemory', 'getprocaddress'}
+    assert profile.imphash == 'imphash'
+    assert [(rule_id, indicator) for rule_id, indicator, _ in index.match(profile.api_mask)] == \
+        [('HR002', 'Injection')]
+    assert index.api_names(profile.api_mask) == ['VirtualAllocEx', 'WriteProcessMemory']
+    # Only APIs listed as suspicious count towards the loose HR001 threshold
+    assert index.api_names(profile.api_mask & index.suspicious_mask) == ['VirtualAllocEx']
+    assert index.match(index.mask_for(['WriteProcessMemory'])) == []
+
+
+@pytest.fixture
+def scan(tmp_path):
+    scanner = HeuristicScanner({'triage': False, 'duplicate_verdicts': False})
+    scanner.initialize()
+
+    def scan(imports):
+        path = tmp_path / 'sample.exe'
+        path.write_bytes(build_pe(imports))
+        result = scanner.scan_file(path)
+        behavioral = {i['rule_id']: i for i in result.details['indicators']
+                      if i['rule_id'] in ('HR001', 'HR002', 'HR003')}
+        return result, behavioral
+    yield scan
+    scanner.cleanup()
+
+
+def test_injection_and_anti_analysis_imports(scan):
+    imports = {'kernel32.dll': ['OpenProcess', 'VirtualAllocEx', 'WriteProcessMemory', 'CreateRemoteThread',
+                                'CheckRemoteDebuggerPresent'],
+               'user32.dll': ['SetWindowsHookExW']}
+    result, behavioral = scan(imports)
+    assert sorted(behavioral) == ['HR001', 'HR002', 'HR003']
+    assert behavioral['HR002']['indicator'] == 'Remote thread injection'
+    assert behavioral['HR002']['value'] == ['CreateRemoteThread', 'OpenProcess', 'VirtualAllocEx', 'WriteProcessMemory']
+    assert behavioral['HR001']['value'] == ['SetWindowsHookEx']
+    assert behavioral['HR003']['value'] == ['CheckRemoteDebuggerPresent']
+    with PEFile(build_pe(imports)) as pe:
+        assert result.details['imphash'] == pe.imphash()
+
+
+def test_runtime_imports_are_not_flagged(scan):
+    result, behavioral = scan({'kernel32.dll': ['IsDebuggerPresent', 'GetProcAddress', 'LoadLibraryA']})
+    assert behavioral == {}
+    assert result.details['imphash'] is not None
+
+
+def test_loose_suspicious_apis_reach_hr001(scan):
+    _, behavioral = scan({'kernel32.dll': ['GetKeyState', 'InternetOpenUrlA', 'ReadProcessMemory']})
+    assert behavioral['HR001']['indicator'] == 'Suspicious API imports'
+    assert behavioral['HR001']['value'] == ['GetKeyState', 'InternetOpenUrl', 'ReadProcessMemory']
+    _, behavioral = scan({'kernel32.dll': ['GetKeyState', 'ReadProcessMemory']})
+    assert behavioral == {}
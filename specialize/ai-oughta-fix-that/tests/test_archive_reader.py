@@ -0,0 +1,129 @@
+"""
+Tests for streaming archive members and the limits on what an archive may cost.
+"""
+
+import bz2
+import gzip
+import io
+import json
+import random
+import tarfile
+import zipfile
+
+import pytest
+
+from archive_reader import ArchiveLimitError, ArchiveLimits, ArchiveReader
+from file_features import FileFeatureExtractor
+from signature_scanner import SignatureScanner
+
+MARKER = b'xx archive-marker xx'
+
+
+def _zip(members, compression=zipfile.ZIP_DEFLATED):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression) as archive:
+        for name, contents in members.items():
+            archive.writestr(name, contents)
+    return buffer.getvalue()
+
+
+def _tar(members):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w') as archive:
+        for name, contents in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(contents)
+            archive.addfile(info, io.BytesIO(contents))
+    return buffer.getvalue()
+
+
+def _members(data, limits=None, path='sample'):
+    reader = ArchiveReader(limits)
+    return reader, {member.path: member.stream.read() for member in reader.iter_members(io.BytesIO(data), path)}
+
+
+def test_nested_archives_are_walked():
+    inner = _tar({'inner.txt': b'inner', 'deep.gz': gzip.compress(b'deepest')})
+    data = _zip({'a.txt': b'first', 'inner.tar.bz2': bz2.compress(inner)})
+    reader, members = _members(data)
+    assert members == {'sample!a.txt': b'first', 'sample!inner.tar.bz2!inner.txt': b'inner',
+                       'sample!inner.tar.bz2!deep.gz!deep': b'deepest'}
+    assert reader.errors == []
+
+
+def test_archives_nested_too_deep_are_scanned_as_files():
+    inner = _zip({'inner.txt': b'inner'})
+    _, members = _members(_zip({'inner.zip': inner}), ArchiveLimits(max_depth=1))
+    assert members == {'sample!inner.zip': inner}
+
+
+def test_member_limit():
+    data = _zip({f'{index}.txt': b'x' for index in range(5)})
+    with pytest.raises(ArchiveLimitError):
+        _members(data, ArchiveLimits(max_members=4))
+    assert len(_members(data, ArchiveLimits(max_members=5))[1]) == 5
+
+
+def test_byte_limit():
+    data = _tar({'a.bin': b'a' * 1000, 'b.bin': b'b' * 1000})
+    with pytest.raises(ArchiveLimitError):
+        _members(data, ArchiveLimits(max_bytes=1500))
+
+
+def test_compression_ratio_limit():
+    data = gzip.compress(b'\0' * (4 * 1024 * 1024))
+    with pytest.raises(ArchiveLimitError):
+        _members(data, ArchiveLimits(max_ratio=10))
+    assert len(_members(data, ArchiveLimits(max_ratio=10000))[1]['sample!sample']) == 4 * 1024 * 1024
+
+
+@pytest.fixture
+def scanner(tmp_path):
+    database = tmp_path / 'signatures.json'
+    database.write_text(json.dumps({'Archive.Marker': {
+        'name': 'Archive.Marker', 'type': 'string', 'pattern': MARKER.decode(),
+        'threat_level': 'high', 'description': 'Archive marker'}}))
+    scanner = SignatureScanner({'signature_db_path': str(database), 'duplicate_verdicts': False})
+    scanner.initialize()
+    yield scanner
+    scanner.cleanup()
+
+
+@pytest.mark.parametrize('pack', [
+    lambda members: _zip(members),
+    lambda members: _zip(members, zipfile.ZIP_STORED),
+    lambda members: gzip.compress(_tar(members)),
+])
+def test_archive_is_read_once(tmp_path, scanner, monkeypatch, pack):
+    members = {f'clean{index}.bin': random.Random(index).randbytes(300000) for index in range(4)}
+    members['infected.bin'] = b'\0' * 1000 + MARKER
+    path = tmp_path / 'sample.archive'
+    path.write_bytes(pack(members))
+    expected = FileFeatureExtractor().extract(path)
+
+    opened = []
+    real_open = open
+
+    def counting_open(file, *args, **kwargs):
+        if str(file) == str(path):
+            opened.append(file)
+        return real_open(file, *args, **kwargs)
+
+    monkeypatch.setattr('builtins.open', counting_open)
+    features, archive = scanner._extract_features(path)
+    assert len(opened) == 1
+    assert features.size == expected.size
+    assert features.hashes == {algo: expected.hashes[algo] for algo in features.hashes}
+
+    result = scanner._fold_archive_members(scanner._scan_features(path, features), archive)
+    assert archive['members_scanned'] == 5
+    assert result.threat_detected and result.threat_type == 'Archive.Marker'
+    assert [d['file_path'] for d in archive['detections']] == [f'{path}!infected.bin']
+
+
+def test_scan_file_reports_member_detections(tmp_path, scanner):
+    path = tmp_path / 'sample.zip'
+    path.write_bytes(_zip({'clean.txt': b'clean', 'infected.txt': MARKER}))
+    result = scanner.scan_file(path)
+    assert result.threat_detected and result.threat_type == 'Archive.Marker'
+    assert result.details['archive_member'] == f'{path}!infected.txt'
@@ -0,0 +1,92 @@
+"""
+Tests for the asyncio scanning facade.
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from api.async_scanner import AsyncScanner
+from base_scanner import ScanResult
+from heuristic_scanner import HeuristicScanner
+
+
+def _samples(directory, count):
+    directory.mkdir()
+    for index in range(count):
+        (directory / f'sample{index}.bin').write_bytes(b'cmd.exe powershell.exe password ' * (index + 1))
+    return sorted(str(path) for path in directory.iterdir())
+
+
+@pytest.mark.parametrize('workers', [0, 2])
+def test_scans_directory_and_caches_verdicts_in_this_process(tmp_path, workers):
+    expected = _samples(tmp_path / 'samples', 6)
+    scanner = HeuristicScanner({'verdict_cache_path': str(tmp_path / 'verdicts.db'), 'duplicate_verdicts': False})
+
+    async def scan():
+        async with AsyncScanner(scanner, {'scan_workers': workers, 'async_max_concurrency': 4}) as facade:
+            results = [result async for result in facade.iter_scan_directory(tmp_path / 'samples')]
+            again = await facade.scan_file(tmp_path / 'samples' / 'sample0.bin')
+            return results, again, facade.get_statistics()
+
+    try:
+        results, again, statistics = asyncio.run(scan())
+        assert sorted(result.file_path for result in results) == expected
+        assert again.file_path == expected[0]
+        if workers:
+            assert (statistics['scanned'], statistics['cached']) == (6, 1)
+        assert scanner._verdict_cache.get_statistics()['hits'] >= 1
+    finally:
+        scanner.cleanup()
+
+
+class _SlowScanner(HeuristicScanner):
+    """Records how many scans run at once"""
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.running = 0
+        self.peak = 0
+        self._count_lock = threading.Lock()
+
+    def scan_file(self, file_path, features=None):
+        with self._count_lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(0.05)
+        with self._count_lock:
+            self.running -= 1
+        return ScanResult(str(file_path))
+
+
+def test_concurrency_limit(tmp_path):
+    _samples(tmp_path / 'samples', 12)
+    scanner = _SlowScanner({'duplicate_verdicts': False})
+
+    async def scan():
+        facade = AsyncScanner(scanner, {'scan_workers': 0, 'async_max_concurrency': 3, 'async_io_threads': 8})
+        async with facade:
+            results = [result async for result in facade.iter_scan_directory(tmp_path / 'samples')]
+            return results, facade.get_statistics()
+
+    results, statistics = asyncio.run(scan())
+    assert len(results) == 12
+    assert scanner.peak <= 3
+    assert statistics['in_flight'] == 0
+
+
+def test_missing_file_raises_scanner_error(tmp_path):
+    scanner = HeuristicScanner({'duplicate_verdicts': False,
+                                'verdict_cache_path': str(tmp_path / 'verdicts.db')})
+
+    async def scan():
+        async with AsyncScanner(scanner, {'scan_workers': 1}) as facade:
+            await facade.scan_file(tmp_path / 'missing.bin')
+
+    try:
+        with pytest.raises(scanner.error_class):
+            asyncio.run(scan())
+    finally:
+        scanner.cleanup()
@@ -0,0 +1,74 @@
+"""
+Tests for the Bloom filter in front of hash signature lookups.
+"""
+
+import hashlib
+import json
+
+import pytest
+
+from bloom_filter import BloomFilter
+from signature_db import SignatureDatabase, SignatureDatabaseWriter
+from signature_scanner import SignatureScanner
+
+
+def _digest(index, salt=b'member'):
+    return hashlib.sha256(salt + b'%d' % index).digest()
+
+
+@pytest.mark.parametrize('false_positive_rate', [0.1, 0.01])
+def test_no_false_negatives_and_bounded_false_positives(false_positive_rate):
+    bloom = BloomFilter.for_capacity(5000, false_positive_rate)
+    for index in range(5000):
+        bloom.add(_digest(index))
+    assert all(_digest(index) in bloom for index in range(5000))
+    false_positives = sum(_digest(index, b'other') in bloom for index in range(20000))
+    assert false_positives / 20000 < false_positive_rate * 1.5
+
+
+def test_rejects_invalid_sizes():
+    with pytest.raises(ValueError):
+        BloomFilter.for_capacity(10, 1.5)
+    with pytest.raises(ValueError):
+        BloomFilter(0, 3)
+
+
+def test_persisted_filter_rejects_misses_before_the_tables(tmp_path):
+    writer = SignatureDatabaseWriter()
+    for index in range(100):
+        writer.add({'name': f'Sample.{index}', 'type': 'hash', 'pattern': _digest(index).hex()},
+                   ('sha256', _digest(index)))
+    path = tmp_path / 'signatures.sigdb'
+    writer.write(path, 0.001)
+
+    database = SignatureDatabase(path)
+    try:
+        assert database.bloom is not None and database.bloom.false_positive_rate == 0.001
+        assert database.lookup('sha256', _digest(42))['name'] == 'Sample.42'
+        for index in range(1000):
+            assert database.lookup('sha256', _digest(index, b'clean')) is None
+        statistics = database.bloom.get_statistics()
+        assert statistics['passed'] == 1 + statistics['false_positives']
+        assert statistics['rejected'] + statistics['false_positives'] == 1000
+        assert statistics['rejected'] > 990
+    finally:
+        database.close()
+
+
+def test_scanner_info_reports_filter(tmp_path):
+    source = tmp_path / 'signatures.json'
+    source.write_text(json.dumps({'Sample': {'name': 'Sample', 'type': 'hash', 'pattern': _digest(0).hex(),
+                                             'threat_level': 'high', 'description': 'Sample'}}))
+    exporter = SignatureScanner({'signature_db_path': str(source), 'bloom_filter_fp_rate': 0.02})
+    exporter.initialize()
+    database = tmp_path / 'signatures.sigdb'
+    exporter.export_signature_db(database)
+    assert exporter.get_scanner_info()['bloom_filter'] is None
+    exporter.cleanup()
+
+    scanner = SignatureScanner({'signature_db_path': str(database)})
+    scanner.initialize()
+    try:
+        assert scanner.get_scanner_info()['bloom_filter']['false_positive_rate'] == 0.02
+    finally:
+        scanner.cleanup()
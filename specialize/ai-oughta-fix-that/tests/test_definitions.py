@@ -0,0 +1,122 @@
+"""
+Tests for definitions generations: pinning, release and reloads during scans.
+"""
+
+import json
+import threading
+import time
+
+import pytest
+
+from definitions import DefinitionsGeneration, DefinitionsManager
+from signature_scanner import SignatureScanner
+
+
+class _RecordingGeneration(DefinitionsGeneration):
+    def __init__(self, version):
+        super().__init__(version)
+        self.released = False
+
+    def release(self, live):
+        assert self not in live
+        self.released = True
+
+
+def _write_signatures(path, patterns):
+    path.write_text(json.dumps({
+        name: {'name': name, 'type': 'string', 'pattern': pattern, 'threat_level': 'high',
+               'description': name}
+        for name, pattern in patterns.items()
+    }))
+
+
+@pytest.fixture
+def scanner(tmp_path):
+    database = tmp_path / 'signatures.json'
+    _write_signatures(database, {'Old.Marker': 'old-marker'})
+    scanner = SignatureScanner({'signature_db_path': str(database), 'duplicate_verdicts': False})
+    scanner.initialize()
+    yield scanner
+    scanner.cleanup()
+
+
+def _sample(tmp_path, name, contents):
+    path = tmp_path / name
+    path.write_bytes(contents)
+    return path
+
+
+def test_pinned_generation_is_released_after_last_pin():
+    first = _RecordingGeneration('first')
+    manager = DefinitionsManager(first)
+    second = _RecordingGeneration('second')
+
+    with manager.pin() as pinned:
+        assert pinned is first
+        with manager.pin() as nested:
+            assert nested is first
+        manager.publish(second)
+        assert manager.pinned is first
+        assert not first.released
+        assert manager.get_statistics()['draining_generations'] == 1
+
+    assert first.released
+    assert manager.get_statistics() == {'generation': second.sequence, 'generation_id': 'second',
+                                        'draining_generations': 0}
+    with manager.pin() as pinned:
+        assert pinned is second
+
+
+def test_unpinned_generation_is_released_on_publish():
+    first = _RecordingGeneration('first')
+    manager = DefinitionsManager(first)
+    manager.publish(_RecordingGeneration('second'))
+    assert first.released
+
+
+def test_update_definitions_keeps_pinned_generation(scanner, tmp_path):
+    sample = _sample(tmp_path, 'sample.bin', b'xx old-marker new-marker xx')
+    old_version = scanner.get_definitions_version()
+
+    with scanner._pin_definitions():
+        _write_signatures(scanner.signature_db_path, {'New.Marker': 'new-marker'})
+        assert scanner.update_definitions()
+        assert scanner.get_definitions_version() == old_version
+        assert scanner.scan_file(sample).threat_type == 'Old.Marker'
+
+    assert scanner.get_definitions_version() != old_version
+    assert scanner.scan_file(sample).threat_type == 'New.Marker'
+    assert scanner._definitions.get_statistics()['draining_generations'] == 0
+
+
+def test_scan_does_not_block_on_reload(scanner, tmp_path, monkeypatch):
+    sample = _sample(tmp_path, 'sample.bin', b'xx old-marker new-marker xx')
+    building = threading.Event()
+    finish_build = threading.Event()
+    snapshot = scanner._snapshot_definitions
+
+    def blocking_snapshot():
+        build = snapshot()
+
+        def blocking_build(previous):
+            building.set()
+            finish_build.wait(10)
+            return build(previous)
+        return blocking_build
+
+    monkeypatch.setattr(scanner, '_snapshot_definitions', blocking_snapshot)
+    _write_signatures(scanner.signature_db_path, {'New.Marker': 'new-marker'})
+    reload = threading.Thread(target=scanner.update_definitions)
+    reload.start()
+    try:
+        assert building.wait(10)
+        started = time.monotonic()
+        result = scanner.scan_file(sample)
+        assert time.monotonic() - started < 5
+        assert result.threat_type == 'Old.Marker'
+    finally:
+        finish_build.set()
+        reload.join(10)
+
+    assert not reload.is_alive()
+    assert scanner.scan_file(sample).threat_type == 'New.Marker'
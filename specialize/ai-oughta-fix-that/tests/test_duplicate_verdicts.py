@@ -0,0 +1,90 @@
+"""
+Tests for the duplicate verdict table.
+"""
+
+import hashlib
+import json
+
+import pytest
+
+from duplicate_verdicts import MAX_DETAILS_SIZE, DuplicateVerdictTable
+from heuristic_scanner import HeuristicScanner
+from signature_scanner import SignatureScanner
+
+
+def _result(path, details=None):
+    return {'file_path': path, 'threat_detected': True, 'threat_type': 'Test', 'confidence': 0.5,
+            'details': details if details is not None else {'scan_type': 'test'}, 'generation': 'v1'}
+
+
+def _digest(contents):
+    return hashlib.sha256(contents).digest()
+
+
+def test_hit_and_miss():
+    table = DuplicateVerdictTable()
+    assert table.lookup(_digest(b'first'), 'v1') is None
+    table.store(_digest(b'first'), 'v1', _result('first'))
+
+    assert table.lookup(_digest(b'first'), 'v1') == _result('first')
+    assert table.lookup(_digest(b'other'), 'v1') is None
+    assert table.lookup(_digest(b'first'), 'v2') is None  # Other definitions
+    statistics = table.get_statistics()
+    assert (statistics['lookups'], statistics['hits'], statistics['verdicts']) == (4, 1, 1)
+
+
+def test_oversized_details_are_not_recorded():
+    table = DuplicateVerdictTable()
+    table.store(_digest(b'first'), 'v1', _result('first', {'blob': 'x' * MAX_DETAILS_SIZE}))
+    assert table.lookup(_digest(b'first'), 'v1') is None
+    assert table.get_statistics()['oversized'] == 1
+
+
+def test_evicts_beyond_max_bytes():
+    table = DuplicateVerdictTable(max_bytes=2000)
+    for index in range(10):
+        table.store(bytes([index]) * 32, 'v1', _result(f'file{index}'))
+    statistics = table.get_statistics()
+    assert 0 < statistics['verdicts'] < 10
+    assert statistics['verdict_bytes'] <= 2000
+    assert table.lookup(bytes([9]) * 32, 'v1') is not None
+
+
+@pytest.fixture
+def signature_scanner(tmp_path):
+    database = tmp_path / 'signatures.json'
+    database.write_text(json.dumps({'Marker': {'name': 'Marker', 'type': 'string', 'pattern': 'marker',
+                                               'threat_level': 'high', 'description': 'Marker'}}))
+    scanner = SignatureScanner({'signature_db_path': str(database)})
+    scanner.initialize()
+    yield scanner
+    scanner.cleanup()
+
+
+def test_scanner_reuses_verdict_of_copy(tmp_path, signature_scanner):
+    contents = b'xx marker xx' * 64
+    samples = tmp_path / 'samples'
+    samples.mkdir()
+    paths = [samples / f'copy{index}.bin' for index in range(2)]
+    for path in paths:
+        path.write_bytes(contents)
+    different = samples / 'different.bin'
+    different.write_bytes(contents + b'!')
+
+    first, copy, other = [signature_scanner.scan_file(path) for path in paths + [different]]
+
+    assert 'duplicate_of' not in first.details
+    assert copy.details.pop('duplicate_of') == str(paths[0])
+    assert copy.file_path == str(paths[1])
+    assert (copy.threat_detected, copy.threat_type, copy.details) == \
+        (first.threat_detected, first.threat_type, first.details)
+    assert 'duplicate_of' not in other.details
+    assert signature_scanner._duplicate_verdicts.get_statistics()['hits'] == 1
+
+
+def test_heuristic_scanner_hashes_only_when_enabled():
+    assert HeuristicScanner()._duplicate_verdicts is None
+    assert HeuristicScanner().feature_extractor.hash_algorithms == ()
+    enabled = HeuristicScanner({'duplicate_verdicts': True})
+    assert enabled._duplicate_verdicts is not None
+    assert enabled.feature_extractor.hash_algorithms == ('sha256',)
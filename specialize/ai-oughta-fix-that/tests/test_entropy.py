@@ -0,0 +1,79 @@
+"""
+Tests for whole-file and sliding-window entropy.
+"""
+
+import math
+import random
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from entropy import EntropyAccumulator, byte_histogram, shannon_entropy, windowed_entropy
+from heuristic_scanner import HeuristicScanner
+
+
+def _reference_entropy(data):
+    counts = Counter(data)
+    return -sum(count / len(data) * math.log2(count / len(data)) for count in counts.values())
+
+
+def test_shannon_entropy():
+    assert shannon_entropy(byte_histogram(b'')) == 0.0
+    assert shannon_entropy(byte_histogram(b'a' * 100)) == 0.0
+    assert shannon_entropy(byte_histogram(bytes(range(256)) * 4)) == pytest.approx(8.0)
+    data = random.Random(1).randbytes(5000)
+    assert shannon_entropy(byte_histogram(data)) == pytest.approx(_reference_entropy(data))
+
+
+@pytest.mark.parametrize('window_size, stride', [(64, 16), (64, 64), (256, 32)])
+def test_windowed_entropy_matches_per_window_reference(window_size, stride):
+    data = random.Random(window_size + stride).randbytes(3000) + b'\0' * 700
+    expected = [_reference_entropy(data[start:start + window_size])
+                for start in range(0, len(data) - window_size + 1, stride)]
+    assert windowed_entropy(data, window_size, stride) == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 100, 4096])
+def test_chunking_does_not_change_windows_or_regions(chunk_size):
+    rng = random.Random(chunk_size)
+    data = b'a' * 2000 + rng.randbytes(1500) + b'b' * 2000 + rng.randbytes(600)
+    accumulator = EntropyAccumulator(256, 64, threshold=7.0, keep_window_entropies=True)
+    for offset in range(0, len(data), chunk_size):
+        accumulator.update(data[offset:offset + chunk_size], offset)
+    profile = accumulator.finish()
+
+    whole = windowed_entropy(data, 256, 64)
+    assert np.allclose(profile.window_entropies, whole)
+    assert profile.window_count == len(whole)
+    expected = []
+    for index in np.flatnonzero(whole >= 7.0).tolist():
+        start, end = index * 64, index * 64 + 256
+        if expected and start <= expected[-1][1]:
+            expected[-1] = (expected[-1][0], end)
+        else:
+            expected.append((start, end))
+    assert len(expected) == 2
+    assert profile.high_entropy_regions == expected
+
+
+def test_rejects_window_not_a_multiple_of_stride():
+    with pytest.raises(ValueError):
+        EntropyAccumulator(100, 64)
+
+
+def test_hr005_flags_packed_region_in_low_entropy_file(tmp_path):
+    scanner = HeuristicScanner({'triage': False, 'duplicate_verdicts': False,
+                                'entropy_window_size': 4096, 'entropy_window_stride': 1024})
+    scanner.initialize()
+    try:
+        sample = tmp_path / 'sample.bin'
+        sample.write_bytes(b'plain text ' * 20000 + random.Random(0).randbytes(16384) + b'plain text ' * 20000)
+        result = scanner.scan_file(sample)
+        indicator, = [i for i in result.details['indicators'] if i['rule_id'] == 'HR005']
+        assert indicator['indicator'] == 'High entropy region'
+        assert indicator['file_entropy'] < 7.0 <= indicator['value']
+        (start, end), = indicator['regions']
+        assert start <= 220000 and end >= 220000 + 16384 - 4096
+    finally:
+        scanner.cleanup()
@@ -0,0 +1,96 @@
+"""
+Tests for watch mode: debouncing, backpressure and rescans after lost events.
+"""
+
+import sys
+import threading
+
+import pytest
+
+from file_watcher import EVENT_CHANGED, EVENT_OVERFLOW, EVENT_REMOVED, FileWatcher
+from heuristic_scanner import HeuristicScanner
+
+
+@pytest.fixture
+def scanner():
+    scanner = HeuristicScanner({'duplicate_verdicts': False})
+    scanner.initialize()
+    yield scanner
+    scanner.cleanup()
+
+
+def _queued(watcher):
+    paths = []
+    while not watcher._queue.empty():
+        paths.append(watcher._queue.get_nowait())
+    return paths
+
+
+def test_writes_are_coalesced_until_the_file_is_quiet(tmp_path, scanner):
+    watcher = FileWatcher(scanner, [tmp_path], config={'watch_debounce_seconds': 1.0})
+    for now in (0.0, 0.4, 0.8):
+        watcher._handle_event(EVENT_CHANGED, '/a', now)
+    watcher._handle_event(EVENT_CHANGED, '/b', 0.0)
+    watcher._handle_event(EVENT_REMOVED, '/b', 0.5)
+
+    assert not watcher._dispatch(1.5)
+    assert _queued(watcher) == []  # '/a' was written again at 0.8
+    assert not watcher._dispatch(1.8)
+    assert _queued(watcher) == ['/a']
+    assert (watcher.statistics['events'], watcher.statistics['coalesced']) == (5, 2)
+
+
+def test_full_queue_keeps_files_pending(tmp_path, scanner):
+    watcher = FileWatcher(scanner, [tmp_path], config={'watch_debounce_seconds': 0, 'watch_queue_size': 2})
+    for index in range(5):
+        watcher._handle_event(EVENT_CHANGED, f'/file{index}', 0.0)
+
+    assert watcher._dispatch(1.0)
+    assert len(watcher._pending) == 3
+    # Further writes to a waiting file coalesce instead of piling up
+    watcher._handle_event(EVENT_CHANGED, '/file4', 1.0)
+    assert len(watcher._pending) == 3
+    assert _queued(watcher) == ['/file0', '/file1']
+    assert watcher._dispatch(2.0)
+    assert _queued(watcher) == ['/file2', '/file3']
+    assert not watcher._dispatch(3.0)
+    assert _queued(watcher) == ['/file4']
+
+
+@pytest.mark.parametrize('overflow', ['lost events', 'too many pending'])
+def test_overflow_falls_back_to_rescan(tmp_path, scanner, overflow):
+    for index in range(3):
+        (tmp_path / f'sample{index}.bin').write_bytes(b'sample')
+    watcher = FileWatcher(scanner, [tmp_path], config={'watch_debounce_seconds': 0, 'watch_max_pending': 2})
+    watcher._handle_event(EVENT_CHANGED, '/elsewhere', 0.0)
+    if overflow == 'lost events':
+        watcher._handle_event(EVENT_OVERFLOW, '', 0.0)
+    else:
+        for index in range(2):
+            watcher._handle_event(EVENT_CHANGED, f'/file{index}', 0.0)
+
+    assert not watcher._dispatch(1.0)
+    assert sorted(_queued(watcher)) == sorted(str(path) for path in tmp_path.iterdir())
+    assert (watcher.statistics['overflows'], watcher.statistics['rescans']) == (1, 1)
+
+
+@pytest.mark.parametrize('backend', [
+    'polling',
+    pytest.param('inotify', marks=pytest.mark.skipif(not sys.platform.startswith('linux'),
+                                                     reason='inotify is Linux only')),
+])
+def test_changed_files_are_scanned(tmp_path, scanner, backend):
+    results = []
+    scanned = threading.Event()
+
+    def on_result(result):
+        results.append(result)
+        scanned.set()
+
+    watcher = FileWatcher(scanner, [tmp_path], on_result, config={
+        'watch_backend': backend, 'watch_debounce_seconds': 0.05, 'watch_poll_interval': 0.1})
+    with watcher:
+        sample = tmp_path / 'sample.bin'
+        sample.write_bytes(b'cmd.exe powershell.exe ' * 64)
+        assert scanned.wait(10)
+    assert [result.file_path for result in results] == [str(sample)]
@@ -0,0 +1,100 @@
+"""
+Tests for fuzzy hashes and the LSH index of known-bad samples.
+"""
+
+import json
+import random
+
+import numpy as np
+import pytest
+
+from fuzzy_hash import (FuzzyHasher, FuzzyHashIndex, format_fuzzy_hash, fuzzy_hash_file,
+                        fuzzy_similarity, parse_fuzzy_hash)
+from signature_scanner import SignatureScanner
+
+
+def _fuzzy_hash(data, chunk_size=None):
+    hasher = FuzzyHasher()
+    chunk_size = chunk_size or len(data)
+    for offset in range(0, len(data), chunk_size):
+        hasher.update(data[offset:offset + chunk_size], offset)
+    return hasher.finish()
+
+
+def _variant(data, rng, edits):
+    """Overwrite a few short runs, as a recompiled variant would differ"""
+    data = bytearray(data)
+    for _ in range(edits):
+        position = rng.randrange(len(data) - 16)
+        data[position:position + 16] = rng.randbytes(16)
+    return bytes(data)
+
+
+@pytest.fixture
+def sample():
+    return random.Random(0).randbytes(256 * 1024)
+
+
+def test_hash_does_not_depend_on_chunk_size(sample):
+    expected = _fuzzy_hash(sample)
+    for chunk_size in (1000, 4096, 65536):
+        assert np.array_equal(_fuzzy_hash(sample, chunk_size), expected)
+
+
+def test_similarity_tracks_how_much_changed(sample):
+    rng = random.Random(1)
+    original = _fuzzy_hash(sample)
+    assert fuzzy_similarity(original, original) == 1.0
+    assert fuzzy_similarity(original, _fuzzy_hash(_variant(sample, rng, 5))) >= 0.8
+    assert fuzzy_similarity(original, _fuzzy_hash(random.Random(2).randbytes(len(sample)))) < 0.1
+
+
+def test_small_files_have_no_hash():
+    assert _fuzzy_hash(b'too small') is None
+
+
+def test_text_form_round_trips(sample):
+    fuzzy_hash = _fuzzy_hash(sample)
+    assert np.array_equal(parse_fuzzy_hash(format_fuzzy_hash(fuzzy_hash)), fuzzy_hash)
+    assert parse_fuzzy_hash('minhash64:abc') is None
+    assert parse_fuzzy_hash('other:' + format_fuzzy_hash(fuzzy_hash)) is None
+
+
+def test_index_finds_variants_among_unrelated_samples(sample):
+    index = FuzzyHashIndex()
+    rng = random.Random(3)
+    for key in range(300):
+        index.add(f'unrelated{key}', _fuzzy_hash(rng.randbytes(32 * 1024)), f'unrelated{key}')
+    index.add('known', _fuzzy_hash(sample), 'known')
+
+    matches = index.query(_fuzzy_hash(_variant(sample, rng, 5)), 0.6)
+    assert [value for value, _ in matches] == ['known']
+    assert matches[0][1] >= 0.8
+    assert index.query(_fuzzy_hash(rng.randbytes(len(sample))), 0.6) == []
+
+    assert index.remove('known') and not index.remove('known')
+    assert index.query(_fuzzy_hash(sample), 0.6) == []
+
+
+def test_scanner_reports_similarity_as_confidence(tmp_path, sample):
+    known = tmp_path / 'known.bin'
+    known.write_bytes(sample)
+    database = tmp_path / 'signatures.json'
+    database.write_text(json.dumps({'Known.Family': {
+        'name': 'Known.Family', 'type': 'fuzzy', 'pattern': fuzzy_hash_file(str(known)),
+        'threat_level': 'high', 'description': 'Known family'}}))
+    scanner = SignatureScanner({'signature_db_path': str(database), 'duplicate_verdicts': False})
+    scanner.initialize()
+    try:
+        variant = tmp_path / 'variant.bin'
+        variant.write_bytes(_variant(sample, random.Random(4), 20))
+        result = scanner.scan_file(variant)
+        assert result.threat_detected and result.threat_type == 'Known.Family'
+        assert result.details['signature_type'] == 'fuzzy'
+        assert 0.6 <= result.confidence == result.details['similarity'] < 1.0
+
+        unrelated = tmp_path / 'unrelated.bin'
+        unrelated.write_bytes(random.Random(5).randbytes(len(sample)))
+        assert not scanner.scan_file(unrelated).threat_detected
+    finally:
+        scanner.cleanup()
@@ -0,0 +1,66 @@
+"""
+Tests for the heuristic rules.
+"""
+
+import random
+import re
+
+import pytest
+
+from file_features import DEFAULT_CHUNK_SIZE
+from heuristic_scanner import HeuristicScanner
+
+
+def _baseline_string_values(data, suspicious_strings):
+    """HR006 values as the original whole-file implementation reported them"""
+    values = []
+    for string in re.findall(rb'[\x20-\x7E]{4,}', data):
+        string = string.decode('ascii', errors='ignore')
+        if any(suspicious.lower() in string.lower() for suspicious in suspicious_strings):
+            values.append(string[:50])
+    return values
+
+
+def _random_sample(rng, suspicious_strings):
+    parts = []
+    for _ in range(rng.randint(20, 120)):
+        kind = rng.random()
+        if kind < 0.3:
+            word = rng.choice(suspicious_strings)
+            word = ''.join(c.upper() if rng.random() < 0.5 else c for c in word)
+            text = ''.join(rng.choice('abc XYZ') for _ in range(rng.randint(0, 60)))
+            split = rng.randint(0, len(text))
+            parts.append((text[:split] + word + text[split:]).encode('ascii'))
+        elif kind < 0.6:
+            parts.append(bytes(rng.randrange(0x20, 0x7F) for _ in range(rng.randint(1, 80))))
+        else:
+            parts.append(bytes(rng.choice(b'\0\n\xff\x90') for _ in range(rng.randint(1, 4))))
+    return b''.join(parts)
+
+
+@pytest.fixture
+def make_scanner():
+    scanners = []
+
+    def make(**config):
+        scanner = HeuristicScanner({'triage': False, 'duplicate_verdicts': False, **config})
+        scanner.initialize()
+        scanners.append(scanner)
+        return scanner
+    yield make
+    for scanner in scanners:
+        scanner.cleanup()
+
+
+@pytest.mark.parametrize('chunk_size', [7, 64, DEFAULT_CHUNK_SIZE])
+def test_suspicious_strings_match_baseline(tmp_path, make_scanner, chunk_size):
+    rng = random.Random(chunk_size)
+    scanner = make_scanner(chunk_size=chunk_size)
+    suspicious_strings = sorted(scanner.suspicious_strings)
+    for trial in range(20):
+        data = _random_sample(rng, suspicious_strings)
+        path = tmp_path / f'sample{trial}.bin'
+        path.write_bytes(data)
+        result = scanner.scan_file(path)
+        values = [i['value'] for i in result.details['indicators'] if i['rule_id'] == 'HR006']
+        assert values == _baseline_string_values(data, suspicious_strings)
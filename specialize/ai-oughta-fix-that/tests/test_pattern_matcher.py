@@ -0,0 +1,126 @@
+"""
+Tests for the multi-pattern byte matchers.
+"""
+
+import random
+import re
+import time
+
+import pytest
+
+import pattern_matcher
+from pattern_matcher import AhoCorasickAutomaton, PatternMatcher
+
+
+def _expected(patterns, data):
+    """Every (offset, pattern) occurrence, overlapping ones included"""
+    return sorted((match.start(), pattern) for pattern in set(patterns)
+                  for match in re.finditer(b'(?=' + re.escape(pattern) + b')', data))
+
+
+def _stream_search(matcher, data, chunk_size, max_matches=None):
+    stream = matcher.stream(max_matches)
+    for offset in range(0, len(data), chunk_size):
+        stream.update(data[offset:offset + chunk_size], offset)
+    return stream.finish()
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3, 7, 64, 1 << 20])
+def test_finds_every_occurrence_across_chunks(chunk_size):
+    rng = random.Random(chunk_size)
+    patterns = {bytes(rng.choice(b'abcd') for _ in range(rng.randint(1, 9))) for _ in range(80)}
+    data = bytes(rng.choice(b'abcdxyz') for _ in range(20000))
+    matcher = PatternMatcher()
+    for pattern in patterns:
+        matcher.add_pattern(pattern, pattern)
+    matcher.compile()
+    assert sorted(_stream_search(matcher, data, chunk_size)) == _expected(patterns, data)
+
+
+def test_matches_automaton_order_and_limit():
+    rng = random.Random(1)
+    for trial in range(200):
+        case_insensitive = trial % 2 == 0
+        alphabet = rng.choice([b'ab', b'aAbBcC1', bytes(range(256))])
+        patterns = [bytes(rng.choice(alphabet) for _ in range(rng.randint(1, 9)))
+                    for _ in range(rng.randint(1, 30))]
+        patterns.append(patterns[0])  # Duplicates report every value
+        automaton = AhoCorasickAutomaton(case_insensitive)
+        matcher = PatternMatcher(case_insensitive)
+        for index, pattern in enumerate(patterns):
+            automaton.add_pattern(pattern, index)
+            matcher.add_pattern(pattern, index)
+        automaton.compile()
+        matcher.compile()
+
+        data = bytes(rng.choice(alphabet) for _ in range(rng.randint(0, 2000)))
+        max_matches = rng.choice([None, 1, 5])
+        chunk_size = rng.choice([1, 5, 64, 4096])
+        assert (_stream_search(matcher, data, chunk_size, max_matches)
+                == _stream_search(automaton, data, chunk_size, max_matches))
+
+
+def test_low_entropy_patterns_and_data(monkeypatch):
+    # Small blocks and pair batches, so the batching paths run on small inputs
+    monkeypatch.setattr(pattern_matcher, 'MATCH_BLOCK_SIZE', 37)
+    monkeypatch.setattr(pattern_matcher, 'MAX_CANDIDATE_PAIRS', 5)
+    rng = random.Random(2)
+    for trial in range(50):
+        patterns = list({bytes(rng.choice(b'\0\0\0\1') for _ in range(rng.randint(4, 40)))
+                         for _ in range(rng.randint(1, 40))})
+        data = bytearray(rng.randint(0, 3000))
+        for _ in range(rng.randint(0, 5)):
+            pattern = rng.choice(patterns)
+            offset = rng.randint(0, max(len(data) - len(pattern), 0))
+            data[offset:offset + len(pattern)] = pattern
+        matcher = PatternMatcher()
+        for pattern in patterns:
+            matcher.add_pattern(pattern, pattern)
+        matcher.compile()
+        chunk_size = rng.choice([3, 7, 64, 4096])
+        max_matches = rng.choice([None, 1, 5])
+        expected = _expected(patterns, bytes(data))
+        found = _stream_search(matcher, bytes(data), chunk_size, max_matches)
+        if max_matches is None:
+            assert sorted(found) == expected
+        else:
+            assert len(found) == min(max_matches, len(expected))
+            assert set(found) <= set(expected)
+
+
+def test_zero_filled_data_is_not_matched_position_by_position():
+    # Signatures opening with zero padding used to pass the filter at every offset
+    rng = random.Random(3)
+    matcher = PatternMatcher()
+    for index in range(50):
+        padding = rng.choice([4, 8, 16])
+        matcher.add_pattern(bytes(padding) + bytes(rng.randrange(1, 256) for _ in range(12)), index)
+    matcher.add_pattern(bytes(12) + b'\x01', 'marker')
+    matcher.compile()
+
+    data = bytearray(16 * 1024 * 1024)
+    data[-100:-87] = bytes(12) + b'\x01'
+    started = time.monotonic()
+    found = _stream_search(matcher, bytes(data), 1 << 20)
+    assert time.monotonic() - started < 10
+    assert found == [(len(data) - 100, 'marker')]
+
+
+def test_case_insensitive():
+    matcher = PatternMatcher(case_insensitive=True)
+    matcher.add_pattern(b'PowerShell', 'powershell')
+    matcher.add_pattern(b'CMD', 'cmd')
+    matcher.compile()
+    assert matcher.search(b'run POWERSHELL via cmd.exe') == [(4, 'powershell'), (19, 'cmd')]
+
+
+def test_rejects_misuse():
+    matcher = PatternMatcher()
+    with pytest.raises(ValueError):
+        matcher.add_pattern(b'', 'empty')
+    with pytest.raises(ValueError):
+        matcher.stream()
+    matcher.add_pattern(b'pattern', 'value')
+    matcher.compile()
+    with pytest.raises(ValueError):
+        matcher.add_pattern(b'late', 'value')
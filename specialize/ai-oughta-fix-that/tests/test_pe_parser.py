@@ -0,0 +1,108 @@
+"""
+Tests for the PE parser on well-formed, truncated and malformed images.
+"""
+
+import hashlib
+import random
+import struct
+
+import pytest
+
+from heuristic_scanner import HeuristicScanner
+from pe_parser import PEFile, PEFormatError
+from tests.pe_samples import HEADERS_SIZE, PE_OFFSET, build_pe
+
+IMPORTS = {'kernel32.dll': ['VirtualAllocEx', 'WriteProcessMemory', 'CreateRemoteThread'],
+           'user32.dll': ['MessageBoxA']}
+
+
+def test_parses_well_formed_image():
+    with PEFile(build_pe(IMPORTS)) as pe:
+        assert [section.name for section in pe.sections] == ['.text']
+        assert pe.imports == IMPORTS
+        assert not pe.is_truncated
+        assert pe.entry_point_section().name == '.text'
+        expected = 'kernel32.virtualallocex,kernel32.writeprocessmemory,kernel32.createremotethread,user32.messageboxa'
+        assert pe.imphash() == hashlib.md5(expected.encode('ascii')).hexdigest()
+
+
+def test_opens_from_path(tmp_path):
+    path = tmp_path / 'sample.exe'
+    path.write_bytes(build_pe(IMPORTS))
+    with PEFile.open(path) as pe:
+        assert pe.imports == IMPORTS
+
+
+@pytest.mark.parametrize('size', [0, 2, 0x30, PE_OFFSET + 2])
+def test_rejects_image_cut_inside_headers(size):
+    with pytest.raises(PEFormatError):
+        PEFile(build_pe(IMPORTS)[:size])
+
+
+@pytest.mark.parametrize('size', [HEADERS_SIZE, HEADERS_SIZE + 0x100])
+def test_flags_image_cut_inside_sections(size):
+    with PEFile(build_pe(IMPORTS)[:size]) as pe:
+        assert pe.is_truncated
+
+
+@pytest.mark.parametrize('offset, value', [(0, b'ZM'), (PE_OFFSET, b'NE\0\0')])
+def test_rejects_bad_signatures(offset, value):
+    data = bytearray(build_pe(IMPORTS))
+    data[offset:offset + len(value)] = value
+    with pytest.raises(PEFormatError):
+        PEFile(bytes(data))
+
+
+def test_rejects_header_offset_past_end():
+    data = bytearray(build_pe(IMPORTS))
+    struct.pack_into('<I', data, 0x3C, len(data) + 0x100)
+    with pytest.raises(PEFormatError):
+        PEFile(bytes(data))
+
+
+def test_bogus_import_directory_yields_no_imports():
+    data = bytearray(build_pe(IMPORTS))
+    struct.pack_into('<I', data, PE_OFFSET + 24 + 96 + 8, 0x7FFF0000)
+    with PEFile(bytes(data)) as pe:
+        assert pe.imports == {}
+        assert pe.imphash() is None
+
+
+def test_corrupted_headers_raise_only_format_errors():
+    rng = random.Random(0)
+    original = build_pe(IMPORTS)
+    for _ in range(500):
+        data = bytearray(original)
+        for _ in range(rng.randint(1, 8)):
+            data[rng.randrange(HEADERS_SIZE)] = rng.randrange(256)
+        data = bytes(data[:rng.randint(0, len(data))])
+        try:
+            with PEFile(data) as pe:
+                pe.sections, pe.imports, pe.is_truncated, pe.entry_point_section()
+                pe.imphash()
+        except PEFormatError:
+            pass
+
+
+def _heuristic_scan(path):
+    scanner = HeuristicScanner({'triage': False, 'duplicate_verdicts': False})
+    scanner.initialize()
+    try:
+        return scanner.scan_file(path)
+    finally:
+        scanner.cleanup()
+
+
+def test_truncated_pe_is_flagged(tmp_path):
+    path = tmp_path / 'truncated.exe'
+    path.write_bytes(build_pe({'kernel32.dll': ['GetProcAddress']})[:HEADERS_SIZE + 0x100])
+    result = _heuristic_scan(path)
+    anomalies = [i['indicator'] for i in result.details['indicators'] if i['rule_id'] == 'HR004']
+    assert 'Sections extend past end of file' in anomalies
+
+
+def test_malformed_pe_scans_without_error(tmp_path):
+    path = tmp_path / 'malformed.exe'
+    path.write_bytes(b'MZ' + bytes(0x3A) + b'\xff\xff\xff\x7f' + bytes(100))
+    result = _heuristic_scan(path)
+    assert not any(i['rule_id'] == 'HR004' for i in result.details['indicators'])
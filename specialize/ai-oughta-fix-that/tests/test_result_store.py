@@ -0,0 +1,70 @@
+"""
+Tests for slotted scan results and the columnar result store.
+"""
+
+import pytest
+
+from base_scanner import ScanResult
+from heuristic_scanner import HeuristicScanner
+from result_store import DETAILS_ALL, DETAILS_NONE, ResultStore
+
+
+def _result(index, threat):
+    result = ScanResult(f'/samples/dir{index % 3}/file{index}.bin', threat_detected=threat,
+                        threat_type='Test.Threat' if threat else None, confidence=0.25 * (index % 4),
+                        details={'index': index})
+    result.timestamp = f'2026-01-01T00:00:{index:02d}'
+    result.generation = 'v1' if index % 2 else 'v2'
+    return result
+
+
+def test_scan_result_has_no_instance_dict():
+    result = ScanResult('/a')
+    assert not hasattr(result, '__dict__')
+    with pytest.raises(AttributeError):
+        result.unknown = 1
+
+
+@pytest.mark.parametrize('keep_details', [DETAILS_ALL, DETAILS_NONE, 'threats'])
+def test_results_round_trip(keep_details):
+    results = [_result(index, index % 5 == 0) for index in range(20)]
+    store = ResultStore(keep_details)
+    assert store.extend(results) == 20
+
+    for index, (stored, original) in enumerate(zip(store, results)):
+        expected = original.to_dict()
+        keep = keep_details == DETAILS_ALL or (keep_details == 'threats' and original.threat_detected)
+        if not keep:
+            expected['details'] = ScanResult('/a').details
+        assert stored.to_dict() == expected
+        assert store.to_dict(index) == expected
+    assert store[-1].file_path == results[-1].file_path
+
+
+def test_threat_queries_and_statistics():
+    store = ResultStore()
+    store.extend(_result(index, index % 5 == 0) for index in range(20))
+    assert store.threat_count == 4
+    assert [r.file_path for r in store.iter_threats()] == [f'/samples/dir{i % 3}/file{i}.bin' for i in (0, 5, 10, 15)]
+    assert store.get_threat_type_counts() == {'Test.Threat': 4}
+    statistics = store.get_statistics()
+    assert (statistics['results'], statistics['directories'], statistics['retained_details']) == (20, 3, 4)
+    with pytest.raises(IndexError):
+        store[20]
+
+
+def test_rejects_unknown_details_mode():
+    with pytest.raises(ValueError):
+        ResultStore('some')
+
+
+def test_scan_directory_compact(tmp_path):
+    for index in range(3):
+        (tmp_path / f'sample{index}.bin').write_bytes(b'plain text ' * (index + 1))
+    scanner = HeuristicScanner({'duplicate_verdicts': False})
+    scanner.initialize()
+    try:
+        store = scanner.scan_directory_compact(tmp_path)
+    finally:
+        scanner.cleanup()
+    assert sorted(result.file_path for result in store) == sorted(str(path) for path in tmp_path.iterdir())
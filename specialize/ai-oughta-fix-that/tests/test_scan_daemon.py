@@ -0,0 +1,112 @@
+"""
+Tests for the scan daemon: its job queue, socket directory and worker processes.
+"""
+
+import os
+import queue
+import threading
+
+import pytest
+
+from api.scan_daemon import ScanClient, ScanDaemon, ScanDaemonError, create_scanner
+from heuristic_scanner import HeuristicScanner
+
+
+def _daemon(tmp_path, **config):
+    config = {'daemon_socket_path': str(tmp_path / 'daemon' / 'scand.sock'), 'duplicate_verdicts': False,
+              **config}
+    return ScanDaemon(HeuristicScanner(config), config)
+
+
+def _drain(daemon, count):
+    jobs = []
+    for _ in range(count):
+        job = daemon._next_job()
+        jobs.append(job.path)
+        daemon._finish(job, None, 'not scanned')
+    return jobs
+
+
+def test_duplicate_submissions_share_one_job(tmp_path):
+    daemon = _daemon(tmp_path)
+    first, second = queue.Queue(), queue.Queue()
+    daemon.submit('/a', 0, first)
+    daemon.submit('/a', 0, second)
+
+    assert _drain(daemon, 1) == ['/a']
+    assert first.get_nowait() == second.get_nowait() == ('/a', None, 'not scanned')
+    statistics = daemon.get_statistics()
+    assert (statistics['submitted'], statistics['deduplicated'], statistics['queued']) == (2, 1, 0)
+
+
+def test_higher_priority_is_scanned_first(tmp_path):
+    daemon = _daemon(tmp_path)
+    outcomes = queue.Queue()
+    for path, priority in [('/a', 0), ('/b', 0), ('/c', 1), ('/d', 0)]:
+        daemon.submit(path, priority, outcomes)
+    # Submitting a queued file again at a higher priority moves it forward
+    daemon.submit('/d', 2, outcomes)
+    assert _drain(daemon, 4) == ['/d', '/c', '/a', '/b']
+
+
+def test_unsubscribed_jobs_are_dropped(tmp_path):
+    daemon = _daemon(tmp_path)
+    kept, dropped = queue.Queue(), queue.Queue()
+    daemon.submit('/a', 0, dropped)
+    daemon.submit('/b', 0, kept)
+    daemon.unsubscribe(dropped)
+    assert _drain(daemon, 1) == ['/b']
+    assert daemon.get_statistics()['cancelled'] == 1
+
+
+@pytest.mark.parametrize('mode', [0o755, 0o770])
+def test_refuses_socket_directory_others_can_write(tmp_path, mode):
+    directory = tmp_path / 'daemon'
+    directory.mkdir()
+    os.chmod(directory, mode)
+    daemon = _daemon(tmp_path)
+    with pytest.raises(ScanDaemonError):
+        daemon.start()
+    assert not daemon.is_running
+
+
+def test_refuses_symlinked_socket_directory(tmp_path):
+    target = tmp_path / 'target'
+    target.mkdir(mode=0o700)
+    (tmp_path / 'daemon').symlink_to(target)
+    with pytest.raises(ScanDaemonError):
+        _daemon(tmp_path).start()
+
+
+@pytest.fixture
+def running_daemon(tmp_path):
+    config = {'daemon_socket_path': str(tmp_path / 'daemon' / 'scand.sock'), 'daemon_workers': 2,
+              'verdict_cache_path': str(tmp_path / 'verdicts.db'), 'triage': False}
+    daemon = ScanDaemon(create_scanner(config), config)
+    server = threading.Thread(target=daemon.serve_forever, daemon=True)
+    daemon.start()
+    server.start()
+    yield daemon
+    daemon.shutdown()
+    server.join(30)
+
+
+def test_scans_in_worker_processes_and_caches_in_daemon(tmp_path, running_daemon):
+    samples = tmp_path / 'samples'
+    samples.mkdir()
+    for index in range(4):
+        (samples / f'sample{index}.bin').write_bytes(b'cmd.exe powershell.exe password ' * (index + 1))
+    client = ScanClient(running_daemon.socket_path, timeout=60)
+
+    outcomes = list(client.iter_scan([samples]))
+    assert all(error is None for _, _, error in outcomes)
+    results = {path: result for path, result, _ in outcomes}
+    assert sorted(results) == sorted(str(path) for path in samples.iterdir())
+    assert running_daemon._executor is not None
+    assert running_daemon.get_statistics()['duplicate_verdicts']['lookups'] == 4
+
+    cache = running_daemon.scanner._verdict_cache
+    hits = cache.get_statistics()['hits']
+    again = client.scan_file(samples / 'sample0.bin')
+    assert cache.get_statistics()['hits'] == hits + 1
+    assert again.threat_detected == results[str(samples / 'sample0.bin')].threat_detected
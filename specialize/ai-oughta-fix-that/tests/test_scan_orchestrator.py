@@ -0,0 +1,73 @@
+"""
+Tests for combining scanner engines over one read per file.
+"""
+
+import hashlib
+import json
+
+import pytest
+
+from heuristic_scanner import HeuristicScanner
+from scan_orchestrator import ScanOrchestrator, ScanOrchestratorError
+from signature_scanner import SignatureScanner
+
+KNOWN = b'known sample contents ' * 32
+SUSPICIOUS = b'cmd.exe powershell.exe password bitcoin wallet ' * 8
+
+
+@pytest.fixture
+def orchestrator(tmp_path):
+    database = tmp_path / 'signatures.json'
+    database.write_text(json.dumps({'Known.Sample': {
+        'name': 'Known.Sample', 'type': 'hash', 'pattern': hashlib.sha256(KNOWN).hexdigest(),
+        'threat_level': 'high', 'description': 'Known sample'}}))
+    orchestrator = ScanOrchestrator(engines=[
+        SignatureScanner({'signature_db_path': str(database), 'duplicate_verdicts': False}),
+        HeuristicScanner({'triage': False})
+    ], config={'duplicate_verdicts': False})
+    orchestrator.initialize()
+    yield orchestrator
+    orchestrator.cleanup()
+
+
+def _sample(tmp_path, name, contents):
+    path = tmp_path / name
+    path.write_bytes(contents)
+    return path
+
+
+def test_definitive_detection_skips_later_engines(tmp_path, orchestrator):
+    result = orchestrator.scan_file(_sample(tmp_path, 'known.bin', KNOWN))
+    assert result.threat_detected and result.threat_type == 'Known.Sample'
+    assert result.details['detected_by'] == ['SignatureScanner']
+    assert result.details['skipped_engines'] == ['HeuristicScanner']
+    assert list(result.details['engines']) == ['SignatureScanner']
+
+
+def test_every_engine_runs_without_definitive_detection(tmp_path, orchestrator):
+    result = orchestrator.scan_file(_sample(tmp_path, 'suspicious.bin', SUSPICIOUS))
+    assert list(result.details['engines']) == ['SignatureScanner', 'HeuristicScanner']
+    assert 'skipped_engines' not in result.details
+    assert result.details['detected_by'] == (['HeuristicScanner'] if result.threat_detected else [])
+    heuristic = result.details['engines']['HeuristicScanner']
+    assert any(indicator['rule_id'] == 'HR006' for indicator in heuristic['indicators'])
+
+
+def test_reads_each_file_once(tmp_path, orchestrator, monkeypatch):
+    path = _sample(tmp_path, 'suspicious.bin', SUSPICIOUS)
+    opened = []
+    real_open = open
+
+    def counting_open(file, *args, **kwargs):
+        if str(file) == str(path):
+            opened.append(file)
+        return real_open(file, *args, **kwargs)
+
+    monkeypatch.setattr('builtins.open', counting_open)
+    orchestrator.scan_file(path)
+    assert len(opened) == 1
+
+
+def test_rejects_engine_registered_twice(orchestrator):
+    with pytest.raises(ScanOrchestratorError):
+        orchestrator.register_engine(HeuristicScanner())
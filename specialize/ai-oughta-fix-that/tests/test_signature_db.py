@@ -0,0 +1,93 @@
+"""
+Tests for the memory-mapped binary signature database.
+"""
+
+import hashlib
+import json
+import pickle
+
+import pytest
+
+from signature_db import SignatureDatabase, SignatureDatabaseError, SignatureDatabaseWriter
+from signature_scanner import SignatureScanner
+
+
+def _hash_signature(name, contents, algorithm='sha256'):
+    digest = hashlib.new(algorithm, contents).digest()
+    return {'name': name, 'type': 'hash', 'pattern': digest.hex(), 'threat_level': 'high',
+            'description': f'{name} sample'}, (algorithm, digest)
+
+
+@pytest.fixture
+def database(tmp_path):
+    writer = SignatureDatabaseWriter()
+    for index in range(200):
+        writer.add(*_hash_signature(f'Sample.{index}', b'sample %d' % index))
+    writer.add(*_hash_signature('Sample.Md5', b'md5 sample', 'md5'))
+    writer.add({'name': 'Marker', 'type': 'string', 'pattern': 'marker', 'threat_level': 'low',
+                'description': 'Marker string'})
+    path = tmp_path / 'signatures.sigdb'
+    assert writer.write(path, None) == 202
+    database = SignatureDatabase(path)
+    yield database
+    database.close()
+
+
+def test_lookup_finds_every_digest(database):
+    assert database.hash_count == 201 and database.pattern_record_count == 1
+    for index in range(200):
+        signature, (algorithm, digest) = _hash_signature(f'Sample.{index}', b'sample %d' % index)
+        assert database.lookup(algorithm, digest) == signature
+    assert database.lookup('md5', hashlib.md5(b'md5 sample').digest())['name'] == 'Sample.Md5'
+
+
+def test_lookup_misses(database):
+    assert database.lookup('sha256', hashlib.sha256(b'clean').digest()) is None
+    assert database.lookup('sha1', hashlib.sha1(b'sample 1').digest()) is None  # No sha1 table
+    assert database.lookup('sha256', b'too short') is None
+
+
+def test_iterates_every_signature(database):
+    signatures = list(database.iter_signatures())
+    assert signatures[0]['name'] == 'Marker'
+    assert sorted(s['name'] for s in signatures[1:]) == sorted([f'Sample.{i}' for i in range(200)] + ['Sample.Md5'])
+
+
+def test_pickled_database_maps_the_file_again(database):
+    copy = pickle.loads(pickle.dumps(database))
+    try:
+        assert copy.content_digest == database.content_digest
+        assert copy.lookup('sha256', hashlib.sha256(b'sample 7').digest())['name'] == 'Sample.7'
+    finally:
+        copy.close()
+
+
+def test_rejects_files_in_other_formats(tmp_path):
+    path = tmp_path / 'signatures.json'
+    path.write_text('{}' * 100)
+    with pytest.raises(SignatureDatabaseError):
+        SignatureDatabase(path)
+
+
+def test_scanner_loads_exported_database(tmp_path):
+    known = tmp_path / 'known.bin'
+    known.write_bytes(b'known sample contents')
+    source = tmp_path / 'signatures.json'
+    source.write_text(json.dumps({'Known.Sample': {
+        'name': 'Known.Sample', 'type': 'hash', 'pattern': hashlib.sha256(known.read_bytes()).hexdigest(),
+        'threat_level': 'high', 'description': 'Known sample'}}))
+    exporter = SignatureScanner({'signature_db_path': str(source)})
+    exporter.initialize()
+    database = tmp_path / 'signatures.sigdb'
+    exporter.export_signature_db(database)
+    exporter.cleanup()
+
+    scanner = SignatureScanner({'signature_db_path': str(database), 'duplicate_verdicts': False})
+    scanner.initialize()
+    try:
+        assert scanner.get_signature_count() == 1
+        result = scanner.scan_file(known)
+        assert result.threat_detected and result.threat_type == 'Known.Sample'
+        assert result.details['signature_type'] == 'hash'
+    finally:
+        scanner.cleanup()
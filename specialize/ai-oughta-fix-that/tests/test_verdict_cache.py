@@ -0,0 +1,48 @@
+"""
+Tests for verdicts reused from the persistent verdict cache.
+"""
+
+from heuristic_scanner import HeuristicScanner
+
+
+def test_cache_hit_reports_renamed_path(tmp_path):
+    scanner = HeuristicScanner({'verdict_cache_path': str(tmp_path / 'verdicts.db'),
+                                'duplicate_verdicts': False})
+    scanner.initialize()
+    try:
+        original = tmp_path / 'original.bin'
+        original.write_bytes(b'run cmd.exe then powershell.exe ' * 64)
+        first = scanner.scan_file(original)
+        assert first.file_path == str(original)
+
+        renamed = tmp_path / 'renamed.bin'
+        original.rename(renamed)
+        hits = scanner._verdict_cache.get_statistics()['hits']
+        second = scanner.scan_file(renamed)
+
+        assert scanner._verdict_cache.get_statistics()['hits'] == hits + 1
+        assert second.file_path == str(renamed)
+        assert second.threat_detected == first.threat_detected
+        assert second.details == first.details
+    finally:
+        scanner.cleanup()
+
+
+def test_directory_scans_skip_cache_files(tmp_path):
+    cache_path = tmp_path / 'verdicts.sqlite'
+    scanner = HeuristicScanner({'verdict_cache_path': str(cache_path), 'duplicate_verdicts': False})
+    scanner.initialize()
+    try:
+        samples = []
+        for index in range(3):
+            samples.append(tmp_path / f'sample{index}.bin')
+            samples[-1].write_bytes(b'password bitcoin wallet ' * (index + 1))
+        scanner.scan_file(samples[0])
+        scanner._flush_cached_verdicts()
+        assert (tmp_path / 'verdicts.sqlite-wal').exists()
+
+        expected = sorted(str(sample) for sample in samples)
+        assert sorted(r.file_path for r in scanner.scan_directory(tmp_path)) == expected
+        assert sorted(r.file_path for r in scanner.scan_directory_parallel(tmp_path, workers=2)) == expected
+    finally:
+        scanner.cleanup()